@@ -0,0 +1,288 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.profiling import stage
+
+AggregationSpec = namedtuple("AggregationSpec", ["name", "keys", "measure", "reducer", "output"])
+AggregationSpec.__doc__ = """
+Declarative description of one aggregation.
+
+Fields:
+- name: str, name of the result frame
+- keys: list of str, columns to group by
+- measure: str, column to reduce (None for "count")
+- reducer: str, one of "count", "sum", "mean", "min" or "max"
+- output: str, name of the result column
+"""
+
+REDUCERS = ("count", "sum", "mean", "min", "max")
+SIZE_COLUMN = "__size"
+
+# Partial statistics kept for each reducer; every one of them can be merged across row blocks
+_REDUCER_STATS = {
+    "count": [],
+    "sum": ["sum"],
+    "mean": ["sum", "n"],
+    "min": ["min"],
+    "max": ["max"],
+}
+_MERGE_FUNCTIONS = {"sum": "sum", "n": "sum", "min": "min", "max": "max"}
+
+# Above this many possible key combinations, group ids are compressed with np.unique
+_DENSE_GROUPS_LIMIT = 10_000_000
+
+
+def _stat_column(measure, stat):
+    return f"{measure}__{stat}"
+
+
+def _validate_plan(plan):
+    names = set()
+    for spec in plan:
+        if spec.reducer not in REDUCERS:
+            raise ValueError(f"Unknown reducer '{spec.reducer}' in aggregation '{spec.name}'.")
+        if spec.reducer != "count" and spec.measure is None:
+            raise ValueError(f"Aggregation '{spec.name}' needs a measure for reducer '{spec.reducer}'.")
+        if not spec.keys:
+            raise ValueError(f"Aggregation '{spec.name}' needs at least one key.")
+        if spec.name in names:
+            raise ValueError(f"Duplicated aggregation name '{spec.name}'.")
+        names.add(spec.name)
+
+
+def plan_groupings(plan):
+    """
+    Decide which groupings have to be computed from the ledger to answer an aggregation plan.
+
+    Only key sets that are not contained in another key set of the plan are computed from the rows;
+    every other aggregation is rolled up from the smallest computed grouping that contains its keys.
+    Computed groupings keep the rows missing some of their keys, so rolled up totals include them.
+
+    Parameters:
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - dict: maps each computed grouping (tuple of keys) to the set of (measure, stat) pairs it must carry
+    - dict: maps each aggregation name to the grouping it is rolled up from
+    """
+    _validate_plan(plan)
+
+    key_sets = []
+    for spec in plan:
+        keys = tuple(dict.fromkeys(spec.keys))
+        if not any(set(keys) == set(other) for other in key_sets):
+            key_sets.append(keys)
+
+    maximal = [keys for keys in key_sets if not any(set(keys) < set(other) for other in key_sets)]
+
+    groupings = {keys: set() for keys in maximal}
+    sources = {}
+    for spec in plan:
+        source = min((keys for keys in maximal if set(spec.keys) <= set(keys)), key=len)
+        sources[spec.name] = source
+        for stat in _REDUCER_STATS[spec.reducer]:
+            groupings[source].add((spec.measure, stat))
+
+    return groupings, sources
+
+
+def plan_inputs(plan):
+    """
+    Return the columns an aggregation plan groups by or reduces.
+
+    Parameters:
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - list of str: the columns, in order of first use
+    """
+    columns = [col for spec in plan for col in (*spec.keys, spec.measure) if col is not None]
+    return list(dict.fromkeys(columns))
+
+
+def _factorize_keys(dataframe, keys, factorized):
+    codes = []
+    uniques = []
+    for key in keys:
+        if key not in factorized:
+            factorized[key] = pd.factorize(dataframe[key], sort=True)
+        key_codes, key_uniques = factorized[key]
+        codes.append(key_codes)
+        uniques.append(key_uniques)
+    return codes, uniques
+
+
+def _group_ids(codes, uniques):
+    """
+    Combine per-key integer codes into one group id per row, in sorted key order.
+
+    Missing key values get their own slot after the last unique value, as in cube.build_cube:
+    a row missing one key still counts towards the groupings rolled up without that key.
+    """
+    codes = [np.where(key_codes >= 0, key_codes, len(key_uniques)) for key_codes, key_uniques in zip(codes, uniques)]
+
+    shape = tuple(len(key_uniques) + 1 for key_uniques in uniques)
+    flat = np.ravel_multi_index(codes, shape) if len(codes) > 1 else codes[0].astype(np.intp)
+
+    if np.prod(shape, dtype=np.float64) <= _DENSE_GROUPS_LIMIT:
+        size = np.bincount(flat, minlength=int(np.prod(shape)))
+        present = np.flatnonzero(size)
+        remap = np.zeros(len(size), dtype=np.intp)
+        remap[present] = np.arange(len(present))
+        return remap[flat], present, shape
+
+    present, group_ids = np.unique(flat, return_inverse=True)
+    return group_ids, present, shape
+
+
+def _key_labels(key_uniques, positions):
+    # The slot after the last unique value holds the rows missing the key
+    missing = positions == len(key_uniques)
+    if not missing.any():
+        return key_uniques.take(positions)
+    return key_uniques.take(np.where(missing, -1, positions), allow_fill=True, fill_value=np.nan)
+
+
+def _reduce(values, group_ids, n_groups, stat):
+    if stat == "sum":
+        return np.bincount(group_ids, weights=values, minlength=n_groups)
+    if stat == "n":
+        return np.bincount(group_ids, minlength=n_groups)
+    if stat == "min":
+        result = np.full(n_groups, np.inf)
+        np.minimum.at(result, group_ids, values)
+        return result
+    result = np.full(n_groups, -np.inf)
+    np.maximum.at(result, group_ids, values)
+    return result
+
+
+def compute_partials(dataframe, plan):
+    """
+    Compute the mergeable partial aggregates of a plan in one pass per computed grouping.
+
+    Key columns are factorized once and shared by every grouping that uses them. Each partial
+    frame holds the key columns, the group size and the (measure, stat) columns of the plan.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the (enriched) ledger
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - dict: maps each computed grouping (tuple of keys) to its partial DataFrame
+    """
+    groupings, _ = plan_groupings(plan)
+    missing = {key for keys in groupings for key in keys} | {measure for stats in groupings.values() for measure, _ in stats}
+    missing = [col for col in missing if col not in dataframe.columns]
+    if missing:
+        raise ValueError(f"Columns {sorted(missing)} are required in the DataFrame.")
+
+    factorized = {}
+    partials = {}
+    for keys, stats in groupings.items():
+        with stage(f"grouping[{','.join(keys)}]", rows_in=len(dataframe)) as record:
+            codes, uniques = _factorize_keys(dataframe, keys, factorized)
+            group_ids, present, shape = _group_ids(codes, uniques)
+            n_groups = len(present)
+
+            key_positions = np.unravel_index(present, shape)
+            partial = {key: _key_labels(key_uniques, positions) for key, key_uniques, positions in zip(keys, uniques, key_positions)}
+            partial[SIZE_COLUMN] = np.bincount(group_ids, minlength=n_groups)
+
+            for measure, stat in sorted(stats):
+                values = dataframe[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+                notna = ~np.isnan(values)
+                partial[_stat_column(measure, stat)] = _reduce(values[notna], group_ids[notna], n_groups, stat)
+
+            partials[keys] = pd.DataFrame(partial)
+            record.rows_out = n_groups
+
+    return partials
+
+
+def _rollup(partial, keys):
+    stat_columns = [col for col in partial.columns if col == SIZE_COLUMN or "__" in col]
+    functions = {col: _MERGE_FUNCTIONS.get(col.rsplit("__", 1)[1], "sum") for col in stat_columns}
+    # Groups missing a key are kept, their rows belong to the coarser groupings rolled up from here
+    return partial.groupby(list(keys), sort=True, observed=True, dropna=False).agg(functions).reset_index()
+
+
+def merge_partials(*partials):
+    """
+    Merge partial aggregates computed over disjoint blocks of rows.
+
+    Parameters:
+    - partials: dicts returned by compute_partials for the same plan
+
+    Returns:
+    - dict: the merged partial aggregates
+    """
+    partials = [partial for partial in partials if partial]
+    if not partials:
+        return {}
+
+    merged = {}
+    for keys in partials[0]:
+        frames = [partial[keys] for partial in partials]
+        merged[keys] = frames[0] if len(frames) == 1 else _rollup(pd.concat(frames, ignore_index=True), keys)
+    return merged
+
+
+def finalize_partials(partials, plan, dtypes=None):
+    """
+    Turn partial aggregates into the result frames of a plan.
+
+    Parameters:
+    - partials: dict, partial aggregates returned by compute_partials or merge_partials
+    - plan: list of AggregationSpec, the aggregations to compute
+    - dtypes: dict, optional dtypes of the measure columns, used to keep integer sums as integers
+
+    Returns:
+    - dict: maps each aggregation name to its result DataFrame, sorted by its keys
+    """
+    _, sources = plan_groupings(plan)
+    dtypes = dtypes or {}
+
+    results = {}
+    for spec in plan:
+        source = partials[sources[spec.name]]
+        with stage(spec.name, rows_in=len(source)) as record:
+            rolled = source if list(spec.keys) == list(sources[spec.name]) else _rollup(source, spec.keys)
+            keys = list(spec.keys)
+            # Like groupby, results leave out the rows missing one of their own keys
+            rolled = rolled[rolled[keys].notna().all(axis=1)]
+
+            if spec.reducer == "count":
+                values = rolled[SIZE_COLUMN].astype(np.int64)
+            elif spec.reducer == "mean":
+                values = rolled[_stat_column(spec.measure, "sum")] / rolled[_stat_column(spec.measure, "n")]
+            else:
+                values = rolled[_stat_column(spec.measure, spec.reducer)].replace([np.inf, -np.inf], np.nan)
+                measure_dtype = dtypes.get(spec.measure)
+                if measure_dtype is not None and pd.api.types.is_integer_dtype(measure_dtype):
+                    # The min or max of a group whose values are all missing is <NA>, as in groupby
+                    values = values.astype("Int64" if values.isna().any() else np.int64)
+
+            result = rolled[keys].copy()
+            result[spec.output] = values.array
+            results[spec.name] = result.sort_values(keys, kind="stable").reset_index(drop=True)
+            record.rows_out = len(results[spec.name])
+
+    return results
+
+
+def run_aggregation_plan(dataframe, plan):
+    """
+    Compute every aggregation of a plan, sharing groupings and factorized keys between them.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the (enriched) ledger
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - dict: maps each aggregation name to its result DataFrame
+    """
+    partials = compute_partials(dataframe, plan)
+    return finalize_partials(partials, plan, dtypes=dataframe.dtypes.to_dict())
@@ -0,0 +1,205 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+from analysis.forecasting import SEASON_LENGTH, monthly_series
+
+ANOMALY_DIRECTIONS = ("high", "low", "both")
+DEFAULT_WINDOW = 12
+DEFAULT_THRESHOLD = 3.5
+DEFAULT_BATCH_SIZE = 4096
+
+# Scale the MAD and the mean absolute deviation to the standard deviation of normal data
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+# A month never deviates by more than this share of its window median without being scored as such
+RELATIVE_SCALE_FLOOR = 0.1
+
+
+def rolling_robust_scores(matrix, window=DEFAULT_WINDOW, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Score every month of every series against the median and MAD of the months just before it.
+
+    The scale of a window is its MAD, or its mean absolute deviation when most of its months are
+    equal (e.g. 0 for products bought now and then), and never less than RELATIVE_SCALE_FLOOR of its
+    median. Series are scored in batches of windows views, so memory stays bounded however many
+    series there are.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - window: int, number of previous months each month is compared with (default is 12)
+    - batch_size: int, number of series scored at once (default is 4096)
+
+    Returns:
+    - np.ndarray: the median of the previous months, NaN for the first window months
+    - np.ndarray: the robust z-score of every month, NaN where there is no history or no spread
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    expected = np.full(matrix.shape, np.nan)
+    scores = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] <= window:
+        return expected, scores
+
+    for start in range(0, len(matrix), batch_size):
+        batch = matrix[start:start + batch_size]
+        # Window j holds months j to j + window - 1 and scores month j + window
+        windows = np.lib.stride_tricks.sliding_window_view(batch, window, axis=1)[:, :-1]
+        median = np.median(windows, axis=2)
+        deviations = np.abs(windows - median[..., None])
+        scale = np.maximum.reduce([
+            MAD_SCALE * np.median(deviations, axis=2),
+            MEAN_AD_SCALE * deviations.mean(axis=2),
+            RELATIVE_SCALE_FLOOR * np.abs(median),
+        ])
+
+        residuals = batch[:, window:] - median
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.where(scale > 0, residuals / scale, np.nan)
+        expected[start:start + batch_size, window:] = median
+        scores[start:start + batch_size, window:] = score
+    return expected, scores
+
+
+def seasonal_residual_scores(matrix, season_length=SEASON_LENGTH, window=DEFAULT_WINDOW, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Score the change of every month from the same month a season before, as rolling_robust_scores does.
+
+    A month that is high every year (e.g. yearly restocking) has an ordinary seasonal change, so
+    it scores low here even when it stands out from the months just before it.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - season_length: int, number of months per season (default is 12)
+    - window: int, number of previous changes each change is compared with (default is 12)
+    - batch_size: int, number of series scored at once (default is 4096)
+
+    Returns:
+    - np.ndarray: the robust z-score of every seasonal change, NaN for the first season_length + window months
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    scores = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] <= season_length:
+        return scores
+
+    changes = matrix[:, season_length:] - matrix[:, :-season_length]
+    _, scores[:, season_length:] = rolling_robust_scores(changes, window, batch_size)
+    return scores
+
+
+def flag_anomalies(matrix, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD, season_length=SEASON_LENGTH, direction="high", batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Flag the months of every series that stand out both from the months before them and from
+    the same month a season before.
+
+    Months with too little history for the seasonal score are flagged on the rolling score alone.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - window: int, number of previous months each month is compared with (default is 12)
+    - threshold: float, the score above which a month is anomalous (default is 3.5)
+    - season_length: int, number of months per season, 0 to skip the seasonal score (default is 12)
+    - direction: str, one of ANOMALY_DIRECTIONS, whether to flag spikes, drops or both (default is "high")
+    - batch_size: int, number of series scored at once (default is 4096)
+
+    Returns:
+    - np.ndarray: boolean flags, shape (series, months)
+    - np.ndarray: the median of the previous months
+    - np.ndarray: the rolling robust z-scores
+    - np.ndarray: the seasonal robust z-scores
+    """
+    if direction not in ANOMALY_DIRECTIONS:
+        raise ValueError(f"Unknown direction '{direction}', expected one of {ANOMALY_DIRECTIONS}.")
+
+    expected, scores = rolling_robust_scores(matrix, window, batch_size)
+    if season_length:
+        seasonal = seasonal_residual_scores(matrix, season_length, window, batch_size)
+    else:
+        seasonal = np.full(scores.shape, np.nan)
+
+    def beyond(values):
+        # NaN compares False, so months without a score are never flagged
+        if direction == "high":
+            return values > threshold
+        if direction == "low":
+            return values < -threshold
+        return np.abs(values) > threshold
+
+    flags = beyond(scores) & (beyond(seasonal) | np.isnan(seasonal))
+    return flags, expected, scores, seasonal
+
+
+def detect_anomalies(dataframe, series_columns=("Hospital", "CODIGO"), value_column="IMPORTELINEA", window=DEFAULT_WINDOW,
+                     threshold=DEFAULT_THRESHOLD, season_length=SEASON_LENGTH, direction="high", batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Find the anomalous months of the monthly spending of every hospital and product.
+
+    The monthly totals of every series are built in a single grouped pass over the ledger (as
+    sum_importe_by_month does for the whole ledger, months without purchases being 0), then
+    scored with flag_anomalies. Only the flagged months are returned.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - series_columns: list of str, the columns identifying each series (default is "Hospital" and "CODIGO")
+    - value_column: str, the column summed every month (default is "IMPORTELINEA")
+    - window: int, number of previous months each month is compared with (default is 12)
+    - threshold: float, the score above which a month is anomalous (default is 3.5)
+    - season_length: int, number of months per season, 0 to skip the seasonal score (default is 12)
+    - direction: str, one of ANOMALY_DIRECTIONS (default is "high")
+    - batch_size: int, number of series scored at once (default is 4096)
+
+    Returns:
+    - pd.DataFrame: series_columns, "Year", "Month", "Value", "Expected", "Score" and "SeasonalScore" of every anomalous month
+    """
+    series_columns = list(series_columns)
+    matrix, labels, months = monthly_series(dataframe, series_columns, value_column)
+    flags, expected, scores, seasonal = flag_anomalies(matrix, window, threshold, season_length, direction, batch_size)
+
+    rows, columns = np.nonzero(flags)
+    flagged = labels.take(rows)
+    if len(series_columns) == 1:
+        anomalies = {series_columns[0]: flagged.to_numpy()}
+    else:
+        anomalies = {column: flagged.get_level_values(level).to_numpy() for level, column in enumerate(series_columns)}
+    flagged_months = months.take(columns)
+    anomalies.update({
+        "Year": flagged_months.year % 100,
+        "Month": flagged_months.month,
+        "Value": matrix[rows, columns],
+        "Expected": expected[rows, columns],
+        "Score": scores[rows, columns],
+        "SeasonalScore": seasonal[rows, columns],
+    })
+    return pd.DataFrame(anomalies)
+
+
+def main():
+    from analysis.writers import write_dataframe
+
+    parser = argparse.ArgumentParser(description="Find the anomalous months of the spending of every hospital and product of an Excel ledger.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--series", nargs="+", default=["Hospital", "CODIGO"], help="Columns identifying each series (default is Hospital CODIGO)")
+    parser.add_argument("--value", type=str, default="IMPORTELINEA", help="Column summed every month (default is IMPORTELINEA)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Number of previous months each month is compared with (default is 12)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Robust z-score above which a month is anomalous (default is 3.5)")
+    parser.add_argument("--season_length", type=int, default=SEASON_LENGTH, help="Number of months per season, 0 to skip the seasonal check (default is 12)")
+    parser.add_argument("--direction", choices=ANOMALY_DIRECTIONS, default="high", help="Flag spikes, drops or both (default is high)")
+    parser.add_argument("--output", type=str, default=None, help="File to write the anomalous months to, e.g. excels/anomalies.xlsx")
+
+    args = parser.parse_args()
+
+    dataframe = dt.read_excel_dataset(args.file_path, args.sheet_name)
+    if dataframe is None:
+        return
+
+    anomalies = detect_anomalies(dataframe, args.series, args.value, window=args.window, threshold=args.threshold,
+                                 season_length=args.season_length, direction=args.direction)
+    if args.output:
+        write_dataframe(anomalies, args.output)
+    print(anomalies)
+
+
+if __name__ == "__main__":
+    main()
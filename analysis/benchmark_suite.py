@@ -0,0 +1,255 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import analysis.cache as cache
+import analysis.data_treatment as dt
+from analysis.anomalies import detect_anomalies
+from analysis.benchmarks import time_call
+from analysis.generate_new_dataset import process_dataset
+from analysis.synthetic import BENCHMARK_SIZES, generate_ledger
+from analysis.writers import write_atomically, write_dataframe
+
+REPORT_VERSION = 1
+# xlsx sheets hold at most 1048576 rows, and writing then parsing one that large takes minutes
+DEFAULT_MAX_EXCEL_ROWS = 100_000
+DEFAULT_THRESHOLD = 0.10
+
+# Aggregations of data_treatment.py, run on the enriched ledger as main() does
+AGGREGATIONS = {
+    "count_values_in_column": lambda df: dt.count_values_in_column(df, "CODIGO"),
+    "count_purchases_by_year": dt.count_purchases_by_year,
+    "calculate_total_by_codigo": dt.calculate_total_by_codigo,
+    "calculate_product_totals": dt.calculate_product_totals,
+    "top_products": lambda df: dt.top_products(dt.calculate_product_totals(df)),
+    "group_by_origen_and_date": dt.group_by_origen_and_date,
+    "group_by_codigo_and_tgl": dt.group_by_codigo_and_tgl,
+    "sum_counts_by_tgl": lambda df: dt.sum_counts_by_tgl(dt.group_by_codigo_and_tgl(df)),
+    "sum_importe_by_fecha": dt.sum_importe_by_fecha,
+    "sum_importe_by_month": dt.sum_importe_by_month,
+    "sum_cantidad_by_fecha": dt.sum_cantidad_by_fecha,
+    "count_occurrences_by_year": dt.count_occurrences_by_year,
+    "group_by_codigo_and_origen": dt.group_by_codigo_and_origen,
+    "count_occurrences_by_tipo_and_year": dt.count_occurrences_by_tipo_and_year,
+    "calculate_average_quantity_by_tipo_and_year": dt.calculate_average_quantity_by_tipo_and_year,
+    "main_aggregation_plan": lambda df: dt.run_aggregation_plan(df, dt.MAIN_AGGREGATION_PLAN),
+    "detect_anomalies": detect_anomalies,
+}
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray, dict, list, tuple)):
+        return len(result)
+    return None
+
+
+def measure(func, *args, repeat=3, **kwargs):
+    """
+    Time a function call and measure the peak memory it allocates.
+
+    The timed runs are separate from the traced run, so tracemalloc does not slow the timings down.
+
+    Parameters:
+    - func: callable, the function to measure
+    - repeat: int, number of timed runs, the best is kept (default is 3)
+
+    Returns:
+    - dict: "seconds", "peak_bytes" (allocated by the call, as traced by tracemalloc) and "rows_out"
+    """
+    seconds, result = time_call(func, *args, repeat=repeat, **kwargs)
+    rows_out = _rows(result)
+    del result
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": seconds, "peak_bytes": peak - base, "rows_out": rows_out}
+
+
+def _benchmark_read(rows, seed, repeat):
+    """
+    Time read_excel_dataset on a synthetic workbook, parsing the xlsx and through the columnar cache.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "ledger.xlsx")
+        write_dataframe(generate_ledger(rows, seed=seed), file_path)
+        # read_excel_dataset reports what it reads on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            results["read_excel_dataset/xlsx"] = measure(dt.read_excel_dataset, file_path, use_cache=False, compact=True, repeat=1)
+            cache.build_cache(file_path)
+            results["read_excel_dataset/cached"] = measure(dt.read_excel_dataset, file_path, compact=True, repeat=repeat)
+    return results
+
+
+def run_suite(sizes=BENCHMARK_SIZES, seed=0, repeat=3, max_excel_rows=DEFAULT_MAX_EXCEL_ROWS, num_bootstraps=1000, log=print):
+    """
+    Benchmark the pipeline on synthetic ledgers of several sizes.
+
+    Every target is timed (best of repeat runs) and memory-profiled: read_excel_dataset (for sizes
+    up to max_excel_rows), enrich_dataset, every aggregation of data_treatment.py,
+    calculate_spending_range and calculate_spending_ranges on the monthly spending, and process_dataset.
+
+    Parameters:
+    - sizes: list of int, numbers of rows of the synthetic ledgers (default is 10k, 1M and 10M)
+    - seed: int, seed of the synthetic ledgers (default is 0)
+    - repeat: int, number of timed runs per target (default is 3)
+    - max_excel_rows: int, largest ledger read from an xlsx file (default is 100000)
+    - num_bootstraps: int, the number of bootstrap samples (default is 1000)
+    - log: callable, receives one progress line per target (default is print)
+
+    Returns:
+    - list of dict: one record per size and target, with "size", "target", "seconds", "peak_bytes" and "rows_out"
+    """
+    records = []
+
+    def record(size, target, result):
+        records.append({"size": size, "target": target, **result})
+        if result.get("skipped"):
+            log(f"{size:>10} {target}: skipped, {result['skipped']}")
+        else:
+            log(f"{size:>10} {target}: {result['seconds']:.4f}s, peak {result['peak_bytes'] / 2**20:.1f} MiB")
+
+    for size in sizes:
+        if size <= max_excel_rows:
+            for target, result in _benchmark_read(size, seed, repeat).items():
+                record(size, target, result)
+        else:
+            record(size, "read_excel_dataset/xlsx", {"seconds": None, "peak_bytes": None, "rows_out": None, "skipped": f"more than {max_excel_rows} rows"})
+
+        start = time.perf_counter()
+        ledger = generate_ledger(size, seed=seed, compact=True)
+        log(f"{size:>10} generated in {time.perf_counter() - start:.2f}s")
+
+        record(size, "enrich_dataset", measure(dt.enrich_dataset, ledger, repeat=repeat))
+        enriched = dt.enrich_dataset(ledger)
+        for target, function in AGGREGATIONS.items():
+            record(size, target, measure(function, enriched, repeat=repeat))
+
+        monthly = enriched.groupby(["CODIGO", "Year", "Month"], observed=True)["IMPORTELINEA"].sum().reset_index()
+        month_totals = monthly.groupby(["Year", "Month"])["IMPORTELINEA"].sum().to_numpy()
+        record(size, "calculate_spending_range", measure(dt.calculate_spending_range, month_totals, num_bootstraps=num_bootstraps, rng=seed, repeat=repeat))
+        record(size, "calculate_spending_ranges", measure(dt.calculate_spending_ranges, monthly, "IMPORTELINEA", ["CODIGO"], num_bootstraps=num_bootstraps, rng=seed, repeat=repeat))
+
+        record(size, "process_dataset", measure(process_dataset, ledger, repeat=repeat))
+        del ledger, enriched, monthly
+
+    return records
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(records, seed, repeat):
+    """
+    Wrap benchmark records with the metadata needed to compare reports across commits.
+
+    Parameters:
+    - records: list of dict, returned by run_suite
+    - seed: int, seed of the synthetic ledgers
+    - repeat: int, number of timed runs per target
+
+    Returns:
+    - dict: the report
+    """
+    return {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": records,
+    }
+
+
+def compare_reports(baseline, candidate, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the timings and peak memory of two reports, target by target.
+
+    Parameters:
+    - baseline: dict, the reference report
+    - candidate: dict, the report to check
+    - threshold: float, relative increase reported as a regression (default is 0.10)
+
+    Returns:
+    - pd.DataFrame: one row per size and target found in both reports, with the ratios of seconds
+      and peak bytes (candidate / baseline) and a "Regression" flag
+    """
+    def frame(report):
+        results = pd.DataFrame(report["results"], columns=["size", "target", "seconds", "peak_bytes"])
+        return results.dropna(subset=["seconds"]).set_index(["size", "target"])
+
+    merged = frame(baseline).join(frame(candidate), how="inner", lsuffix="_baseline", rsuffix="_candidate")
+    merged["SecondsRatio"] = merged["seconds_candidate"] / merged["seconds_baseline"]
+    merged["PeakRatio"] = merged["peak_bytes_candidate"] / merged["peak_bytes_baseline"].where(merged["peak_bytes_baseline"] > 0)
+    merged["Regression"] = (merged["SecondsRatio"] > 1 + threshold) | (merged["PeakRatio"] > 1 + threshold)
+    return merged.reset_index()
+
+
+def _dump_json(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic ledgers and compare reports across commits.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the suite and write a JSON report")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCHMARK_SIZES), help="Rows of the synthetic ledgers (default is 10k, 1M and 10M)")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic ledgers (default is 0)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per target (default is 3)")
+    run_parser.add_argument("--max_excel_rows", type=int, default=DEFAULT_MAX_EXCEL_ROWS, help=f"Largest ledger read from an xlsx file (default is {DEFAULT_MAX_EXCEL_ROWS})")
+    run_parser.add_argument("--num_bootstraps", type=int, default=1000, help="Number of bootstrap samples (default is 1000)")
+    run_parser.add_argument("--output", type=str, default="benchmark_report.json", help="Path of the JSON report (default is benchmark_report.json)")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two JSON reports, exit with status 1 on a regression")
+    compare_parser.add_argument("baseline", type=str, help="Reference report")
+    compare_parser.add_argument("candidate", type=str, help="Report to check")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Relative increase reported as a regression (default is {DEFAULT_THRESHOLD})")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        records = run_suite(args.sizes, seed=args.seed, repeat=args.repeat, max_excel_rows=args.max_excel_rows, num_bootstraps=args.num_bootstraps)
+        report = build_report(records, args.seed, args.repeat)
+        write_atomically(args.output, lambda tmp_path: _dump_json(report, tmp_path))
+        print(f"Report written to {args.output}")
+        return
+
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        comparison = compare_reports(json.load(baseline), json.load(candidate), threshold=args.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(comparison[["size", "target", "seconds_baseline", "seconds_candidate", "SecondsRatio", "PeakRatio", "Regression"]])
+    if comparison["Regression"].any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+
+
+def time_call(func, *args, repeat=5, **kwargs):
+    """
+    Time a function call, keeping the best of several runs.
+
+    Parameters:
+    - func: callable, the function to time
+    - repeat: int, number of runs (default is 5)
+
+    Returns:
+    - tuple: the best wall time in seconds and the result of the last call
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_hospital_extraction(dataframe, repeat=5):
+    """
+    Compare the per-row apply used to build "Hospital" with the factorized extract_hospital.
+
+    Parameters:
+    - dataframe: pd.DataFrame, a ledger with an "ORIGEN" column
+    - repeat: int, number of runs per implementation (default is 5)
+
+    Returns:
+    - dict: timings in seconds and the speedup of the factorized path
+    """
+    origen = dataframe["ORIGEN"]
+    apply_time, expected = time_call(lambda: origen.apply(lambda x: '-'.join(x.split('-')[:-1])), repeat=repeat)
+    factorized_time, result = time_call(dt.extract_hospital, origen, repeat=repeat)
+
+    if not result.equals(expected):
+        raise AssertionError("extract_hospital does not match the apply implementation.")
+
+    return {
+        "rows": len(dataframe),
+        "apply_seconds": apply_time,
+        "factorized_seconds": factorized_time,
+        "speedup": apply_time / factorized_time,
+    }
+
+
+def benchmark_parallel_scaling(dataframe, repeat=3, max_workers=None):
+    """
+    Time the aggregations of data_treatment.main() on a process pool with 1 to N workers.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - repeat: int, number of runs per worker count (default is 3)
+    - max_workers: int, largest number of workers (default is the number of CPUs)
+
+    Returns:
+    - dict: seconds per worker count and per partitioning column
+    """
+    from analysis.parallel import PARTITION_KEYS, aggregate_in_parallel
+
+    enriched = dt.enrich_dataset(dataframe)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    timings = {}
+    for partition_by in PARTITION_KEYS:
+        for workers in range(1, max_workers + 1):
+            seconds, _ = time_call(aggregate_in_parallel, enriched, dt.MAIN_AGGREGATION_PLAN, workers=workers, partition_by=partition_by, repeat=repeat)
+            timings[f"{partition_by}/{workers}"] = seconds
+    return timings
+
+
+def _legacy_spending_range(data, confidence_level=0.95, num_bootstraps=1000):
+    """
+    Previous calculate_spending_range: one num_bootstraps x len(data) resampling matrix per call.
+    """
+    bootstrap_means = np.mean(np.random.choice(data, size=(num_bootstraps, len(data)), replace=True), axis=1)
+    return (np.percentile(bootstrap_means, (1 - confidence_level) / 2 * 100),
+            np.percentile(bootstrap_means, (1 + confidence_level) / 2 * 100))
+
+
+def benchmark_bootstrap(dataframe, repeat=3, num_bootstraps=1000):
+    """
+    Compare one call per series of the previous bootstrap with the grouped calculate_spending_ranges,
+    on the monthly spending of every "CODIGO".
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - repeat: int, number of runs per implementation (default is 3)
+    - num_bootstraps: int, the number of bootstrap samples (default is 1000)
+
+    Returns:
+    - dict: timings in seconds and the speedup of the grouped implementation
+    """
+    enriched = dt.enrich_dataset(dataframe)
+    monthly = enriched.groupby(["CODIGO", "Year", "Month"], observed=True)["IMPORTELINEA"].sum().reset_index()
+    series = [group["IMPORTELINEA"].to_numpy() for _, group in monthly.groupby("CODIGO", observed=True)]
+
+    legacy_time, _ = time_call(lambda: [_legacy_spending_range(values, num_bootstraps=num_bootstraps) for values in series], repeat=repeat)
+    grouped_time, _ = time_call(dt.calculate_spending_ranges, monthly, "IMPORTELINEA", ["CODIGO"], num_bootstraps=num_bootstraps, rng=0, repeat=repeat)
+    bca_time, _ = time_call(dt.calculate_spending_ranges, monthly, "IMPORTELINEA", ["CODIGO"], num_bootstraps=num_bootstraps, rng=0, method="bca", repeat=repeat)
+
+    return {
+        "series": len(series),
+        "values": len(monthly),
+        "legacy_seconds": legacy_time,
+        "grouped_seconds": grouped_time,
+        "grouped_bca_seconds": bca_time,
+        "speedup": legacy_time / grouped_time,
+    }
+
+
+def _legacy_sequences(dataframe, sequence_length):
+    """
+    Previous window builder of train.py: one iloc lookup per window and target.
+    """
+    X, y = [], []
+    for i in range(len(dataframe) - sequence_length):
+        X.append(dataframe.iloc[i:i+sequence_length]['CODIGO'].values)
+        y.append(dataframe.iloc[i+sequence_length]['CANTIDADCOMPRA'])
+    X = pd.DataFrame(X).values.reshape(len(X), sequence_length, 1)
+    return X, pd.Series(y)
+
+
+def benchmark_windowing(dataframe, repeat=3, sequence_length=10, max_rows=20_000):
+    """
+    Compare the iloc loop previously used by train.py with windowing.build_sequences.
+
+    Parameters:
+    - dataframe: pd.DataFrame, a ledger with "CODIGO" and "CANTIDADCOMPRA" columns
+    - repeat: int, number of runs per implementation (default is 3)
+    - sequence_length: int, number of rows per window (default is 10)
+    - max_rows: int, rows of the ledger used, the loop being too slow for the whole of it (default is 20000)
+
+    Returns:
+    - dict: timings in seconds and the speedup of the vectorized builder
+    """
+    from analysis.windowing import build_sequences
+
+    sample = dataframe[["CODIGO", "CANTIDADCOMPRA"]].head(max_rows).reset_index(drop=True)
+    sample["CODIGO"] = pd.factorize(sample["CODIGO"])[0]
+
+    loop_time, (expected_X, expected_y) = time_call(_legacy_sequences, sample, sequence_length, repeat=repeat)
+    vectorized_time, (X, y) = time_call(build_sequences, sample, ["CODIGO"], "CANTIDADCOMPRA", sequence_length, repeat=repeat)
+
+    if not (np.array_equal(X, expected_X) and np.array_equal(y, expected_y.to_numpy())):
+        raise AssertionError("build_sequences does not match the iloc loop.")
+
+    return {
+        "rows": len(sample),
+        "windows": len(X),
+        "loop_seconds": loop_time,
+        "vectorized_seconds": vectorized_time,
+        "speedup": loop_time / vectorized_time,
+    }
+
+
+def _lstm_backtest(matrix, horizon, n_lags=12, epochs=150):
+    """
+    Fit the LSTM of train.py on windows of every monthly series but the last horizon months, then
+    forecast those months recursively. Series are scaled by their mean so they can share one model.
+    """
+    from keras.layers import LSTM, Dense
+    from keras.models import Sequential
+
+    from analysis.windowing import sliding_windows
+
+    history, actual = matrix[:, :-horizon], matrix[:, -horizon:]
+    scale = np.maximum(history.mean(axis=1, keepdims=True), 1e-9)
+    scaled = history / scale
+
+    windows = sliding_windows(scaled.T, n_lags)[:-1].transpose(2, 0, 1)
+    X = windows.reshape(-1, n_lags, 1)
+    y = scaled[:, n_lags:].reshape(-1)
+
+    start = time.perf_counter()
+    model = Sequential()
+    model.add(LSTM(50, input_shape=(n_lags, 1)))
+    model.add(Dense(1))
+    model.compile(loss='mean_squared_error', optimizer='adam')
+    model.fit(X, y, epochs=epochs, batch_size=32, verbose=0)
+
+    inputs = scaled[:, -n_lags:].copy()
+    forecasts = np.empty_like(actual)
+    for step in range(horizon):
+        forecasts[:, step] = model.predict(inputs[..., None], verbose=0)[:, 0]
+        inputs = np.concatenate([inputs[:, 1:], forecasts[:, step:step + 1]], axis=1)
+    seconds = time.perf_counter() - start
+
+    errors = forecasts * scale - actual
+    return {"Method": "lstm", "FitSeconds": seconds, "MAE": np.mean(np.abs(errors)), "RMSE": np.sqrt(np.mean(errors ** 2))}
+
+
+def benchmark_forecasting(dataframe, repeat=3, horizon=3, lstm_epochs=150):
+    """
+    Fit time and hold-out error of the vectorized forecasters on the monthly "CANTIDADCOMPRA" of every
+    "CODIGO", compared with the LSTM of train.py when Keras is installed.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - repeat: int, number of runs of the vectorized forecasters (default is 3)
+    - horizon: int, number of months held out (default is 3)
+    - lstm_epochs: int, training epochs of the LSTM (default is 150, as in train.py)
+
+    Returns:
+    - dict: fit seconds, MAE and RMSE per method
+    """
+    from analysis.forecasting import backtest_forecasts, monthly_series
+
+    matrix, labels, _ = monthly_series(dataframe)
+    scores = backtest_forecasts(matrix, horizon)
+    for _ in range(repeat - 1):
+        scores["FitSeconds"] = np.minimum(scores["FitSeconds"], backtest_forecasts(matrix, horizon)["FitSeconds"])
+
+    scores = scores.to_dict("records")
+    try:
+        scores.append(_lstm_backtest(matrix, horizon, epochs=lstm_epochs))
+    except ImportError:
+        print("Keras is not installed, skipping the LSTM.")
+
+    return {
+        "series": len(labels),
+        "months": matrix.shape[1],
+        **{score["Method"]: {key: score[key] for key in ("FitSeconds", "MAE", "RMSE")} for score in scores},
+    }
+
+
+def benchmark_search(dataframe, repeat=5, column_name="PRODUCTO", queries=("aposito", "plata", "fibras", "apósito de")):
+    """
+    Compare str.contains scans with the search index for repeated filter_rows_by_column_value calls.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - repeat: int, number of runs per implementation (default is 5)
+    - column_name: str, the column searched (default is "PRODUCTO")
+    - queries: iterable of str, the searched substrings
+
+    Returns:
+    - dict: timings in seconds of the scans, of the index build and of uncached and cached indexed searches
+    """
+    from analysis.search_index import build_search_index
+
+    def scan():
+        return [dt.filter_rows_by_column_value(dataframe, column_name, query) for query in queries]
+
+    def indexed(index, clear_cache):
+        if clear_cache:
+            index.clear_cache()
+        return [dt.filter_rows_by_column_value(dataframe, column_name, query, index=index) for query in queries]
+
+    index = build_search_index(dataframe)
+    build_time, _ = time_call(lambda: build_search_index(dataframe).column_index(column_name), repeat=repeat)
+    index.column_index(column_name)
+
+    scan_time, expected = time_call(scan, repeat=repeat)
+    uncached_time, result = time_call(indexed, index, True, repeat=repeat)
+    cached_time, _ = time_call(indexed, index, False, repeat=repeat)
+
+    if not all(got.equals(want) for got, want in zip(result, expected)):
+        raise AssertionError("The search index does not match str.contains.")
+
+    return {
+        "rows": len(dataframe),
+        "queries": len(queries),
+        "scan_seconds": scan_time,
+        "index_build_seconds": build_time,
+        "indexed_seconds": uncached_time,
+        "cached_seconds": cached_time,
+        "speedup": scan_time / uncached_time,
+    }
+
+
+BENCHMARKS = {
+    "bootstrap": benchmark_bootstrap,
+    "forecasting": benchmark_forecasting,
+    "hospital": benchmark_hospital_extraction,
+    "parallel": benchmark_parallel_scaling,
+    "search": benchmark_search,
+    "windowing": benchmark_windowing,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on an Excel dataset.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--benchmark", choices=sorted(BENCHMARKS), action="append", help="Benchmark to run (default is all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per implementation (default is 5)")
+    parser.add_argument("--workers", type=int, default=None, help="Largest worker count of the parallel benchmark (default is the number of CPUs)")
+
+    args = parser.parse_args()
+
+    dataframe = dt.read_excel_dataset(args.file_path, args.sheet_name)
+    if dataframe is None:
+        return
+
+    for name in args.benchmark or sorted(BENCHMARKS):
+        options = {"max_workers": args.workers} if name == "parallel" else {}
+        print(f"{name}: {BENCHMARKS[name](dataframe, repeat=args.repeat, **options)}")
+
+
+if __name__ == "__main__":
+    main()
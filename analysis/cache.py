@@ -0,0 +1,193 @@
+import argparse
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR_NAME = ".dataton_cache"
+
+# Rows per Parquet row group, so chunked readers never have to decode more than this at once
+CACHE_ROW_GROUP_SIZE = 100_000
+
+
+def default_cache_dir(file_path):
+    """
+    Return the default cache directory for a workbook (a hidden folder next to it).
+
+    Parameters:
+    - file_path: str, path to the Excel file
+
+    Returns:
+    - str: path to the cache directory
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), DEFAULT_CACHE_DIR_NAME)
+
+
+def cache_key(file_path, sheet_name='Sheet1'):
+    """
+    Build the cache key of a workbook sheet from its path, mtime, size and sheet name.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet (default is 'Sheet1')
+
+    Returns:
+    - str: hexadecimal key that changes whenever the workbook changes
+    """
+    stat = os.stat(file_path)
+    raw = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}|{sheet_name}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# Errors of building or reading a Parquet file: a missing pyarrow, columns pyarrow cannot convert
+# (e.g. "CODIGO" mixing strings and integers, pyarrow's ArrowInvalid and ArrowTypeError are
+# ValueError and TypeError subclasses), and unreadable or truncated files
+CACHE_ERRORS = (ImportError, ValueError, TypeError, OSError)
+
+# Cache files are named "<stem>-<path hash>-<sheet>-<key>.parquet", the key being 16 hex digits
+_KEY_PATTERN = "[0-9a-f]" * 16
+
+
+def _workbook_prefix(file_path):
+    # The hash of the path tells apart workbooks whose names share a prefix ("data" and "data-2023")
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:8]
+    return f"{stem}-{path_hash}-"
+
+
+def _cache_prefix(file_path, sheet_name):
+    return f"{_workbook_prefix(file_path)}{sheet_name}-"
+
+
+def cache_path(file_path, sheet_name='Sheet1', cache_dir=None):
+    """
+    Return the Parquet file that caches a workbook sheet.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet (default is 'Sheet1')
+    - cache_dir: str, cache directory (default is next to the workbook)
+
+    Returns:
+    - str: path to the cached Parquet file
+    """
+    cache_dir = cache_dir or default_cache_dir(file_path)
+    key = cache_key(file_path, sheet_name)
+    return os.path.join(cache_dir, f"{_cache_prefix(file_path, sheet_name)}{key}.parquet")
+
+
+def invalidate_cache(file_path, sheet_name=None, cache_dir=None):
+    """
+    Delete every cached version of a workbook, or of one of its sheets.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, sheet to invalidate (default is None, every sheet)
+    - cache_dir: str, cache directory (default is next to the workbook)
+
+    Returns:
+    - int: number of cache files removed
+    """
+    cache_dir = cache_dir or default_cache_dir(file_path)
+    if sheet_name is None:
+        pattern = f"{glob.escape(_workbook_prefix(file_path))}*-{_KEY_PATTERN}.parquet"
+    else:
+        pattern = f"{glob.escape(_cache_prefix(file_path, sheet_name))}{_KEY_PATTERN}.parquet"
+
+    removed = 0
+    for path in glob.glob(os.path.join(glob.escape(cache_dir), pattern)):
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def build_cache(file_path, sheet_name='Sheet1', cache_dir=None):
+    """
+    Parse a workbook sheet with openpyxl and store it as a Parquet file.
+
+    Stale versions of the same sheet are removed, and the Parquet file is written
+    to a temporary name first so concurrent readers never see a partial file.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet (default is 'Sheet1')
+    - cache_dir: str, cache directory (default is next to the workbook)
+
+    Returns:
+    - pd.DataFrame: the sheet that was cached
+    """
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    _write_cache(df, file_path, sheet_name, cache_dir)
+    return df
+
+
+def _write_cache(df, file_path, sheet_name, cache_dir):
+    target = cache_path(file_path, sheet_name, cache_dir)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    invalidate_cache(file_path, sheet_name, os.path.dirname(target))
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False, row_group_size=CACHE_ROW_GROUP_SIZE)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_cached_sheet(file_path, sheet_name='Sheet1', columns=None, cache_dir=None):
+    """
+    Load a workbook sheet from its columnar cache, building the cache on a miss.
+
+    When the cache cannot be read, or the sheet cannot be stored as Parquet (see CACHE_ERRORS),
+    the workbook is parsed and the sheet returned all the same.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet (default is 'Sheet1')
+    - columns: list of str, columns to load (default is None, all columns)
+    - cache_dir: str, cache directory (default is next to the workbook)
+
+    Returns:
+    - pd.DataFrame: the cached sheet
+    """
+    target = cache_path(file_path, sheet_name, cache_dir)
+    if os.path.exists(target):
+        try:
+            return pd.read_parquet(target, columns=columns)
+        except CACHE_ERRORS as e:
+            # A truncated or corrupt file, or no pyarrow: parse the workbook again
+            print(f"Could not read the cache of sheet '{sheet_name}' of {file_path}, parsing the workbook: {e}")
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    try:
+        _write_cache(df, file_path, sheet_name, cache_dir)
+    except CACHE_ERRORS as e:
+        print(f"Could not cache sheet '{sheet_name}' of {file_path}, it will be parsed again next time: {e}")
+    if columns is not None:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in sheet '{sheet_name}'.")
+        df = df[columns]
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the columnar cache of Excel datasets.")
+    parser.add_argument("command", choices=["rebuild", "invalidate"], help="Action to run on the cache")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet (default is 'Sheet1')")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Cache directory (default is next to the workbook)")
+
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        df = build_cache(args.file_path, args.sheet_name, args.cache_dir)
+        print(f"Cached {len(df)} rows to {cache_path(args.file_path, args.sheet_name, args.cache_dir)}")
+    else:
+        removed = invalidate_cache(args.file_path, args.sheet_name, args.cache_dir)
+        print(f"Removed {removed} cache file(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+import argparse
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+from analysis.memoize import SOURCE_KEY_ATTR
+from analysis.writers import write_atomically
+
+DIMENSIONS = ("Year", "Month", "Hospital", "TIPOCOMPRA", "TGL")
+MEASURES = ("IMPORTELINEA", "CANTIDADCOMPRA", "TOTALUNIDADES")
+COUNT = "Count"
+
+# Number of ledger cubes kept in memory by ledger_cube, least recently used evicted first
+LEDGER_CUBE_CACHE_SIZE = 4
+
+_ledger_cubes = OrderedDict()
+_ledger_cubes_lock = threading.Lock()
+
+
+class Cube:
+    """
+    Dense OLAP cube of the ledger at the Year x Month x Hospital x TIPOCOMPRA x TGL grain.
+
+    Every cell holds the number of rows and, for each measure, the sum and the number of non-missing
+    values (so means skip missing values as pandas does). Each axis has one slot per label plus a
+    last slot for rows where the dimension is missing: roll-ups over the dimension include those rows,
+    while results grouped by it leave them out, as groupby does.
+
+    A cube built from a ledger remembers the dtypes of its dimension columns, so its results have
+    the same key dtypes as groupby on the ledger; a loaded cube returns NumPy dtypes.
+    """
+
+    def __init__(self, labels, counts, sums, valid_counts, integer_measures=(), dtypes=None):
+        self.labels = {dim: np.asarray(values) for dim, values in labels.items()}
+        self.dtypes = dict(dtypes or {})
+        self.dimensions = tuple(labels)
+        self.counts = counts
+        self.sums = sums
+        self.valid_counts = valid_counts
+        self.integer_measures = set(integer_measures)
+
+    @property
+    def measures(self):
+        return tuple(self.sums)
+
+    def _axis(self, dimension):
+        if dimension not in self.labels:
+            raise ValueError(f"Unknown dimension '{dimension}', expected one of {self.dimensions}.")
+        return self.dimensions.index(dimension)
+
+    def _reduce(self, array, keys):
+        axes = tuple(axis for axis, dim in enumerate(self.dimensions) if dim not in keys)
+        reduced = array.sum(axis=axes)
+        # Order the remaining axes as the keys and drop their missing slot
+        kept = [dim for dim in self.dimensions if dim in keys]
+        reduced = np.moveaxis(reduced, [kept.index(key) for key in keys], range(len(keys)))
+        return reduced[tuple(slice(0, len(self.labels[key])) for key in keys)]
+
+    def _key_values(self, key, positions):
+        values = self.labels[key][positions]
+        if key in self.dtypes:
+            return pd.array(values, dtype=self.dtypes[key])
+        return values
+
+    def rollup(self, keys, measures=None):
+        """
+        Aggregate the cube up to some of its dimensions.
+
+        Parameters:
+        - keys: list of str, the dimensions to keep, in the order of the result columns
+        - measures: list of str, the measures to sum (default is all of them)
+
+        Returns:
+        - pd.DataFrame: the keys, "Count" and the sum of each measure for every non-empty combination, sorted by the keys
+        """
+        keys = list(keys)
+        for key in keys:
+            self._axis(key)
+        measures = self.measures if measures is None else measures
+
+        counts = self._reduce(self.counts, keys)
+        cells = np.nonzero(counts)
+        result = pd.DataFrame({key: self._key_values(key, cells[position]) for position, key in enumerate(keys)})
+        result[COUNT] = counts[cells]
+        for measure in measures:
+            values = self._reduce(self.sums[measure], keys)[cells]
+            result[measure] = values.astype(np.int64) if measure in self.integer_measures else values
+        return result
+
+    def aggregate(self, keys, measure=None, reducer="count", output=None):
+        """
+        Answer one aggregation from the cube, as dt.run_aggregation_plan would from the ledger.
+
+        Parameters:
+        - keys: list of str, the dimensions to group by
+        - measure: str, the measure to reduce (None for "count")
+        - reducer: str, one of "count", "sum" or "mean"
+        - output: str, name of the result column (default is the reducer or the measure)
+
+        Returns:
+        - pd.DataFrame: the keys and the output column, sorted by the keys
+        """
+        if reducer not in ("count", "sum", "mean"):
+            raise ValueError(f"The cube answers 'count', 'sum' and 'mean' aggregations, not '{reducer}'.")
+        if reducer != "count" and measure not in self.sums:
+            raise ValueError(f"Unknown measure '{measure}', expected one of {self.measures}.")
+
+        keys = list(keys)
+        result = self.rollup(keys, measures=[])
+        output = output or (COUNT if reducer == "count" else measure)
+        if reducer == "count":
+            return result.rename(columns={COUNT: output})
+
+        cells = np.nonzero(self._reduce(self.counts, keys))
+        sums = self._reduce(self.sums[measure], keys)[cells]
+        if reducer == "sum":
+            result[output] = sums.astype(np.int64) if measure in self.integer_measures else sums
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[output] = sums / self._reduce(self.valid_counts[measure], keys)[cells]
+        return result.drop(columns=COUNT)
+
+    def dice(self, **selections):
+        """
+        Restrict the cube to some labels of one or more dimensions.
+
+        Parameters:
+        - selections: maps dimension names to one label or a list of labels to keep
+
+        Returns:
+        - Cube: the sub-cube, without the rows missing a selected dimension
+        """
+        labels = dict(self.labels)
+        index = [slice(None)] * len(self.dimensions)
+        for dimension, values in selections.items():
+            axis = self._axis(dimension)
+            values = np.atleast_1d(np.asarray(values, dtype=self.labels[dimension].dtype))
+            positions = np.flatnonzero(np.isin(self.labels[dimension], values))
+            labels[dimension] = self.labels[dimension][positions]
+            # Keep an empty missing slot so every axis keeps the same layout
+            index[axis] = np.append(positions, -1)
+
+        def take(array):
+            for axis, item in enumerate(index):
+                if not isinstance(item, slice):
+                    array = np.take(array, item, axis=axis)
+                    missing = [slice(None)] * array.ndim
+                    missing[axis] = -1
+                    array[tuple(missing)] = 0
+            return array
+
+        return Cube(
+            labels,
+            take(self.counts),
+            {measure: take(values) for measure, values in self.sums.items()},
+            {measure: take(values) for measure, values in self.valid_counts.items()},
+            self.integer_measures,
+            self.dtypes,
+        )
+
+    def slice(self, dimension, value):
+        """
+        Fix one dimension of the cube to a single label.
+
+        Parameters:
+        - dimension: str, the dimension to fix
+        - value: the label to keep
+
+        Returns:
+        - Cube: the slice, which still has the dimension with a single label
+        """
+        return self.dice(**{dimension: [value]})
+
+    def save(self, path):
+        """
+        Store the cube in a compressed .npz file, written atomically.
+
+        Parameters:
+        - path: str, path of the .npz file
+        """
+        arrays = {"dimensions": np.asarray(self.dimensions), "counts": self.counts, "integer_measures": np.asarray(sorted(self.integer_measures), dtype=str)}
+        for dim, values in self.labels.items():
+            arrays[f"labels__{dim}"] = values
+        for measure in self.measures:
+            arrays[f"sum__{measure}"] = self.sums[measure]
+            arrays[f"n__{measure}"] = self.valid_counts[measure]
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as cube_file:
+                np.savez_compressed(cube_file, **arrays)
+
+        write_atomically(path, write)
+
+
+def load_cube(path):
+    """
+    Load a cube stored by Cube.save.
+
+    Parameters:
+    - path: str, path of the .npz file
+
+    Returns:
+    - Cube: the cube
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        dimensions = [str(dim) for dim in arrays["dimensions"]]
+        measures = [name.split("__", 1)[1] for name in arrays.files if name.startswith("sum__")]
+        return Cube(
+            {dim: arrays[f"labels__{dim}"] for dim in dimensions},
+            arrays["counts"],
+            {measure: arrays[f"sum__{measure}"] for measure in measures},
+            {measure: arrays[f"n__{measure}"] for measure in measures},
+            [str(measure) for measure in arrays["integer_measures"]],
+        )
+
+
+def build_cube(dataframe, dimensions=DIMENSIONS, measures=MEASURES):
+    """
+    Compute the cube of a ledger in one pass over its rows.
+
+    "TOTALUNIDADES" is derived from "CANTIDADCOMPRA" and "UNIDADESCONSUMOCONTENIDAS" when the
+    ledger does not have it; other missing measures are skipped.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger, enriched or not
+    - dimensions: list of str, the dimensions of the cube (default is DIMENSIONS)
+    - measures: list of str, the measures summed in every cell (default is MEASURES)
+
+    Returns:
+    - Cube: the cube
+    """
+    if not all(dim in dataframe.columns for dim in dimensions):
+        dataframe = dt.enrich_dataset(dataframe)
+    missing = [dim for dim in dimensions if dim not in dataframe.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} are required in the DataFrame.")
+
+    columns = {}
+    for measure in measures:
+        if measure in dataframe.columns:
+            columns[measure] = dataframe[measure]
+        elif measure == "TOTALUNIDADES" and {"CANTIDADCOMPRA", "UNIDADESCONSUMOCONTENIDAS"} <= set(dataframe.columns):
+            columns[measure] = dt.total_units(dataframe)
+
+    labels = {}
+    codes = []
+    for dim in dimensions:
+        dim_codes, uniques = pd.factorize(dataframe[dim], sort=True)
+        labels[dim] = np.asarray(uniques.astype(object) if isinstance(uniques.dtype, pd.CategoricalDtype) else uniques)
+        if labels[dim].dtype == object:
+            labels[dim] = labels[dim].astype(str)
+        # Missing values go to the last slot of the axis
+        codes.append(np.where(dim_codes >= 0, dim_codes, len(uniques)))
+
+    shape = tuple(len(labels[dim]) + 1 for dim in dimensions)
+    flat = np.ravel_multi_index(codes, shape)
+    size = int(np.prod(shape))
+
+    counts = np.bincount(flat, minlength=size).reshape(shape)
+    sums = {}
+    valid_counts = {}
+    for measure, series in columns.items():
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(values)
+        sums[measure] = np.bincount(flat[valid], weights=values[valid], minlength=size).reshape(shape)
+        valid_counts[measure] = np.bincount(flat[valid], minlength=size).reshape(shape)
+
+    integer_measures = [measure for measure, series in columns.items() if pd.api.types.is_integer_dtype(series)]
+    return Cube(labels, counts, sums, valid_counts, integer_measures, {dim: dataframe[dim].dtype for dim in dimensions})
+
+
+def _ledger_columns(dataframe):
+    """
+    The DIMENSIONS and MEASURES a ledger has or can derive (see dt.derive_columns).
+    """
+    sources = {"Year": {"FECHAPEDIDO"}, "Month": {"FECHAPEDIDO"}, "Hospital": {"ORIGEN"},
+               "TOTALUNIDADES": {"CANTIDADCOMPRA", "UNIDADESCONSUMOCONTENIDAS"}}
+    available = set(dataframe.columns)
+    dimensions = [dim for dim in DIMENSIONS if dim in available or sources.get(dim, {dim}) <= available]
+    measures = [measure for measure in MEASURES if measure in available or sources.get(measure, {measure}) <= available]
+    return dimensions, measures
+
+
+def ledger_cube(dataframe):
+    """
+    Return the cube of a ledger over every dimension and measure it has, built once per ledger.
+
+    The cubes of the last LEDGER_CUBE_CACHE_SIZE ledgers read from a file (which carry its source
+    key, see dt.read_excel_dataset) are kept in memory while those ledgers are alive, so every
+    query on a ledger rolls up the same cube. A ledger edited in place after its cube was built keeps
+    that cube unless its shape changed. Other DataFrames get a new cube on every call.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger, enriched or not
+
+    Returns:
+    - Cube: the cube of the ledger
+    """
+    source_key = dataframe.attrs.get(SOURCE_KEY_ATTR)
+    key = None if source_key is None else (source_key, id(dataframe))
+    if key is not None:
+        with _ledger_cubes_lock:
+            entry = _ledger_cubes.get(key)
+            # The id of a ledger that was garbage collected can be reused by another DataFrame
+            if entry is not None and entry[0]() is dataframe and entry[1] == dataframe.shape:
+                _ledger_cubes.move_to_end(key)
+                return entry[2]
+
+    dimensions, measures = _ledger_columns(dataframe)
+    cube = build_cube(dt.derived_view(dataframe, [*dimensions, *measures]), dimensions, measures)
+    if key is not None:
+        with _ledger_cubes_lock:
+            # Dropped with the ledger; no lock here, the callback can run while the lock is held
+            forget = lambda _, key=key: _ledger_cubes.pop(key, None)
+            _ledger_cubes[key] = (weakref.ref(dataframe, forget), dataframe.shape, cube)
+            _ledger_cubes.move_to_end(key)
+            while len(_ledger_cubes) > LEDGER_CUBE_CACHE_SIZE:
+                _ledger_cubes.popitem(last=False)
+    return cube
+
+
+# Queries answering the data_treatment functions whose keys are all dimensions of the cube: the
+# data_treatment functions of the same names roll up the cube of their ledger (see ledger_cube)
+
+def group_by_origen_and_date(cube):
+    """
+    Count the purchases of every hospital and year, as dt.group_by_origen_and_date.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return cube.aggregate(["Hospital", "Year"], output="Purchases")
+
+
+def sum_importe_by_fecha(cube):
+    """
+    Sum "IMPORTELINEA" for every year, as dt.sum_importe_by_fecha.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return cube.aggregate(["Year"], "IMPORTELINEA", "sum", "TotalImporte")
+
+
+def sum_importe_by_month(cube):
+    """
+    Sum "IMPORTELINEA" for every "mm/yy" month, as dt.sum_importe_by_month.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return dt._label_months(cube.aggregate(["Month", "Year"], "IMPORTELINEA", "sum", "TotalImporte"))
+
+
+def sum_cantidad_by_fecha(cube):
+    """
+    Sum "CANTIDADCOMPRA" for every year, as dt.sum_cantidad_by_fecha.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return cube.aggregate(["Year"], "CANTIDADCOMPRA", "sum", "TotalCantidad")
+
+
+def count_occurrences_by_year(cube):
+    """
+    Count the purchases of every year, most frequent first, as dt.count_occurrences_by_year.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    result = cube.aggregate(["Year"], output="Occurrences")
+    return result.sort_values("Occurrences", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def count_occurrences_by_tipo_and_year(cube):
+    """
+    Count the purchases of every year and "TIPOCOMPRA", as dt.count_occurrences_by_tipo_and_year.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return cube.aggregate(["Year", "TIPOCOMPRA"], output="Occurrences")
+
+
+def calculate_average_quantity_by_tipo_and_year(cube):
+    """
+    Average "CANTIDADCOMPRA" for every year and "TIPOCOMPRA", as dt.calculate_average_quantity_by_tipo_and_year.
+
+    Parameters:
+    - cube: Cube, the cube of the ledger
+
+    Returns:
+    - pd.DataFrame: the result of the data_treatment function of the same name on the ledger
+    """
+    return cube.aggregate(["Year", "TIPOCOMPRA"], "CANTIDADCOMPRA", "mean", "AverageQuantity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the OLAP cube of an Excel ledger.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--output", type=str, default="excels/cube.npz", help="Path of the cube file (default is excels/cube.npz)")
+
+    args = parser.parse_args()
+
+    dataframe = dt.read_excel_dataset(args.file_path, args.sheet_name, compact=True)
+    if dataframe is None:
+        return
+
+    start = time.perf_counter()
+    cube = build_cube(dataframe)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    cube.save(args.output)
+    print(f"Built a {' x '.join(str(len(values)) for values in cube.labels.values())} cube in {time.perf_counter() - start:.3f}s, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
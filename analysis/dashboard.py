@@ -0,0 +1,88 @@
+import argparse
+import glob
+import json
+import os
+
+import pandas as pd
+
+from analysis.writers import write_atomically, write_dataframe
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+# Labels shown by the dataset selector of the React dashboard
+DATASET_LABELS = {
+    "codigo_origen_df": "Code - Origin",
+    "hospital_year_purchases": "Hospital year - Purchases",
+    "year_money": "Year - Money",
+    "year_purchases": "Year - Purchase",
+    "year_tipo_average": "Year - Average type",
+    "year_tipo": "Year - Type",
+}
+
+
+def _file_entry(output_dir, file_name):
+    path = os.path.join(output_dir, file_name)
+    if not os.path.exists(path):
+        return None
+    return {"path": file_name, "bytes": os.path.getsize(path)}
+
+
+def publish_dashboard_artifacts(dataframes, output_dir, up_to_date=()):
+    """
+    Write a columnar JSON file (see writers.to_columnar_json) next to each published dataset and a
+    manifest listing them, so the dashboard can load them without parsing a spreadsheet in the browser.
+
+    Parameters:
+    - dataframes: dict, maps each dataset name (file name without extension) to its DataFrame
+    - output_dir: str, directory of the published datasets
+    - up_to_date: iterable of str, datasets whose JSON file is current (e.g. just written by
+      writers.write_outputs), only written when missing (default is none)
+
+    Returns:
+    - dict: the manifest that was written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    up_to_date = set(up_to_date)
+
+    datasets = []
+    for name, dataframe in dataframes.items():
+        json_path = os.path.join(output_dir, f"{name}.json")
+        if name not in up_to_date or not os.path.exists(json_path):
+            write_dataframe(dataframe, json_path, file_format="json")
+
+        files = {file_format: _file_entry(output_dir, f"{name}.{file_format}") for file_format in ("json", "xlsx")}
+        datasets.append({
+            "name": name,
+            "label": DATASET_LABELS.get(name, name),
+            "rows": len(dataframe),
+            "headers": [str(col) for col in dataframe.columns],
+            "files": {file_format: entry for file_format, entry in files.items() if entry is not None},
+        })
+
+    manifest = {"datasets": datasets}
+
+    def write_manifest(path):
+        with open(path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    write_atomically(os.path.join(output_dir, MANIFEST_FILE_NAME), write_manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish columnar JSON artifacts and a manifest for the xlsx datasets of a directory.")
+    parser.add_argument("output_dir", type=str, help="Directory holding the published xlsx datasets, e.g. public/datasets")
+
+    args = parser.parse_args()
+
+    dataframes = {
+        # Years are "yy" labels, not numbers
+        os.path.splitext(os.path.basename(path))[0]: pd.read_excel(path, dtype={"Year": str})
+        for path in sorted(glob.glob(os.path.join(glob.escape(args.output_dir), "*.xlsx")))
+    }
+    manifest = publish_dashboard_artifacts(dataframes, args.output_dir)
+    print(f"Published {len(manifest['datasets'])} datasets to {os.path.join(args.output_dir, MANIFEST_FILE_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,201 @@
+import os
+import zipfile
+
 import pandas as pd
 import numpy as np
 
-def read_excel_dataset(file_path, sheet_name='Sheet1'):
+import analysis.cache as cache
+from analysis.aggregation import AggregationSpec, plan_inputs, run_aggregation_plan
+from analysis.dashboard import publish_dashboard_artifacts
+from analysis.memoize import SOURCE_KEY_ATTR, memoized
+from analysis.profiling import active_profiler, profiled, profiling, stage
+from analysis.schema import compact_ledger, memory_report, parse_order_dates, widen_integers
+from analysis.writers import FORMATS, write_outputs
+
+# Version of the stored results of the memoized aggregations (see memoize.memoized): bump it when a
+# change to a helper they call (derived_view, the aggregation engine, the cube queries) changes them
+MEMO_VERSION = 1
+
+def read_excel_dataset(file_path, sheet_name='Sheet1', columns=None, use_cache=True, compact=False):
     """
     Read an Excel dataset using Pandas.
 
+    The first read of a sheet stores it in a columnar Parquet cache keyed on the file path,
+    mtime, size and sheet name, so later reads skip the openpyxl parsing entirely.
+    The cache key is also kept in ``df.attrs["source_key"]`` for the fingerprints of memoized aggregations.
+
     Parameters:
     - file_path: str, path to the Excel file
     - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - columns: list of str, columns to load (default is None, all columns)
+    - use_cache: bool, whether to read through the columnar cache (default is True)
+    - compact: bool, whether to convert the columns to the compact dtypes of schema.LEDGER_SCHEMA
+      (categorical codes, datetime64 "FECHAPEDIDO", downcast numbers) and print the memory saved (default is False)
 
     Returns:
-    - DataFrame: Pandas DataFrame containing the dataset
+    - DataFrame: Pandas DataFrame containing the dataset, or None when the workbook cannot be read
     """
     try:
-        # Read the Excel file into a DataFrame
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
-        print(type(df))
-        return df
-    except Exception as e:
+        if use_cache:
+            # Falls back to parsing the workbook when the cache cannot be read or written
+            df = cache.load_cached_sheet(file_path, sheet_name=sheet_name, columns=columns)
+        else:
+            # Read the Excel file into a DataFrame
+            df = pd.read_excel(file_path, sheet_name=sheet_name, usecols=columns)
+        # Identifies the workbook version in the fingerprints of memoized aggregations
+        df.attrs[SOURCE_KEY_ATTR] = cache.cache_key(file_path, sheet_name)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        # A missing or unreadable workbook, an unknown sheet or missing columns
         print(f"Error reading Excel file: {e}")
         return None
+    print(type(df))
+
+    if compact:
+        compact_df = compact_ledger(df)
+        print(memory_report(df, compact_df))
+        df = compact_df
+    return df
     
+def extract_hospital(origen):
+    """
+    Derive the hospital code from "ORIGEN" values by removing their last number ("1-2-60" -> "1-2").
+
+    The prefix is computed once per distinct "ORIGEN" code and mapped back to the rows through
+    the integer codes of ``pd.factorize``, instead of splitting every row in Python.
+
+    Parameters:
+    - origen: pd.Series, the "ORIGEN" column
+
+    Returns:
+    - pd.Series: the hospital code of each row, categorical when "ORIGEN" is
+    """
+    if isinstance(origen.dtype, pd.CategoricalDtype):
+        # Map the categories rather than the rows, and keep the result categorical
+        hospital_codes, hospitals = pd.factorize(origen.cat.categories.map(lambda x: '-'.join(x.split('-')[:-1])), sort=True)
+        codes = origen.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, hospital_codes[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(codes, categories=hospitals), index=origen.index, name=origen.name)
+
+    codes, uniques = pd.factorize(origen)
+    prefixes = np.array(['-'.join(x.split('-')[:-1]) for x in uniques] + [np.nan], dtype=object)
+    return pd.Series(prefixes[codes], index=origen.index, name=origen.name, dtype=origen.dtype)
+
+# Columns derived from "FECHAPEDIDO", which is parsed once for all of them
+DATE_COLUMNS = ("Date", "Year", "Month", "Day")
+# Columns enrich_dataset and derived_view can compute from the ledger
+DERIVED_COLUMNS = (*DATE_COLUMNS, "Hospital", "TOTALUNIDADES")
+
+def total_units(dataframe):
+    """
+    Compute "TOTALUNIDADES", "CANTIDADCOMPRA" multiplied by "UNIDADESCONSUMOCONTENIDAS".
+
+    Both columns are widened first, so the product cannot overflow the downcast columns of a compact ledger.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger with "CANTIDADCOMPRA" and "UNIDADESCONSUMOCONTENIDAS" columns
+
+    Returns:
+    - pd.Series: the total units of each row
+    """
+    return widen_integers(dataframe["CANTIDADCOMPRA"]) * widen_integers(dataframe["UNIDADESCONSUMOCONTENIDAS"])
+
+def derive_columns(dataframe, columns):
+    """
+    Compute some of the DERIVED_COLUMNS of a ledger, and only those.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - columns: list of str, the derived columns to compute
+
+    Returns:
+    - dict: maps each requested column to its Series
+    """
+    unknown = [col for col in columns if col not in DERIVED_COLUMNS]
+    if unknown:
+        raise ValueError(f"Columns {unknown} cannot be derived, expected some of {DERIVED_COLUMNS}.")
+
+    derived = {}
+    if any(col in DATE_COLUMNS for col in columns):
+        if "FECHAPEDIDO" not in dataframe.columns:
+            raise ValueError("The 'FECHAPEDIDO' column is required in the DataFrame.")
+        if pd.api.types.is_datetime64_any_dtype(dataframe["FECHAPEDIDO"]):
+            dates = dataframe["FECHAPEDIDO"].rename(None)
+        else:
+            dates = parse_order_dates(dataframe["FECHAPEDIDO"])
+
+    for col in columns:
+        if col == "Date":
+            derived[col] = dates
+        elif col == "Year":
+            derived[col] = (dates.dt.year % 100).astype("Int16")
+        elif col == "Month":
+            derived[col] = dates.dt.month.astype("Int8")
+        elif col == "Day":
+            derived[col] = dates.dt.day.astype("Int8")
+        elif col == "Hospital":
+            if "ORIGEN" not in dataframe.columns:
+                raise ValueError("The 'ORIGEN' column is required in the DataFrame.")
+            derived[col] = extract_hospital(dataframe["ORIGEN"])
+        else:
+            if "CANTIDADCOMPRA" not in dataframe.columns or "UNIDADESCONSUMOCONTENIDAS" not in dataframe.columns:
+                raise ValueError("Both 'CANTIDADCOMPRA' and 'UNIDADESCONSUMOCONTENIDAS' columns are required in the DataFrame.")
+            derived[col] = total_units(dataframe)
+    return derived
+
+def enrich_dataset(dataframe, columns=None):
+    """
+    Derive the date and hospital columns used by the aggregations in a single pass.
+
+    "FECHAPEDIDO" ("dd/mm/yy", or already datetime64 in a compact ledger) is parsed once per distinct
+    value into a datetime64 "Date" column and compact integer "Year" (two digits, as in the published datasets), "Month" and "Day" columns.
+    "Hospital" is derived from "ORIGEN". The input DataFrame is not modified, and with Copy-on-Write
+    (always on since pandas 3.0) the returned DataFrame shares its original columns instead of copying them.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the input Pandas DataFrame with a "FECHAPEDIDO" column
+    - columns: list of str, the DERIVED_COLUMNS to add (default is the date columns, and "Hospital"
+      when there is an "ORIGEN" column)
+
+    Returns:
+    - pd.DataFrame: a new DataFrame with the derived columns added
+    """
+    if columns is None:
+        if "FECHAPEDIDO" not in dataframe.columns:
+            raise ValueError("The 'FECHAPEDIDO' column is required in the DataFrame.")
+        columns = [*DATE_COLUMNS, "Hospital"] if "ORIGEN" in dataframe.columns else list(DATE_COLUMNS)
+
+    return dataframe.assign(**derive_columns(dataframe, columns))
+
+def derived_view(dataframe, columns):
+    """
+    Return a DataFrame with only some columns of a ledger, computing the derived ones it lacks.
+
+    Columns the ledger already has are shared with it (Copy-on-Write), only the missing
+    DERIVED_COLUMNS are computed, so an aggregation pays for the columns it uses and nothing else.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger, enriched or not
+    - columns: list of str, the columns of the view
+
+    Returns:
+    - pd.DataFrame: the view, with the columns in the requested order
+    """
+    missing = [col for col in columns if col not in dataframe.columns]
+    view = dataframe[[col for col in columns if col in dataframe.columns]]
+    if missing:
+        view = view.assign(**derive_columns(dataframe, missing))
+    return view[list(columns)]
+
+def _cube_query(dataframe, query):
+    """
+    Answer an aggregation with the query of the same name in cube.py, rolled up from the cube of
+    the ledger (see cube.ledger_cube), which is only built once per ledger read from a file.
+    """
+    # cube.py imports this module
+    import analysis.cube as cube
+
+    return getattr(cube, query)(cube.ledger_cube(dataframe))
+
 def count_values_in_column(dataframe, column_name):
     """
     Count the occurrences of each unique value in a specified column of a Pandas DataFrame.
@@ -41,6 +216,8 @@ def count_values_in_column(dataframe, column_name):
 
     return value_counts_dict
 
+@profiled()
+@memoized
 def count_purchases_by_year(dataframe):
     """
     Count the occurrences of the last two digits of "FECHAPEDIDO" for each unique "CODIGO" value.
@@ -54,42 +231,112 @@ def count_purchases_by_year(dataframe):
     if "CODIGO" not in dataframe.columns or "FECHAPEDIDO" not in dataframe.columns:
         raise ValueError("Both 'CODIGO' and 'FECHAPEDIDO' columns are required in the DataFrame.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
+    dataframe = derived_view(dataframe, ["CODIGO", "Year"])
 
-    # Count occurrences for each unique "CODIGO" and last two digits combination
-    result_df = dataframe.groupby(["CODIGO", "Year"]).size().reset_index(name="NumberOfProducts")
+    # Count occurrences for each unique "CODIGO" and year combination
+    result_df = dataframe.groupby(["CODIGO", "Year"], observed=True).size().reset_index(name="NumberOfProducts")
 
     return result_df
 
+@profiled()
+@memoized
 def calculate_total_by_codigo(dataframe):
     """
-    For each unique "CODIGO" value with the same "FECHAPEDIDO" last two digits, 
-    multiply them by their respective "TOTALUNIDADES" and add them.
+    Sum the "TOTALUNIDADES" ("CANTIDADCOMPRA" by "UNIDADESCONSUMOCONTENIDAS") of each unique "CODIGO"
+    value with the same "FECHAPEDIDO" last two digits.
 
     Parameters:
-    - dataframe: pd.DataFrame, the input Pandas DataFrame with "CODIGO", "FECHAPEDIDO", and "TOTALUNIDADES" columns
+    - dataframe: pd.DataFrame, the input Pandas DataFrame with "CODIGO", "FECHAPEDIDO", and "TOTALUNIDADES"
+      (or "CANTIDADCOMPRA" and "UNIDADESCONSUMOCONTENIDAS") columns
 
     Returns:
     - pd.DataFrame: a DataFrame with "CODIGO", "Year", and "TotalByCodigo" columns
     """
-    if "CODIGO" not in dataframe.columns or "FECHAPEDIDO" not in dataframe.columns or "CANTIDADCOMPRA" not in dataframe.columns:
-        raise ValueError("Required columns 'CODIGO', 'FECHAPEDIDO', and 'CANTIDADCOMPRA' are missing.")
+    if "CODIGO" not in dataframe.columns or "FECHAPEDIDO" not in dataframe.columns:
+        raise ValueError("Both 'CODIGO' and 'FECHAPEDIDO' columns are required in the DataFrame.")
+
+    dataframe = derived_view(dataframe, ["CODIGO", "Year", "TOTALUNIDADES"])
+
+    # Sum the total units of each unique "CODIGO" and year combination
+    result_df = dataframe.groupby(["CODIGO", "Year"], observed=True)["TOTALUNIDADES"].sum().reset_index(name="TotalByCodigo")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
+    return result_df
+
+# Measures of calculate_product_totals, computed in one pass over the rows
+PRODUCT_TOTALS_PLAN = [
+    AggregationSpec("units", ["CODIGO", "Year", "Hospital"], "TOTALUNIDADES", "sum", "TotalUnits"),
+    AggregationSpec("spend", ["CODIGO", "Year", "Hospital"], "IMPORTELINEA", "sum", "Spend"),
+    AggregationSpec("orders", ["CODIGO", "Year", "Hospital"], None, "count", "Orders"),
+]
 
-    # Multiply "TOTALUNIDADES" by their respective "CODIGO"
-    dataframe["TotalByCodigo"] = dataframe["CANTIDADCOMPRA"] * dataframe.groupby(["CODIGO", "Year"])["CANTIDADCOMPRA"].transform('sum')
+@profiled()
+@memoized
+def calculate_product_totals(dataframe):
+    """
+    Calculate the total units, spend and number of orders of every "CODIGO" per year and hospital.
 
-    # Drop the intermediate "Year" column if needed
-    # dataframe.drop(columns=["Year"], inplace=True)
+    The three measures come from a single grouped reduction of the aggregation engine.
 
-    # Sum the calculated total for each unique "CODIGO" and last two digits combination
-    result_df = dataframe.groupby(["CODIGO", "Year"])["TotalByCodigo"].sum().reset_index()
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger with "CODIGO", "FECHAPEDIDO", "ORIGEN", "IMPORTELINEA" and
+      "TOTALUNIDADES" (or "CANTIDADCOMPRA" and "UNIDADESCONSUMOCONTENIDAS") columns, enriched or not
+
+    Returns:
+    - pd.DataFrame: a DataFrame with "CODIGO", "Year", "Hospital", "TotalUnits", "Spend" and "Orders" columns
+    """
+    dataframe = derived_view(dataframe, ["CODIGO", "Year", "Hospital", "TOTALUNIDADES", "IMPORTELINEA"])
+    results = run_aggregation_plan(dataframe, PRODUCT_TOTALS_PLAN)
+
+    # Every result has the same groups, in the same (sorted) order
+    result_df = results["units"]
+    result_df["Spend"] = results["spend"]["Spend"].to_numpy()
+    result_df["Orders"] = results["orders"]["Orders"].to_numpy()
 
     return result_df
 
+@profiled()
+def top_products(totals, k=10, by="Spend", group_columns=("Year", "Hospital")):
+    """
+    Rank the products of every group by a measure and keep the k best of each.
+
+    All groups are ranked in one pass: the rows are sorted by group and measure with np.lexsort, so
+    the rank of a row is its distance from the first row of its group. Rows with equal values keep
+    their order in totals.
+
+    Parameters:
+    - totals: pd.DataFrame, one row per product and group, e.g. returned by calculate_product_totals
+    - k: int, number of products kept per group (default is 10)
+    - by: str, the measure to rank by, largest first (default is "Spend")
+    - group_columns: list of str, the columns identifying each group (default is ("Year", "Hospital"))
+
+    Returns:
+    - pd.DataFrame: the group columns, a 1-based "Rank" and the other columns of the k best rows of each group
+    """
+    group_columns = list(group_columns)
+    missing = [col for col in [*group_columns, by] if col not in totals.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in the DataFrame.")
+    if k < 1:
+        raise ValueError("k should be at least 1.")
+
+    values = totals[by].to_numpy(dtype=np.float64, na_value=np.nan)
+    # Missing values rank last
+    keys = np.where(np.isnan(values), np.inf, -values)
+    group_ids = totals.groupby(group_columns, sort=True, observed=True, dropna=False).ngroup().to_numpy()
+    order = np.lexsort((keys, group_ids))
+    starts = np.concatenate([[0], np.cumsum(np.bincount(group_ids))[:-1]]).astype(np.intp)
+    ranks = np.arange(len(order)) - starts[group_ids[order]]
+    best = ranks < k
+    positions = order[best]
+
+    result_df = totals.iloc[positions].reset_index(drop=True)
+    result_df.insert(len(group_columns), "Rank", ranks[best] + 1)
+    other_columns = [col for col in result_df.columns if col not in group_columns and col != "Rank"]
+
+    return result_df[[*group_columns, "Rank", *other_columns]]
+
+@profiled()
+@memoized
 def group_by_origen_and_date(dataframe):
     """
     Group a pandas DataFrame by modified "ORIGEN" column and the last two digits of "FECHAPEDIDO".
@@ -103,17 +350,11 @@ def group_by_origen_and_date(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "ORIGEN" not in dataframe.columns:
         raise ValueError("Both 'FECHAPEDIDO' and 'ORIGEN' columns are required in the DataFrame.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Remove the last number from "ORIGEN" (assuming it's in the format "1-2-60")
-    dataframe["Hospital"] = dataframe["ORIGEN"].apply(lambda x: '-'.join(x.split('-')[:-1]))
-
-    # Group by the modified "ORIGEN" and last two digits of "FECHAPEDIDO"
-    grouped_df = dataframe.groupby(["Hospital", "Year"]).size().reset_index(name="Purchases")
-
-    return grouped_df
+    # Count by the hospital part of "ORIGEN" and the year of "FECHAPEDIDO"
+    return _cube_query(dataframe, "group_by_origen_and_date")
 
+@profiled()
+@memoized
 def group_by_codigo_and_tgl(dataframe):
     """
     Group a pandas DataFrame by "CODIGO" and "TGL" columns.
@@ -128,10 +369,12 @@ def group_by_codigo_and_tgl(dataframe):
         raise ValueError("Both 'CODIGO' and 'TGL' columns are required in the DataFrame.")
 
     # Group by "CODIGO" and "TGL"
-    grouped_df = dataframe.groupby(["CODIGO", "TGL"]).size().reset_index(name="Counts")
+    grouped_df = dataframe.groupby(["CODIGO", "TGL"], observed=True).size().reset_index(name="Counts")
 
     return grouped_df
 
+@profiled()
+@memoized
 def sum_counts_by_tgl(dataframe):
     """
     Sum the "Counts" for each unique "TGL" value in a pandas DataFrame.
@@ -146,10 +389,12 @@ def sum_counts_by_tgl(dataframe):
         raise ValueError("Required columns 'CODIGO', 'TGL', and 'Counts' are missing.")
 
     # Sum the "Counts" for each unique "TGL" value
-    summed_counts_by_tgl = dataframe.groupby("TGL")["Counts"].sum().reset_index(name="TotalCounts")
+    summed_counts_by_tgl = dataframe.groupby("TGL", observed=True)["Counts"].sum().reset_index(name="TotalCounts")
 
     return summed_counts_by_tgl
 
+@profiled()
+@memoized
 def sum_importe_by_fecha(dataframe):
     """
     Sum the "IMPORTELINEA" for each unique "FECHAPEDIDO" last two digits in a pandas DataFrame.
@@ -163,14 +408,11 @@ def sum_importe_by_fecha(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "IMPORTELINEA" not in dataframe.columns:
         raise ValueError("Required columns 'FECHAPEDIDO' and 'IMPORTELINEA' are missing.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Sum the "IMPORTELINEA" for each unique "FECHAPEDIDO" last two digits
-    summed_importe_by_fecha = dataframe.groupby("Year")["IMPORTELINEA"].sum().reset_index(name="TotalImporte")
-
-    return summed_importe_by_fecha
+    # Sum the "IMPORTELINEA" for each year
+    return _cube_query(dataframe, "sum_importe_by_fecha")
 
+@profiled()
+@memoized
 def sum_importe_by_month(dataframe):
     """
     Sum the "IMPORTELINEA" for each unique "FECHAPEDIDO" last two digits in a pandas DataFrame.
@@ -184,14 +426,19 @@ def sum_importe_by_month(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "IMPORTELINEA" not in dataframe.columns:
         raise ValueError("Required columns 'FECHAPEDIDO' and 'IMPORTELINEA' are missing.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Month"] = dataframe["FECHAPEDIDO"].str[-5:]
-
-    # Sum the "IMPORTELINEA" for each unique "FECHAPEDIDO" last two digits
-    summed_importe_by_fecha = dataframe.groupby("Month")["IMPORTELINEA"].sum().reset_index(name="TotalImporte")
+    # Sum the "IMPORTELINEA" for each month and year
+    return _cube_query(dataframe, "sum_importe_by_month")
 
-    return summed_importe_by_fecha
+def _label_months(dataframe):
+    """
+    Replace the integer "Month" and "Year" columns by a "mm/yy" label, the last five characters of "FECHAPEDIDO".
+    """
+    dataframe = dataframe.copy()
+    dataframe["Month"] = [f"{month:02d}/{year:02d}" for month, year in zip(dataframe["Month"], dataframe["Year"])]
+    return dataframe.drop(columns=["Year"])
 
+@profiled()
+@memoized
 def sum_cantidad_by_fecha(dataframe):
     """
     Sum the "CANTIDADCOMPRA" for each unique "FECHAPEDIDO" last two digits in a pandas DataFrame.
@@ -205,14 +452,11 @@ def sum_cantidad_by_fecha(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "CANTIDADCOMPRA" not in dataframe.columns:
         raise ValueError("Required columns 'FECHAPEDIDO' and 'CANTIDADCOMPRA' are missing.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Sum the "CANTIDADCOMPRA" for each unique "FECHAPEDIDO" last two digits
-    summed_cantidad_by_fecha = dataframe.groupby("Year")["CANTIDADCOMPRA"].sum().reset_index(name="TotalCantidad")
-
-    return summed_cantidad_by_fecha
+    # Sum the "CANTIDADCOMPRA" for each year
+    return _cube_query(dataframe, "sum_cantidad_by_fecha")
 
+@profiled()
+@memoized
 def count_occurrences_by_year(dataframe):
     """
     Count the occurrences of each unique value of "FECHAPEDIDO" last two digits in a pandas DataFrame.
@@ -226,15 +470,11 @@ def count_occurrences_by_year(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns:
         raise ValueError("The 'FECHAPEDIDO' column is required in the DataFrame.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Count occurrences for each unique "Year" value
-    occurrences_by_year = dataframe["Year"].value_counts().reset_index()
-    occurrences_by_year.columns = ["Year", "Occurrences"]
-
-    return occurrences_by_year
+    # Count occurrences for each unique "Year" value, most frequent first
+    return _cube_query(dataframe, "count_occurrences_by_year")
 
+@profiled()
+@memoized
 def group_by_codigo_and_origen(dataframe):
     """
     Group a pandas DataFrame by "CODIGO" and "ORIGEN" columns.
@@ -249,10 +489,12 @@ def group_by_codigo_and_origen(dataframe):
         raise ValueError("Both 'CODIGO' and 'ORIGEN' columns are required in the DataFrame.")
 
     # Group by "CODIGO" and "ORIGEN"
-    grouped_df = dataframe.groupby(["CODIGO", "ORIGEN"]).size().reset_index(name="Counts")
+    grouped_df = dataframe.groupby(["CODIGO", "ORIGEN"], observed=True).size().reset_index(name="Counts")
 
     return grouped_df
 
+@profiled()
+@memoized
 def count_occurrences_by_tipo_and_year(dataframe):
     """
     Count occurrences of different values of "TIPOCOMPRA" for each unique "FECHAPEDIDO" last two digits.
@@ -266,14 +508,11 @@ def count_occurrences_by_tipo_and_year(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "TIPOCOMPRA" not in dataframe.columns:
         raise ValueError("Both 'FECHAPEDIDO' and 'TIPOCOMPRA' columns are required in the DataFrame.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Group by "Year" and "TIPOCOMPRA" and count occurrences
-    grouped_df = dataframe.groupby(["Year", "TIPOCOMPRA"]).size().reset_index(name="Occurrences")
-
-    return grouped_df
+    # Count occurrences for each "Year" and "TIPOCOMPRA"
+    return _cube_query(dataframe, "count_occurrences_by_tipo_and_year")
 
+@profiled()
+@memoized
 def calculate_average_quantity_by_tipo_and_year(dataframe):
     """
     Calculate the average of "CANTIDADCOMPRA" for each unique "FECHAPEDIDO" last two digits and "TIPOCOMPRA" value.
@@ -287,13 +526,8 @@ def calculate_average_quantity_by_tipo_and_year(dataframe):
     if "FECHAPEDIDO" not in dataframe.columns or "TIPOCOMPRA" not in dataframe.columns or "CANTIDADCOMPRA" not in dataframe.columns:
         raise ValueError("Columns 'FECHAPEDIDO', 'TIPOCOMPRA', and 'CANTIDADCOMPRA' are required in the DataFrame.")
 
-    # Extract last two digits from "FECHAPEDIDO"
-    dataframe["Year"] = dataframe["FECHAPEDIDO"].str[-2:]
-
-    # Group by "Year", "TIPOCOMPRA", and calculate the average of "CANTIDADCOMPRA"
-    grouped_df = dataframe.groupby(["Year", "TIPOCOMPRA"])["CANTIDADCOMPRA"].mean().reset_index(name="AverageQuantity")
-
-    return grouped_df
+    # Average "CANTIDADCOMPRA" for each "Year" and "TIPOCOMPRA"
+    return _cube_query(dataframe, "calculate_average_quantity_by_tipo_and_year")
 
 
 # def count_products_by_unidades_consumo_contenidas(dataframe):
@@ -317,7 +551,131 @@ def calculate_average_quantity_by_tipo_and_year(dataframe):
 
 #     return result_df
 
-def calculate_spending_range(data, confidence_level=0.95, num_bootstraps=1000):
+# Bootstrap samples drawn per batch are capped to this many values, bounding the memory of the resampling
+DEFAULT_BOOTSTRAP_BATCH_SIZE = 1_000_000
+
+BOOTSTRAP_METHODS = ("percentile", "bca")
+
+# Rational approximations of the standard normal distribution, so the BCa intervals of every group
+# are computed in NumPy instead of one statistics.NormalDist call per value (SciPy is not a dependency)
+_CDF_NUMERATOR = [3.52624965998911e-02, 0.700383064443688, 6.37396220353165, 33.912866078383,
+                  112.079291497871, 221.213596169931, 220.206867912376]
+_CDF_DENOMINATOR = [8.83883476483184e-02, 1.75566716318264, 16.064177579207, 86.7807322029461,
+                    296.564248779674, 637.333633378831, 793.826512519948, 440.413735824752]
+_PPF_CENTRAL_NUMERATOR = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+                          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+_PPF_CENTRAL_DENOMINATOR = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+                            6.680131188771972e+01, -1.328068155288572e+01, 1.0]
+_PPF_TAIL_NUMERATOR = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+                       -2.549671010422014e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+_PPF_TAIL_DENOMINATOR = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+                         3.754408661907416e+00, 1.0]
+_PPF_TAIL = 0.02425
+
+def _normal_cdf(values):
+    """
+    Standard normal CDF, with Hart's approximation as given by West (2005): absolute error below
+    1e-15, relative error below 1e-8 in the tails.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = np.abs(values)
+    density = np.exp(-x * x / 2)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        central = density * np.polyval(_CDF_NUMERATOR, x) / np.polyval(_CDF_DENOMINATOR, x)
+        # Continued fraction of the tail
+        fraction = x + 0.65
+        for term in (4, 3, 2, 1):
+            fraction = x + term / fraction
+        tail = density / fraction / np.sqrt(2 * np.pi)
+    lower = np.where(x < 7.07106781186547, central, tail)
+    return np.where(np.isnan(values), np.nan, np.where(values > 0, 1 - lower, lower))
+
+def _normal_ppf(values):
+    """
+    Standard normal quantile function, with Acklam's rational approximation refined by one
+    Halley step on _normal_cdf (error below 1e-9). Returns -inf at 0, inf at 1 and NaN outside [0, 1].
+    """
+    p = np.asarray(values, dtype=np.float64)
+    # Solved for the lower tail probability, 1 - p being exact above 0.5, and mirrored back
+    lower = np.minimum(p, 1 - p)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        q = lower - 0.5
+        r = q * q
+        central = q * np.polyval(_PPF_CENTRAL_NUMERATOR, r) / np.polyval(_PPF_CENTRAL_DENOMINATOR, r)
+        s = np.sqrt(-2 * np.log(lower))
+        tail = np.polyval(_PPF_TAIL_NUMERATOR, s) / np.polyval(_PPF_TAIL_DENOMINATOR, s)
+        x = np.where(lower >= _PPF_TAIL, central, tail)
+
+        error = (_normal_cdf(x) - lower) * np.sqrt(2 * np.pi) * np.exp(x * x / 2)
+        refined = x - error / (1 + x * error / 2)
+    x = np.where(np.isfinite(refined), refined, x)
+    x = np.where(p > 0.5, -x, x)
+    return np.where((p < 0) | (p > 1) | np.isnan(p), np.nan, np.where(p == 0, -np.inf, np.where(p == 1, np.inf, x)))
+
+def _bootstrap_group_means(values, starts, lengths, num_bootstraps, rng, batch_size):
+    """
+    Resample every group of a group-sorted array with replacement and return the bootstrap means,
+    drawing as many bootstrap replicates per batch as fit in batch_size values.
+    """
+    total = len(values)
+    element_starts = np.repeat(starts, lengths)
+    element_lengths = np.repeat(lengths, lengths)
+    per_batch = max(1, batch_size // max(total, 1))
+
+    means = np.empty((num_bootstraps, len(lengths)))
+    for first in range(0, num_bootstraps, per_batch):
+        last = min(num_bootstraps, first + per_batch)
+        positions = element_starts + (rng.random((last - first, total)) * element_lengths).astype(np.intp)
+        means[first:last] = np.add.reduceat(values[positions], starts, axis=1) / lengths
+    return means
+
+def _bca_acceleration(values, starts, lengths):
+    """
+    Jackknife estimate of the BCa acceleration of the mean of every group.
+    """
+    sums = np.add.reduceat(values, starts)
+    element_lengths = np.repeat(lengths, lengths)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        leave_one_out = (np.repeat(sums, lengths) - values) / (element_lengths - 1)
+        deviations = np.repeat(np.add.reduceat(leave_one_out, starts) / lengths, lengths) - leave_one_out
+        numerator = np.add.reduceat(deviations ** 3, starts)
+        denominator = 6 * np.add.reduceat(deviations ** 2, starts) ** 1.5
+        acceleration = numerator / denominator
+    return np.where(np.isfinite(acceleration), acceleration, 0.0)
+
+def _bootstrap_intervals(values, starts, lengths, confidence_level, num_bootstraps, rng, method, batch_size):
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"Unknown bootstrap method '{method}', expected one of {BOOTSTRAP_METHODS}.")
+    if not 0 < confidence_level < 1:
+        raise ValueError("confidence_level must be between 0 and 1.")
+
+    rng = np.random.default_rng(rng)
+    means = _bootstrap_group_means(values, starts, lengths, num_bootstraps, rng, batch_size)
+    estimates = np.add.reduceat(values, starts) / lengths
+    alphas = np.array([(1 - confidence_level) / 2, (1 + confidence_level) / 2])
+
+    if method == "percentile":
+        lower, upper = np.percentile(means, alphas * 100, axis=0)
+        return estimates, lower, upper
+
+    # Bias-corrected and accelerated percentiles, computed for every group at once
+    proportion = np.clip((means < estimates).mean(axis=0), 1 / (num_bootstraps + 1), num_bootstraps / (num_bootstraps + 1))
+    bias = _normal_ppf(proportion)
+    acceleration = _bca_acceleration(values, starts, lengths)
+    z_alphas = _normal_ppf(alphas)[:, None]
+    adjusted = _normal_cdf(bias + (bias + z_alphas) / (1 - acceleration * (bias + z_alphas)))
+
+    ordered = np.sort(means, axis=0)
+    positions = adjusted * (num_bootstraps - 1)
+    below = np.floor(positions).astype(np.intp)
+    above = np.minimum(below + 1, num_bootstraps - 1)
+    fraction = positions - below
+    lower_values = np.take_along_axis(ordered, below, axis=0)
+    upper_values = np.take_along_axis(ordered, above, axis=0)
+    lower, upper = lower_values + (upper_values - lower_values) * fraction
+    return estimates, lower, upper
+
+def calculate_spending_range(data, confidence_level=0.95, num_bootstraps=1000, rng=None, method="percentile", batch_size=DEFAULT_BOOTSTRAP_BATCH_SIZE):
     """
     Calculate the 95% confidence interval for the spending in the next year using bootstrapping.
 
@@ -325,6 +683,9 @@ def calculate_spending_range(data, confidence_level=0.95, num_bootstraps=1000):
     - data: np.array or list, the historical spending data
     - confidence_level: float, the desired confidence level (default is 0.95)
     - num_bootstraps: int, the number of bootstrap samples (default is 1000)
+    - rng: int, np.random.Generator or None, seed or generator of the resampling (default is None, unseeded)
+    - method: str, "percentile" or "bca" (bias-corrected and accelerated) interval (default is "percentile")
+    - batch_size: int, maximum number of resampled values held in memory at once
 
     Returns:
     - tuple: a tuple containing the lower and upper bounds of the confidence interval
@@ -332,23 +693,56 @@ def calculate_spending_range(data, confidence_level=0.95, num_bootstraps=1000):
     if not isinstance(data, (np.ndarray, list)):
         raise ValueError("Input data should be a NumPy array or a Python list.")
 
-    # Calculate the mean of the historical spending data
-    mean_spending = np.mean(data)
+    values = np.asarray(data, dtype=np.float64)
+    if values.size == 0:
+        raise ValueError("Input data should not be empty.")
 
-    # Generate bootstrap samples
-    bootstrap_samples = np.random.choice(data, size=(num_bootstraps, len(data)), replace=True)
+    _, lower, upper = _bootstrap_intervals(values, np.array([0]), np.array([len(values)]), confidence_level, num_bootstraps, rng, method, batch_size)
 
-    # Calculate the mean of each bootstrap sample
-    bootstrap_means = np.mean(bootstrap_samples, axis=1)
+    return lower[0], upper[0]
 
-    # Calculate the confidence interval
-    lower_bound = np.percentile(bootstrap_means, (1 - confidence_level) / 2 * 100)
-    upper_bound = np.percentile(bootstrap_means, (1 + confidence_level) / 2 * 100)
+def calculate_spending_ranges(dataframe, value_column, group_columns, confidence_level=0.95, num_bootstraps=1000, rng=None, method="percentile", batch_size=DEFAULT_BOOTSTRAP_BATCH_SIZE):
+    """
+    Calculate bootstrap confidence intervals of the mean of many spending series in one vectorized call.
 
-    return lower_bound, upper_bound
+    Parameters:
+    - dataframe: pd.DataFrame, one row per observation (e.g. the monthly spending of each "CODIGO")
+    - value_column: str, the column holding the spending values
+    - group_columns: list of str, the columns identifying each series
+    - confidence_level: float, the desired confidence level (default is 0.95)
+    - num_bootstraps: int, the number of bootstrap samples (default is 1000)
+    - rng: int, np.random.Generator or None, seed or generator of the resampling (default is None, unseeded)
+    - method: str, "percentile" or "bca" (bias-corrected and accelerated) interval (default is "percentile")
+    - batch_size: int, maximum number of resampled values held in memory at once
+
+    Returns:
+    - pd.DataFrame: the group columns with "Mean", "LowerBound" and "UpperBound" columns
+    """
+    missing = [col for col in [value_column, *group_columns] if col not in dataframe.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in the DataFrame.")
+
+    dataframe = dataframe[[*group_columns, value_column]].dropna()
+    if dataframe.empty:
+        raise ValueError(f"Column '{value_column}' has no values to bootstrap.")
+
+    group_ids = dataframe.groupby(group_columns, sort=True, observed=True).ngroup().to_numpy()
+    order = np.argsort(group_ids, kind="stable")
+    lengths = np.bincount(group_ids)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    values = dataframe[value_column].to_numpy(dtype=np.float64)[order]
+
+    estimates, lower, upper = _bootstrap_intervals(values, starts, lengths, confidence_level, num_bootstraps, rng, method, batch_size)
 
+    result_df = dataframe.iloc[order[starts]][group_columns].reset_index(drop=True)
+    result_df["Mean"] = estimates
+    result_df["LowerBound"] = lower
+    result_df["UpperBound"] = upper
 
-def filter_rows_by_column_value(dataframe, column_name, target_value):
+    return result_df
+
+
+def filter_rows_by_column_value(dataframe, column_name, target_value, index=None):
     """
     Filter rows in a Pandas DataFrame where a specified column has a value equal to or containing the target string.
 
@@ -356,6 +750,8 @@ def filter_rows_by_column_value(dataframe, column_name, target_value):
     - dataframe: pd.DataFrame, the input Pandas DataFrame
     - column_name: str, the name of the column to filter on
     - target_value: str, the string to search for in the specified column
+    - index: search_index.SearchIndex, optional index built for this DataFrame, so repeated searches
+      only check the distinct values instead of scanning every row (default is None)
 
     Returns:
     - pd.DataFrame: a DataFrame with rows filtered based on the specified column and string
@@ -363,6 +759,11 @@ def filter_rows_by_column_value(dataframe, column_name, target_value):
     if column_name not in dataframe.columns:
         raise ValueError(f"Column '{column_name}' does not exist in the DataFrame.")
 
+    if index is not None:
+        if index.dataframe is not dataframe:
+            raise ValueError("The search index was built for another DataFrame.")
+        return index.filter(column_name, target_value)
+
     # Filter rows where the specified column contains or is equal to the target string
     filtered_dataframe = dataframe[dataframe[column_name].str.contains(target_value, case=False, na=False)]
 
@@ -404,26 +805,83 @@ def print_unique_values(dataframe, column_name):
 #     print(f"Unique pairs of '{column1}' and '{column2}':")
 #     print(unique_pairs)
 
-def main():
-    file_path = 'consumo_material_clean.xlsx' #modified_dataset.xlsx
+# Aggregations published by main(), computed together by the aggregation engine
+MAIN_AGGREGATION_PLAN = [
+    AggregationSpec("hospital_year_purchases", ["Hospital", "Year"], None, "count", "Purchases"),
+    AggregationSpec("year_money", ["Year"], "IMPORTELINEA", "sum", "TotalImporte"),
+    AggregationSpec("month_money", ["Month", "Year"], "IMPORTELINEA", "sum", "TotalImporte"),
+    AggregationSpec("year_purchases", ["Year"], None, "count", "Occurrences"),
+    AggregationSpec("codigo_origen", ["CODIGO", "ORIGEN"], None, "count", "Counts"),
+    AggregationSpec("year_tipo", ["Year", "TIPOCOMPRA"], None, "count", "Occurrences"),
+    AggregationSpec("year_tipo_average", ["Year", "TIPOCOMPRA"], "CANTIDADCOMPRA", "mean", "AverageQuantity"),
+]
+
+def build_published_datasets(results):
+    """
+    Shape the results of MAIN_AGGREGATION_PLAN into the datasets published for the dashboard.
+
+    Parameters:
+    - results: dict, result frames returned by run_aggregation_plan for MAIN_AGGREGATION_PLAN
+
+    Returns:
+    - dict: maps each published file name (without extension) to its DataFrame
+    """
+    published = {
+        "hospital_year_purchases": results["hospital_year_purchases"],
+        "year_money": results["year_money"],
+        # Most frequent years first, as returned by count_occurrences_by_year
+        "year_purchases": results["year_purchases"].sort_values("Occurrences", ascending=False, kind="stable").reset_index(drop=True),
+        "codigo_origen_df": results["codigo_origen"],
+        "year_tipo": results["year_tipo"],
+        "year_tipo_average": results["year_tipo_average"],
+    }
+    return {name: _label_years(dataframe) for name, dataframe in published.items()}
+
+def _label_years(dataframe):
+    """
+    Replace the integer "Year" column by its two-digit "yy" label, the last two characters of
+    "FECHAPEDIDO", which is what the dashboard reads from the published datasets.
+    """
+    if "Year" not in dataframe.columns:
+        return dataframe
+    return dataframe.assign(Year=[f"{year:02d}" for year in dataframe["Year"]])
+
+def main(chunk_size=None, workers=1, incremental=False, formats=("xlsx",), file_path='consumo_material_clean.xlsx', sheet_name='Sheet1', output_dir="excels"):
     # file_path = 'modified_dataset.xlsx' #consumo_material_clean.xlsx
-    original_dataframe = read_excel_dataset(file_path, sheet_name='Sheet1')
-    # print(dataframe)
-    hospital_year_purchases_df = group_by_origen_and_date(original_dataframe)
-    year_money_df = sum_importe_by_fecha(original_dataframe)
-    month_money_df = sum_importe_by_month(original_dataframe)
-    # month_money_df = filter_rows_by_column_value(month_money_df, "Month", "/20")
-    # Convert the 'Date' column to datetime format
-    month_money_df['Date'] = pd.to_datetime(month_money_df['Month'], format='%m/%d')
-    month_money_df = month_money_df.sort_values(by='Date').reset_index(drop=True)
-    spent_money = year_money_df['TotalImporte'].values
-    spent_money = np.array(spent_money)
-    lower_cost, upper_cost = calculate_spending_range(spent_money)
-    year_purchases_df = count_occurrences_by_year(original_dataframe)
-    codigo_origen_df = group_by_codigo_and_origen(original_dataframe)
-    year_tipo_df = count_occurrences_by_tipo_and_year(original_dataframe)
-    tipo_average_df = calculate_average_quantity_by_tipo_and_year(original_dataframe)
-    
+    if incremental:
+        # Only fold the rows appended since the last run into the persisted aggregates
+        from analysis.incremental import refresh_published_datasets
+        with stage("refresh"):
+            refresh_published_datasets(file_path, output_dir=output_dir, sheet_name=sheet_name, formats=formats)
+        return
+
+    if chunk_size:
+        # Stream the ledger in bounded chunks instead of loading it whole
+        from analysis.streaming import aggregate_excel_in_chunks
+        with stage("aggregate") as record:
+            results = aggregate_excel_in_chunks(file_path, MAIN_AGGREGATION_PLAN, sheet_name=sheet_name, chunk_size=chunk_size)
+            record.rows_out = sum(len(result) for result in results.values())
+    else:
+        with stage("load") as record:
+            original_dataframe = read_excel_dataset(file_path, sheet_name=sheet_name, compact=True)
+            record.rows_out = len(original_dataframe)
+        with stage("enrich", rows_in=len(original_dataframe)) as record:
+            # Only the columns the plan groups by or reduces, deriving the date and hospital keys it uses
+            original_dataframe = derived_view(original_dataframe, plan_inputs(MAIN_AGGREGATION_PLAN))
+            record.rows_out = len(original_dataframe)
+        # print(dataframe)
+        with stage("aggregate", rows_in=len(original_dataframe)) as record:
+            if workers > 1:
+                # Aggregate hash partitions of the ledger on a process pool
+                from analysis.parallel import aggregate_in_parallel
+                results = aggregate_in_parallel(original_dataframe, MAIN_AGGREGATION_PLAN, workers=workers)
+            else:
+                results = run_aggregation_plan(original_dataframe, MAIN_AGGREGATION_PLAN)
+            record.rows_out = sum(len(result) for result in results.values())
+    published = build_published_datasets(results)
+    year_tipo_df = published["year_tipo"]
+    tipo_average_df = published["year_tipo_average"]
+
     # new_df = group_by_codigo_and_tgl(dataframe)
     # count_TGL = sum_counts_by_tgl(new_df)
     # print_unique_values(dataframe, "CODIGO")
@@ -435,17 +893,37 @@ def main():
     # Specify the file path where you want to store the Excel file
     # excel_file_path = 'path/to/your/output_file.xlsx'
 
-    # Use the to_excel method to save the DataFrame to an Excel file
-    hospital_year_purchases_df.to_excel("excels/hospital_year_purchases.xlsx", index=False)
-    year_money_df.to_excel("excels/year_money.xlsx", index=False)
-    year_purchases_df.to_excel("excels/year_purchases.xlsx", index=False)
-    codigo_origen_df.to_excel("excels/codigo_origen_df.xlsx", index=False)
-    year_tipo_df.to_excel("excels/year_tipo.xlsx", index=False)
-    tipo_average_df.to_excel("excels/year_tipo_average.xlsx", index=False)
+    # Write every dataset concurrently and atomically, in each requested format
+    with stage("write", rows_in=sum(len(df) for df in published.values())):
+        timings = write_outputs(published, output_dir, formats=formats)
+        profiler = active_profiler()
+        if profiler is not None:
+            # The files are written on worker threads, record each of them under this stage
+            for path, elapsed in timings.items():
+                rows = len(published[os.path.splitext(os.path.basename(path))[0]])
+                profiler.add(os.path.basename(path), elapsed, rows_in=rows, rows_out=rows)
+    # Columnar JSON copies and a manifest, so the dashboard does not have to parse spreadsheets
+    with stage("publish", rows_in=sum(len(df) for df in published.values())):
+        publish_dashboard_artifacts(published, output_dir, up_to_date=published if "json" in formats else ())
     # print(count_TGL)
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute the datasets published for the dashboard.")
+    parser.add_argument("--chunk_size", type=int, default=None, help="Stream the ledger in chunks of this many rows (default is to load it whole)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for the aggregations (default is 1)")
+    parser.add_argument("--incremental", action="store_true", help="Only aggregate the rows appended since the last incremental run")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["xlsx"], help="Output formats of the published datasets (default is xlsx)")
+    parser.add_argument("--trace", type=str, default=None, help="Time and memory-profile every stage, writing a JSON trace to this path and printing a summary")
+    parser.add_argument("--profile", type=str, default=None, help="Also dump cProfile statistics of the run to this path (for pstats, snakeviz or flameprof)")
+    args = parser.parse_args()
+
     pd.set_option('display.max_rows', None)
     pd.set_option('display.max_columns', None)
-    main()
\ No newline at end of file
+    if args.trace or args.profile:
+        with profiling(trace_path=args.trace, profile_path=args.profile):
+            main(chunk_size=args.chunk_size, workers=args.workers, incremental=args.incremental, formats=args.formats)
+    else:
+        main(chunk_size=args.chunk_size, workers=args.workers, incremental=args.incremental, formats=args.formats)
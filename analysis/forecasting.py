@@ -0,0 +1,297 @@
+import argparse
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+from analysis.aggregation import AggregationSpec, run_aggregation_plan
+from analysis.windowing import sliding_windows
+
+FORECAST_METHODS = ("seasonal_naive", "exponential_smoothing", "ridge")
+SEASON_LENGTH = 12
+DEFAULT_LAGS = 12
+DEFAULT_RIDGE_ALPHA = 1.0
+
+# Smoothing factors tried for every series, the one with the lowest one-step error is kept
+SMOOTHING_ALPHAS = np.linspace(0.05, 1.0, 20)
+
+
+def _full_year(year):
+    # Two-digit years follow strptime's %y pivot: 69-99 are 19xx, 00-68 are 20xx
+    year = np.asarray(year, dtype=np.int64)
+    return np.where(year < 69, 2000 + year, 1900 + year)
+
+
+def monthly_series(dataframe, series_column="CODIGO", value_column="CANTIDADCOMPRA"):
+    """
+    Build the monthly totals of every series as a dense matrix, months without purchases being 0.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger with "FECHAPEDIDO" (or "Year" and "Month"), series and value columns
+    - series_column: str or list of str, the column(s) identifying each series (default is "CODIGO")
+    - value_column: str, the column summed every month (default is "CANTIDADCOMPRA")
+
+    Returns:
+    - np.ndarray: the totals, shape (series, months)
+    - pd.Index: the label of each series (a MultiIndex for several series columns)
+    - pd.PeriodIndex: the month of each column
+    """
+    series_columns = [series_column] if isinstance(series_column, str) else list(series_column)
+    missing = [col for col in [*series_columns, value_column] if col not in dataframe.columns and col not in dt.DERIVED_COLUMNS]
+    if missing:
+        raise ValueError(f"Required columns {missing} are missing.")
+    dataframe = dt.derived_view(dataframe, [*series_columns, "Year", "Month", value_column])
+
+    plan = [AggregationSpec("monthly", [*series_columns, "Year", "Month"], value_column, "sum", value_column)]
+    monthly = run_aggregation_plan(dataframe, plan)["monthly"].dropna(subset=["Year", "Month"])
+    if monthly.empty:
+        raise ValueError("The ledger has no dated rows to build series from.")
+
+    periods = _full_year(monthly["Year"]) * 12 + monthly["Month"].to_numpy(dtype=np.int64) - 1
+    first = periods.min()
+    if len(series_columns) == 1:
+        codes, labels = pd.factorize(monthly[series_columns[0]], sort=True)
+        labels = pd.Index(labels, name=series_columns[0])
+    else:
+        codes, labels = pd.factorize(pd.MultiIndex.from_frame(monthly[series_columns]), sort=True)
+
+    matrix = np.zeros((len(labels), periods.max() - first + 1))
+    matrix[codes, periods - first] = monthly[value_column].to_numpy(dtype=float)
+
+    months = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq="M"), periods=matrix.shape[1], freq="M")
+    return matrix, labels, months
+
+
+def seasonal_naive(matrix, horizon, season_length=SEASON_LENGTH):
+    """
+    Forecast every series with its value one season earlier (the last value when there is less than a season).
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - horizon: int, number of months to forecast
+    - season_length: int, number of months per season (default is 12)
+
+    Returns:
+    - np.ndarray: the forecasts, shape (series, horizon)
+    - np.ndarray: the standard error of every forecast, shape (series, horizon)
+    """
+    steps = np.arange(horizon)
+    if matrix.shape[1] <= season_length:
+        season_length = 1
+    forecasts = matrix[:, matrix.shape[1] - season_length + steps % season_length]
+
+    residuals = matrix[:, season_length:] - matrix[:, :-season_length]
+    sigma = np.sqrt(np.mean(residuals ** 2, axis=1)) if residuals.size else np.zeros(len(matrix))
+    # The error grows with the number of seasons between the forecast and the last observation
+    spread = np.sqrt(steps // season_length + 1)
+    return forecasts, sigma[:, None] * spread
+
+
+def exponential_smoothing(matrix, horizon, alphas=SMOOTHING_ALPHAS):
+    """
+    Forecast every series with simple exponential smoothing, choosing the smoothing factor of each series
+    by its one-step-ahead squared error; all factors and series are updated together, month by month.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - horizon: int, number of months to forecast
+    - alphas: array of float, the smoothing factors tried (default is SMOOTHING_ALPHAS)
+
+    Returns:
+    - np.ndarray: the forecasts, shape (series, horizon)
+    - np.ndarray: the standard error of every forecast, shape (series, horizon)
+    """
+    alphas = np.asarray(alphas, dtype=float)[:, None]
+    level = np.repeat(matrix[None, :, 0], len(alphas), axis=0)
+    squared_errors = np.zeros_like(level)
+    for month in range(1, matrix.shape[1]):
+        error = matrix[:, month] - level
+        squared_errors += error ** 2
+        level += alphas * error
+
+    best = squared_errors.argmin(axis=0)
+    series = np.arange(matrix.shape[0])
+    sigma = np.sqrt(squared_errors[best, series] / max(matrix.shape[1] - 1, 1))
+    alpha = alphas[best, 0]
+
+    steps = np.arange(horizon)
+    forecasts = np.repeat(level[best, series][:, None], horizon, axis=1)
+    spread = np.sqrt(1 + steps[None, :] * alpha[:, None] ** 2)
+    return forecasts, sigma[:, None] * spread
+
+
+def ridge_lags(matrix, horizon, n_lags=DEFAULT_LAGS, alpha=DEFAULT_RIDGE_ALPHA):
+    """
+    Forecast every series with its own ridge regression on its last n_lags months, solving all the
+    regressions at once as a batch of small linear systems and forecasting recursively.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - horizon: int, number of months to forecast
+    - n_lags: int, number of previous months used as features (default is 12)
+    - alpha: float, positive penalty, relative to the average variance of the lags (default is 1.0)
+
+    Returns:
+    - np.ndarray: the forecasts, shape (series, horizon)
+    - np.ndarray: the standard error of every forecast, shape (series, horizon)
+    """
+    if matrix.shape[1] <= n_lags:
+        raise ValueError(f"At least {n_lags + 1} months are needed to fit {n_lags} lags.")
+    if alpha <= 0:
+        raise ValueError("alpha must be positive.")
+
+    lags = sliding_windows(matrix.T, n_lags)[:-1].transpose(2, 0, 1)
+    targets = matrix[:, n_lags:]
+
+    # Center per series so the intercept is not penalized
+    lag_means = lags.mean(axis=1, keepdims=True)
+    target_means = targets.mean(axis=1, keepdims=True)
+    centered = lags - lag_means
+    gram = np.einsum("sil,sim->slm", centered, centered)
+    moments = np.einsum("sil,si->sl", centered, targets - target_means)
+
+    # Scale the penalty with each series, so one alpha suits small and large consumers alike
+    penalty = alpha * np.maximum(np.trace(gram, axis1=1, axis2=2) / n_lags, 1e-12)
+    gram[:, np.arange(n_lags), np.arange(n_lags)] += penalty[:, None]
+    coefficients = np.linalg.solve(gram, moments[..., None])[..., 0]
+    intercepts = target_means[:, 0] - np.einsum("sl,sl->s", lag_means[:, 0], coefficients)
+
+    residuals = targets - np.einsum("sil,sl->si", lags, coefficients) - intercepts[:, None]
+    sigma = np.sqrt(np.mean(residuals ** 2, axis=1))
+
+    history = matrix[:, -n_lags:].copy()
+    forecasts = np.empty((matrix.shape[0], horizon))
+    for step in range(horizon):
+        forecasts[:, step] = np.einsum("sl,sl->s", history, coefficients) + intercepts
+        history = np.concatenate([history[:, 1:], forecasts[:, step:step + 1]], axis=1)
+
+    return forecasts, sigma[:, None] * np.sqrt(np.arange(1, horizon + 1))
+
+
+FORECASTERS = {
+    "seasonal_naive": seasonal_naive,
+    "exponential_smoothing": exponential_smoothing,
+    "ridge": ridge_lags,
+}
+
+
+def forecast_matrix(matrix, horizon, method="ridge", **options):
+    """
+    Forecast every series of a matrix with one of the FORECAST_METHODS.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - horizon: int, number of months to forecast
+    - method: str, one of "seasonal_naive", "exponential_smoothing" or "ridge" (default is "ridge")
+    - options: keyword arguments of the method
+
+    Returns:
+    - np.ndarray: the forecasts, shape (series, horizon)
+    - np.ndarray: the standard error of every forecast, shape (series, horizon)
+    """
+    if method not in FORECASTERS:
+        raise ValueError(f"Unknown forecasting method '{method}', expected one of {FORECAST_METHODS}.")
+    if horizon < 1:
+        raise ValueError("horizon must be at least one month.")
+    return FORECASTERS[method](np.asarray(matrix, dtype=float), horizon, **options)
+
+
+def forecast_series(dataframe, series_column="CODIGO", value_column="CANTIDADCOMPRA", horizon=3, method="ridge", confidence_level=0.95, nonnegative=True, **options):
+    """
+    Forecast the monthly totals of every series with prediction intervals.
+
+    The intervals assume normal forecast errors, with the in-sample error of each series widened for
+    every step ahead.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - series_column: str, the column identifying each series (default is "CODIGO")
+    - value_column: str, the column summed every month (default is "CANTIDADCOMPRA")
+    - horizon: int, number of months to forecast (default is 3)
+    - method: str, one of FORECAST_METHODS (default is "ridge")
+    - confidence_level: float, the confidence level of the intervals (default is 0.95)
+    - nonnegative: bool, whether to clip forecasts and bounds at 0, as quantities cannot be negative (default is True)
+    - options: keyword arguments of the method
+
+    Returns:
+    - pd.DataFrame: series_column, "Year", "Month", "Forecast", "LowerBound" and "UpperBound" for every series and month ahead
+    """
+    matrix, labels, months = monthly_series(dataframe, series_column, value_column)
+    forecasts, errors = forecast_matrix(matrix, horizon, method, **options)
+
+    z = NormalDist().inv_cdf((1 + confidence_level) / 2)
+    lower, upper = forecasts - z * errors, forecasts + z * errors
+    if nonnegative:
+        forecasts, lower, upper = (np.maximum(values, 0) for values in (forecasts, lower, upper))
+
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq="M")
+    return pd.DataFrame({
+        series_column: np.repeat(labels.to_numpy(), horizon),
+        "Year": np.tile(future.year % 100, len(labels)),
+        "Month": np.tile(future.month, len(labels)),
+        "Forecast": forecasts.ravel(),
+        "LowerBound": lower.ravel(),
+        "UpperBound": upper.ravel(),
+    })
+
+
+def backtest_forecasts(matrix, horizon=3, methods=FORECAST_METHODS, **options):
+    """
+    Fit every method on all but the last horizon months and score its forecasts of those months.
+
+    Parameters:
+    - matrix: np.ndarray, the series, shape (series, months)
+    - horizon: int, number of months held out (default is 3)
+    - methods: iterable of str, the methods to score (default is all of them)
+    - options: dict of keyword arguments per method name
+
+    Returns:
+    - pd.DataFrame: "Method", "FitSeconds", "MAE" and "RMSE" of every method
+    """
+    if matrix.shape[1] <= horizon:
+        raise ValueError(f"More than {horizon} months are needed to hold out {horizon} of them.")
+    history, actual = matrix[:, :-horizon], matrix[:, -horizon:]
+
+    scores = []
+    for method in methods:
+        start = time.perf_counter()
+        forecasts, _ = forecast_matrix(history, horizon, method, **options.get(method, {}))
+        seconds = time.perf_counter() - start
+        errors = forecasts - actual
+        scores.append({
+            "Method": method,
+            "FitSeconds": seconds,
+            "MAE": np.mean(np.abs(errors)),
+            "RMSE": np.sqrt(np.mean(errors ** 2)),
+        })
+    return pd.DataFrame(scores)
+
+
+def main():
+    from analysis.writers import write_dataframe
+
+    parser = argparse.ArgumentParser(description="Forecast the monthly totals of every product of an Excel ledger.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--series", type=str, default="CODIGO", help="Column identifying each series (default is CODIGO)")
+    parser.add_argument("--value", type=str, default="CANTIDADCOMPRA", help="Column summed every month (default is CANTIDADCOMPRA)")
+    parser.add_argument("--method", choices=FORECAST_METHODS, default="ridge", help="Forecasting method (default is ridge)")
+    parser.add_argument("--horizon", type=int, default=3, help="Number of months to forecast (default is 3)")
+    parser.add_argument("--output", type=str, default=None, help="File to write the forecasts to, e.g. excels/forecast.xlsx")
+
+    args = parser.parse_args()
+
+    dataframe = dt.read_excel_dataset(args.file_path, args.sheet_name)
+    if dataframe is None:
+        return
+
+    forecasts = forecast_series(dataframe, args.series, args.value, horizon=args.horizon, method=args.method)
+    if args.output:
+        write_dataframe(forecasts, args.output)
+    print(forecasts)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,29 @@
-import pandas as pd
-
-def read_excel_dataset(file_path, sheet_name='Sheet1'):
-    """
-    Read an Excel dataset using Pandas.
-
-    Parameters:
-    - file_path: str, path to the Excel file
-    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
-
-    Returns:
-    - DataFrame: Pandas DataFrame containing the dataset
-    """
-    try:
-        # Read the Excel file into a DataFrame
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
-        print(type(df))
-        return df
-    except Exception as e:
-        print(f"Error reading Excel file: {e}")
-        return None
+from analysis.data_treatment import derive_columns, read_excel_dataset
+from analysis.profiling import profiling, stage
+from analysis.writers import write_dataframe
 
 def process_dataset(dataframe):
     """
     Process a pandas dataset by deleting columns "NUMERO" and "REFERENCIA" and adding a new column "TOTALUNIDADES".
 
+    The input DataFrame is not modified. With Copy-on-Write (always on since pandas 3.0) the result
+    shares the kept columns with it, so only "TOTALUNIDADES" is allocated.
+
     Parameters:
     - dataframe: pd.DataFrame, the input Pandas DataFrame
 
     Returns:
     - pd.DataFrame: a processed DataFrame with columns modified as described
     """
-    # Check if "NUMERO" and "REFERENCIA" columns exist before dropping
-    columns_to_drop = ["NUMERO", "REFERENCIA"]
-    existing_columns = set(dataframe.columns)
-    columns_to_drop = [col for col in columns_to_drop if col in existing_columns]
-
-    # Drop specified columns
-    dataframe.drop(columns=columns_to_drop, inplace=True, errors='ignore')
-
-    # Add a new column "TOTALUNIDADES" by multiplying "CANTIDADCOMPRA" by "UNIDADESCONSUMOCONTENIDAS"
-    dataframe["TOTALUNIDADES"] = dataframe["CANTIDADCOMPRA"] * dataframe["UNIDADESCONSUMOCONTENIDAS"]
-
-    return dataframe
+    # Drop "NUMERO" and "REFERENCIA" when they exist, and add "TOTALUNIDADES" ("CANTIDADCOMPRA" by "UNIDADESCONSUMOCONTENIDAS")
+    return dataframe.drop(columns=["NUMERO", "REFERENCIA"], errors='ignore').assign(**derive_columns(dataframe, ["TOTALUNIDADES"]))
 
 def save_to_excel(dataframe, file_path):
     """
     Save a pandas DataFrame to an Excel file.
 
+    The file is streamed with a constant-memory writer and moved into place once complete.
+
     Parameters:
     - dataframe: pd.DataFrame, the input Pandas DataFrame
     - file_path: str, the file path where the Excel file should be saved
@@ -54,13 +31,43 @@ def save_to_excel(dataframe, file_path):
     Returns:
     - None
     """
-    dataframe.to_excel(file_path, index=False)
-    print(f"DataFrame saved to {file_path}")
+    elapsed = write_dataframe(dataframe, file_path, file_format="xlsx")
+    print(f"DataFrame saved to {file_path} in {elapsed:.3f}s")
+
+def main(file_path="consumo_material_clean.xlsx", output_path="modified_dataset.xlsx", sheet_name='Sheet1'):
+    """
+    Write the processed ledger (see process_dataset) to an Excel file.
+
+    Parameters:
+    - file_path: str, path to the Excel ledger (default is 'consumo_material_clean.xlsx')
+    - output_path: str, path of the Excel file to write (default is 'modified_dataset.xlsx')
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+
+    Returns:
+    - None
+    """
+    with stage("load") as record:
+        original_dataset = read_excel_dataset(file_path, sheet_name)
+        record.rows_out = len(original_dataset)
+    with stage("process", rows_in=len(original_dataset)) as record:
+        new_dataset = process_dataset(original_dataset)
+        record.rows_out = len(new_dataset)
+    with stage("write", rows_in=len(new_dataset)):
+        save_to_excel(new_dataset, output_path)
+
+if __name__ == "__main__":
+    import argparse
 
-original_dataset = read_excel_dataset("consumo_material_clean.xlsx")
-new_dataset = process_dataset(original_dataset)
+    parser = argparse.ArgumentParser(description="Write modified_dataset.xlsx, the ledger with \"TOTALUNIDADES\" and without \"NUMERO\" and \"REFERENCIA\".")
+    parser.add_argument("--trace", type=str, default=None, help="Time and memory-profile every stage, writing a JSON trace to this path and printing a summary")
+    parser.add_argument("--profile", type=str, default=None, help="Also dump cProfile statistics of the run to this path (for pstats, snakeviz or flameprof)")
+    args = parser.parse_args()
 
-save_to_excel(new_dataset, "modified_dataset.xlsx")
+    if args.trace or args.profile:
+        with profiling(trace_path=args.trace, profile_path=args.profile):
+            main()
+    else:
+        main()
 
 # Example usage:
 # processed_dataframe = process_dataset(your_input_dataframe)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+
+import analysis.cache as cache
+import analysis.data_treatment as dt
+from analysis.aggregation import compute_partials, finalize_partials, merge_partials
+from analysis.dashboard import publish_dashboard_artifacts
+from analysis.streaming import plan_columns
+from analysis.writers import FORMATS, write_atomically, write_outputs
+
+STATE_FILE_NAME = "state.json"
+
+
+def default_state_dir(output_dir):
+    """
+    Return the default directory holding the persisted partial aggregates of an output directory.
+
+    Parameters:
+    - output_dir: str, directory where the published datasets are written
+
+    Returns:
+    - str: path to the state directory
+    """
+    return os.path.join(output_dir, ".incremental")
+
+
+def _plan_signature(plan):
+    return [[spec.name, list(spec.keys), spec.measure, spec.reducer, spec.output] for spec in plan]
+
+
+def _partial_file(state_dir, keys):
+    return os.path.join(state_dir, "__".join(keys) + ".parquet")
+
+
+def load_state(state_dir, plan):
+    """
+    Load the row watermark and the persisted partial aggregates of a plan.
+
+    Parameters:
+    - state_dir: str, directory holding the incremental state
+    - plan: list of AggregationSpec, the aggregations kept up to date
+
+    Returns:
+    - dict: the state ("rows" watermark) or None when there is no usable state
+    - dict: the partial aggregates (empty when there is no usable state)
+    """
+    state_path = os.path.join(state_dir, STATE_FILE_NAME)
+    if not os.path.exists(state_path):
+        return None, {}
+
+    with open(state_path) as state_file:
+        state = json.load(state_file)
+    if state.get("plan") != _plan_signature(plan):
+        print("Aggregation plan changed, the incremental state will be rebuilt.")
+        return None, {}
+
+    partials = {}
+    for keys in state["groupings"]:
+        keys = tuple(keys)
+        partials[keys] = pd.read_parquet(_partial_file(state_dir, keys))
+    return state, partials
+
+
+def save_state(state_dir, plan, partials, rows):
+    """
+    Persist the partial aggregates of a plan together with the row watermark they cover.
+
+    The state file is written last, so an interrupted save leaves the previous watermark in place.
+
+    Parameters:
+    - state_dir: str, directory holding the incremental state
+    - plan: list of AggregationSpec, the aggregations kept up to date
+    - partials: dict, the partial aggregates
+    - rows: int, number of ledger rows folded into the partial aggregates
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    for keys, partial in partials.items():
+        write_atomically(_partial_file(state_dir, keys), lambda path: partial.to_parquet(path, index=False))
+
+    state = {
+        "rows": int(rows),
+        "plan": _plan_signature(plan),
+        "groupings": [list(keys) for keys in partials],
+    }
+
+    def write(path):
+        with open(path, "w") as state_file:
+            json.dump(state, state_file, indent=2)
+
+    write_atomically(os.path.join(state_dir, STATE_FILE_NAME), write)
+
+
+def read_ledger_tail(file_path, offset, sheet_name='Sheet1', columns=None):
+    """
+    Read the ledger rows after a row offset from the columnar cache, skipping the row groups before it.
+
+    Only the rows after the offset are decoded from the cache, but a workbook that changed since
+    the cache was built is parsed again in full to rebuild it: xlsx files cannot be read from an
+    offset. When the sheet cannot be cached (see cache.CACHE_ERRORS), it is read from the workbook.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - offset: int, number of leading rows to skip
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - columns: list of str, columns to load (default is None, all columns)
+
+    Returns:
+    - pd.DataFrame: the rows after the offset
+    - int: total number of rows in the ledger
+    """
+    import pyarrow.parquet as pq
+
+    path = cache.cache_path(file_path, sheet_name)
+    if not os.path.exists(path):
+        try:
+            cache.build_cache(file_path, sheet_name)
+        except cache.CACHE_ERRORS as e:
+            print(f"Columnar cache unavailable, reading the Excel file directly: {e}")
+            df = pd.read_excel(file_path, sheet_name=sheet_name, usecols=columns)
+            return df.iloc[offset:].reset_index(drop=True), len(df)
+
+    parquet_file = pq.ParquetFile(path)
+    total_rows = parquet_file.metadata.num_rows
+
+    row_groups = []
+    first_row = 0
+    skip = 0
+    for index in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(index).num_rows
+        if first_row + group_rows > offset:
+            if not row_groups:
+                skip = max(offset - first_row, 0)
+            row_groups.append(index)
+        first_row += group_rows
+
+    if row_groups:
+        table = parquet_file.read_row_groups(row_groups, columns=columns).slice(skip)
+    else:
+        table = parquet_file.schema_arrow.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+    return table.to_pandas(), total_rows
+
+
+def refresh_published_datasets(file_path, output_dir="excels", sheet_name='Sheet1', state_dir=None, plan=None, full=False, formats=("xlsx",)):
+    """
+    Fold the ledger rows appended since the last run into the persisted aggregates and rewrite
+    only the published datasets whose content changed, then refresh the JSON copies and the
+    manifest read by the dashboard (see dashboard.publish_dashboard_artifacts).
+
+    The watermark is the number of ledger rows already aggregated, so the ledger is expected to be
+    append-only; when it shrinks, or the plan changes, everything is recomputed from scratch. Rows
+    are not selected by date, as "FECHAPEDIDO" is not ordered in the ledger. The aggregation is
+    incremental, the parse is not: see read_ledger_tail.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - output_dir: str, directory where the published datasets are written (default is 'excels')
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - state_dir: str, directory holding the incremental state (default is inside output_dir)
+    - plan: list of AggregationSpec, the aggregations to keep up to date (default is MAIN_AGGREGATION_PLAN)
+    - full: bool, whether to discard the state and recompute everything (default is False)
+    - formats: iterable of str, formats to write every dataset in, as in writers.write_outputs (default is ("xlsx",))
+
+    Returns:
+    - list of str: names of the datasets that were rewritten
+    """
+    plan = plan or dt.MAIN_AGGREGATION_PLAN
+    state_dir = state_dir or default_state_dir(output_dir)
+    state, partials = (None, {}) if full else load_state(state_dir, plan)
+    offset = state["rows"] if state else 0
+
+    delta, total_rows = read_ledger_tail(file_path, offset, sheet_name, columns=plan_columns(plan))
+    if total_rows < offset:
+        print(f"Ledger shrank from {offset} to {total_rows} rows, recomputing everything.")
+        state, partials, offset = None, {}, 0
+        delta, total_rows = read_ledger_tail(file_path, 0, sheet_name, columns=plan_columns(plan))
+
+    if delta.empty and state is not None:
+        print(f"No new rows after row {offset}, published datasets are up to date.")
+        return []
+
+    dtypes = delta.dtypes.to_dict()
+    previous = dt.build_published_datasets(finalize_partials(partials, plan, dtypes=dtypes)) if partials else {}
+
+    enriched = dt.enrich_dataset(delta)
+    partials = merge_partials(partials, compute_partials(enriched, plan))
+    published = dt.build_published_datasets(finalize_partials(partials, plan, dtypes=dtypes))
+
+    # A dataset is rewritten, in every format, when it changed or one of its files is missing
+    changed = {
+        name: dataframe for name, dataframe in published.items()
+        if not (name in previous and previous[name].equals(dataframe)
+                and all(os.path.exists(os.path.join(output_dir, f"{name}.{file_format}")) for file_format in formats))
+    }
+    write_outputs(changed, output_dir, formats=formats)
+    rewritten = list(changed)
+    if rewritten:
+        # The manifest lists every dataset, with the files and row counts just written; the JSON
+        # copies of the unchanged datasets, and of all of them when JSON is one of the formats, are current
+        up_to_date = [name for name in published if name not in changed or "json" in formats]
+        publish_dashboard_artifacts(published, output_dir, up_to_date=up_to_date)
+
+    save_state(state_dir, plan, partials, total_rows)
+
+    print(f"Aggregated {len(delta)} new rows (rows {offset} to {total_rows}), rewrote {rewritten}")
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh the published datasets with newly appended ledger rows.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--output_dir", type=str, default="excels", help="Directory of the published datasets (default is 'excels')")
+    parser.add_argument("--full", action="store_true", help="Discard the persisted aggregates and recompute everything")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["xlsx"], help="Output formats of the published datasets (default is xlsx)")
+
+    args = parser.parse_args()
+
+    refresh_published_datasets(args.file_path, args.output_dir, args.sheet_name, full=args.full, formats=args.formats)
+
+
+if __name__ == "__main__":
+    main()
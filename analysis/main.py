@@ -1,23 +1,169 @@
 import argparse
-import analysis.data_treatment as dt
 
-def main():
-    parser = argparse.ArgumentParser(description="Read an Excel dataset using Pandas.")
-    parser.add_argument("file_path", type=str, help="Path to the Excel file")
-    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+# Only the standard library is imported here: pandas, openpyxl and keras are imported by the
+# subcommand that needs them, so --help and the quick commands start immediately.
+
+DEFAULT_LEDGER = "consumo_material_clean.xlsx"
+# The formats of writers.FORMATS, listed here as importing writers would load pandas
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet", "json")
+
+
+def _read(args, compact=True):
+    import analysis.data_treatment as dt
+
+    data_frame = dt.read_excel_dataset(args.file_path, args.sheet_name, compact=compact)
+    if data_frame is None:
+        raise SystemExit(f"Could not read the Excel dataset '{args.file_path}'.")
+    return data_frame
+
+
+def _show(data_frame, output=None):
+    if output:
+        from analysis.writers import write_dataframe
+
+        elapsed = write_dataframe(data_frame, output)
+        print(f"Wrote {len(data_frame)} rows to {output} in {elapsed:.3f}s")
+    else:
+        print(data_frame.head() if len(data_frame) > 20 else data_frame)
+
+
+def ingest(args):
+    """
+    Read a workbook through the columnar cache (building it on first read) and show its first rows.
+    """
+    if args.rebuild:
+        import analysis.cache as cache
+
+        cache.invalidate_cache(args.file_path, args.sheet_name)
+
+    print(args.file_path)
+    data_frame = _read(args, compact=args.compact)
+    print("Successfully read the Excel dataset:")
+    print(data_frame.head())
+
+
+def enrich(args):
+    """
+    Add the date and hospital columns to the ledger.
+    """
+    import analysis.data_treatment as dt
+
+    _show(dt.enrich_dataset(_read(args)), args.output)
+
+
+def aggregate(args):
+    """
+    Compute and publish the datasets of the dashboard, as data_treatment.py does.
+    """
+    import analysis.data_treatment as dt
+
+    dt.main(chunk_size=args.chunk_size, workers=args.workers, incremental=args.incremental, formats=args.formats,
+            file_path=args.file_path, sheet_name=args.sheet_name, output_dir=args.output_dir)
+
+
+def bootstrap(args):
+    """
+    Bootstrap the confidence interval of the yearly spending, overall or per group.
+    """
+    import analysis.data_treatment as dt
 
-    args = parser.parse_args()
+    enriched = dt.enrich_dataset(_read(args))
+    if not args.by:
+        yearly = dt.sum_importe_by_fecha(enriched)
+        lower, upper = dt.calculate_spending_range(yearly["TotalImporte"].to_numpy(), confidence_level=args.confidence_level,
+                                                   num_bootstraps=args.num_bootstraps, rng=args.seed, method=args.method)
+        print(f"Yearly spending, {args.confidence_level:.0%} interval of the mean: {lower:.2f} - {upper:.2f}")
+        return
 
-    file_path = args.file_path
-    sheet_name = args.sheet_name
+    yearly = enriched.groupby([*args.by, "Year"], observed=True)["IMPORTELINEA"].sum().reset_index()
+    ranges = dt.calculate_spending_ranges(yearly, "IMPORTELINEA", args.by, confidence_level=args.confidence_level,
+                                          num_bootstraps=args.num_bootstraps, rng=args.seed, method=args.method)
+    _show(ranges, args.output)
+
+
+def export(args):
+    """
+    Write the ledger without "NUMERO" and "REFERENCIA" and with "TOTALUNIDADES", as generate_new_dataset.py does.
+    """
+    from analysis.generate_new_dataset import main as generate_new_dataset
+
+    generate_new_dataset(args.file_path, args.output, args.sheet_name)
+
+
+def train(args):
+    """
+    Train the LSTM of train.py.
+    """
+    from analysis.train import train as train_model
+
+    train_model(args.file_path, sequence_length=args.sequence_length, batch_size=args.batch_size,
+                validation_split=args.validation_split, epochs=args.epochs)
+
+
+def build_parser():
+    """
+    Build the parser of the command line, one subcommand per pipeline step.
+
+    Returns:
+    - argparse.ArgumentParser: the parser
+    """
+    parser = argparse.ArgumentParser(description="Run the steps of the analysis pipeline.")
+    parser.add_argument("--trace", type=str, default=None, help="Time and memory-profile every stage, writing a JSON trace to this path and printing a summary")
+    parser.add_argument("--profile", type=str, default=None, help="Also dump cProfile statistics of the run to this path (for pstats, snakeviz or flameprof)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, handler, help, file_path=DEFAULT_LEDGER):
+        command = subparsers.add_parser(name, help=help, description=help)
+        command.add_argument("file_path", type=str, nargs="?", default=file_path, help=f"Path to the Excel file (default is '{file_path}')")
+        command.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+        command.set_defaults(handler=handler)
+        return command
+
+    command = add_command("ingest", ingest, "Read a workbook through the columnar cache and show its first rows.")
+    command.add_argument("--compact", action="store_true", help="Convert to the compact dtypes and print the memory saved")
+    command.add_argument("--rebuild", action="store_true", help="Rebuild the columnar cache of the workbook")
+
+    command = add_command("enrich", enrich, "Add the date and hospital columns to the ledger.")
+    command.add_argument("--output", type=str, default=None, help="Write the enriched ledger to this file (.xlsx, .csv, .parquet or .json) instead of showing it")
+
+    command = add_command("aggregate", aggregate, "Compute and publish the datasets of the dashboard.")
+    command.add_argument("--output_dir", type=str, default="excels", help="Directory of the published datasets (default is 'excels')")
+    command.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=["xlsx"], help="Output formats of the published datasets (default is xlsx)")
+    command.add_argument("--chunk_size", type=int, default=None, help="Stream the ledger in chunks of this many rows (default is to load it whole)")
+    command.add_argument("--workers", type=int, default=1, help="Number of worker processes for the aggregations (default is 1)")
+    command.add_argument("--incremental", action="store_true", help="Only aggregate the rows appended since the last incremental run")
+
+    command = add_command("bootstrap", bootstrap, "Bootstrap the confidence interval of the yearly spending.")
+    command.add_argument("--by", nargs="+", default=None, help="Columns identifying separate spending series, e.g. CODIGO (default is the whole ledger)")
+    command.add_argument("--confidence_level", type=float, default=0.95, help="Confidence level of the interval (default is 0.95)")
+    command.add_argument("--num_bootstraps", type=int, default=1000, help="Number of bootstrap samples (default is 1000)")
+    command.add_argument("--method", choices=["percentile", "bca"], default="percentile", help="Kind of interval (default is percentile)")
+    command.add_argument("--seed", type=int, default=None, help="Seed of the resampling (default is unseeded)")
+    command.add_argument("--output", type=str, default=None, help="Write the intervals per group to this file instead of showing them")
+
+    command = add_command("export", export, "Write the ledger with \"TOTALUNIDADES\" and without \"NUMERO\" and \"REFERENCIA\".")
+    command.add_argument("--output", type=str, default="modified_dataset.xlsx", help="Path of the Excel file to write (default is 'modified_dataset.xlsx')")
+
+    command = add_command("train", train, "Train the LSTM predicting \"CANTIDADCOMPRA\".", file_path="excels/train.xlsx")
+    command.add_argument("--sequence_length", type=int, default=10, help="Number of time steps per window (default is 10)")
+    command.add_argument("--batch_size", type=int, default=32, help="Number of windows per batch (default is 32)")
+    command.add_argument("--validation_split", type=float, default=0.2, help="Share of the last windows kept for validation (default is 0.2)")
+    command.add_argument("--epochs", type=int, default=150, help="Number of training epochs (default is 150)")
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
 
-    print(file_path)
+    if args.trace or args.profile:
+        from analysis.profiling import profiling
 
-    data_frame = dt.read_excel_dataset(file_path, sheet_name)
+        with profiling(trace_path=args.trace, profile_path=args.profile):
+            args.handler(args)
+    else:
+        args.handler(args)
 
-    if data_frame is not None:
-        print("Successfully read the Excel dataset:")
-        print(data_frame.head())
 
 if __name__ == "__main__":
     main()
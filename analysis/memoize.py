@@ -0,0 +1,283 @@
+import functools
+import glob
+import hashlib
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from analysis.writers import write_atomically
+
+# Results go to the hidden cache folder of the project (next to the "analysis" package), wherever
+# the process runs from, unless this environment variable names another directory
+MEMO_DIR_ENV = "DATATON_MEMO_DIR"
+DEFAULT_MEMO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dataton_cache", "results")
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+# Errors of storing or reading a result: a missing pyarrow, columns pyarrow cannot convert (e.g. an
+# object column mixing numbers and strings; pyarrow's ArrowInvalid, ArrowTypeError and
+# ArrowNotImplementedError subclass ValueError, TypeError and NotImplementedError), and
+# unwritable, unreadable or truncated files
+STORE_ERRORS = (ImportError, ValueError, TypeError, NotImplementedError, OSError)
+
+# Fingerprints hash this many evenly spaced blocks of rows (and the first and last rows)
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_ROWS = 64
+
+# Key under DataFrame.attrs identifying the file a ledger was read from, set by read_excel_dataset
+SOURCE_KEY_ATTR = "source_key"
+
+# Module constant that versions the stored results of the memoized functions of a module. The key
+# of a call only covers the code of the function itself, so a change to a helper it calls must
+# bump this constant for the results to be computed again.
+MEMO_VERSION_ATTR = "MEMO_VERSION"
+
+# Results are only stored while a store is enabled; memoized functions run normally otherwise
+_store = None
+
+
+def _sample_positions(n_rows, blocks=FINGERPRINT_BLOCKS, block_rows=FINGERPRINT_BLOCK_ROWS):
+    if n_rows <= (blocks + 2) * block_rows:
+        return np.arange(n_rows)
+    starts = np.linspace(0, n_rows - block_rows, blocks + 2).astype(np.int64)
+    return np.unique((starts[:, None] + np.arange(block_rows)).ravel())
+
+
+def fingerprint(dataframe, full=False):
+    """
+    Fingerprint a DataFrame cheaply from its shape, columns, dtypes, source file and sampled rows.
+
+    Only evenly spaced blocks of rows are hashed, so a change confined to rows outside the
+    sample goes unnoticed; pass full=True to hash every row. The source key a ledger carries in
+    DataFrame.attrs (the key of the workbook's columnar cache) tells apart ledgers read from
+    different versions of a file.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the DataFrame to fingerprint
+    - full: bool, whether to hash every row instead of a sample (default is False)
+
+    Returns:
+    - str: hexadecimal fingerprint
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((dataframe.shape, list(dataframe.columns), [str(dtype) for dtype in dataframe.dtypes])).encode("utf-8"))
+    digest.update(str(dataframe.attrs.get(SOURCE_KEY_ATTR)).encode("utf-8"))
+
+    sample = dataframe if full else dataframe.iloc[_sample_positions(len(dataframe))]
+    if len(sample.columns):
+        digest.update(pd.util.hash_pandas_object(sample, index=True).to_numpy().tobytes())
+    else:
+        digest.update(pd.util.hash_pandas_object(sample.index).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def default_memo_dir():
+    """
+    Return the directory of the stored results: $DATATON_MEMO_DIR when set, DEFAULT_MEMO_DIR otherwise.
+
+    Returns:
+    - str: path to the directory
+    """
+    return os.environ.get(MEMO_DIR_ENV) or DEFAULT_MEMO_DIR
+
+
+def _code_version(func):
+    # Changing the body of a memoized function invalidates its stored results
+    code = func.__code__
+    return hashlib.sha1(code.co_code + repr(code.co_consts).encode("utf-8")).hexdigest()[:12]
+
+
+class ResultStore:
+    """
+    Parquet files of memoized results in a directory, evicted least recently used first once
+    their total size goes over a bound. A hit refreshes the modification time of its file, which
+    orders the eviction, so the store can be shared by several processes.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, full=False):
+        directory = directory or default_memo_dir()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.full = full
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name, key):
+        """
+        Return the Parquet file of a result.
+
+        Parameters:
+        - name: str, the name of the memoized function
+        - key: str, the key of the call
+
+        Returns:
+        - str: path of the Parquet file
+        """
+        return os.path.join(self.directory, f"{name}-{key}.parquet")
+
+    def load(self, name, key):
+        """
+        Return a stored result, or None when it is not stored or cannot be read (the unreadable
+        file is then removed, so the result is computed and stored again).
+        """
+        path = self.path(name, key)
+        try:
+            result = pd.read_parquet(path)
+            os.utime(path)
+        except FileNotFoundError:
+            # Never stored, or evicted by another process in the meantime
+            with self._lock:
+                self.misses += 1
+            return None
+        except STORE_ERRORS as e:
+            print(f"Discarding the unreadable stored result {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def save(self, name, key, result):
+        """
+        Store a result, then evict the least recently used results over the size bound.
+
+        Results that cannot be stored as Parquet (see STORE_ERRORS) are skipped.
+
+        Returns:
+        - bool: whether the result was stored
+        """
+        try:
+            write_atomically(self.path(name, key), lambda tmp_path: result.to_parquet(tmp_path))
+        except STORE_ERRORS as e:
+            print(f"Not storing the result of {name}: {e}")
+            return False
+        self.evict()
+        return True
+
+    def size(self):
+        """
+        Return the total size in bytes of the stored results.
+        """
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), "*.parquet")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, path, stat.st_size))
+        return sorted(entries)
+
+    def evict(self):
+        """
+        Remove the least recently used results until the store fits in max_bytes.
+
+        Returns:
+        - int: number of results removed
+        """
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """
+        Remove every stored result.
+
+        Returns:
+        - int: number of results removed
+        """
+        removed = 0
+        for _, path, _ in self._entries():
+            os.remove(path)
+            removed += 1
+        return removed
+
+
+def enable_memoization(directory=None, max_bytes=DEFAULT_MAX_BYTES, full=False):
+    """
+    Store the results of memoized functions on disk from now on, and reuse them on repeated calls.
+
+    DataFrame arguments are recognised by a sampled fingerprint (see fingerprint): a DataFrame
+    edited in place outside the sampled rows (e.g. ``df.loc[5000, "IMPORTELINEA"] = 1e9``) keeps
+    its fingerprint, and the result stored for it before the edit is returned. Pass full=True to
+    hash every row of every argument instead, or call memoized functions on a copy after editing.
+
+    Parameters:
+    - directory: str, directory of the stored results (default is default_memo_dir())
+    - max_bytes: int, total size of the stored results kept (default is 256 MiB)
+    - full: bool, whether to fingerprint DataFrame arguments from all their rows (default is False)
+
+    Returns:
+    - ResultStore: the store
+    """
+    global _store
+    _store = ResultStore(directory, max_bytes, full)
+    return _store
+
+
+def disable_memoization():
+    """
+    Stop storing and reusing results; memoized functions run normally again.
+    """
+    global _store
+    _store = None
+
+
+def memoized(func):
+    """
+    Decorator reusing the stored DataFrame result of a function when it is called again on the
+    same inputs, while memoization is enabled (see enable_memoization).
+
+    DataFrame arguments are identified by their fingerprint, sampled unless the store was enabled
+    with full=True, so in-place edits outside the sampled rows go unnoticed (see
+    enable_memoization); other arguments are identified by their repr. The key also covers the
+    code of the function and the MEMO_VERSION constant of its module, which has to be bumped when
+    a helper the function calls changes its results. Results that are not DataFrames, or that
+    Parquet cannot hold, are returned without being stored.
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+    version = _code_version(func)
+
+    def argument_key(value, full):
+        return f"DataFrame:{fingerprint(value, full)}" if isinstance(value, pd.DataFrame) else repr(value)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        store = _store
+        if store is None:
+            return func(*args, **kwargs)
+
+        module_version = getattr(sys.modules.get(func.__module__), MEMO_VERSION_ATTR, None)
+        parts = [version, repr(module_version), *(argument_key(arg, store.full) for arg in args),
+                 *(f"{key}={argument_key(value, store.full)}" for key, value in sorted(kwargs.items()))]
+        key = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+        result = store.load(name, key)
+        if result is None:
+            result = func(*args, **kwargs)
+            if isinstance(result, pd.DataFrame):
+                store.save(name, key, result)
+        return result
+
+    return wrapper
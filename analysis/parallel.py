@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from analysis.aggregation import compute_partials, finalize_partials, merge_partials, plan_groupings
+
+PARTITION_KEYS = ("CODIGO", "Hospital", "Year")
+
+
+def partition_ledger(dataframe, by, n_partitions):
+    """
+    Hash-partition a ledger so that every value of a column lands in exactly one partition.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the (enriched) ledger
+    - by: str, column to partition on, e.g. "CODIGO", "Hospital" or "Year"
+    - n_partitions: int, number of partitions
+
+    Returns:
+    - list of pd.DataFrame: the non-empty partitions
+    """
+    if by not in dataframe.columns:
+        raise ValueError(f"Column '{by}' not found in the DataFrame.")
+    if n_partitions < 1:
+        raise ValueError("n_partitions must be at least 1.")
+
+    buckets = pd.util.hash_pandas_object(dataframe[by], index=False).to_numpy() % np.uint64(n_partitions)
+    order = np.argsort(buckets, kind="stable")
+    bounds = np.cumsum(np.bincount(buckets.astype(np.intp), minlength=n_partitions))
+    starts = np.concatenate([[0], bounds[:-1]])
+    return [dataframe.take(order[start:end]) for start, end in zip(starts, bounds) if end > start]
+
+
+def _to_shared_memory(dataframe):
+    """
+    Serialize a DataFrame as an Arrow IPC stream straight into a new shared memory block.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+
+    # Measure the stream first so it can be written into the block without an intermediate copy
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(block.buf))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+    return block, size
+
+
+def _partials_from_buffer(buffer, plan):
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(pa.py_buffer(buffer)).read_all()
+    return compute_partials(table.to_pandas(), plan)
+
+
+def _aggregate_shared_partition(name, size, plan):
+    """
+    Worker entry point: attach to a shared memory block and reduce its partition to partial aggregates.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    view = block.buf[:size]
+    try:
+        return _partials_from_buffer(view, plan)
+    finally:
+        view.release()
+        block.close()
+
+
+def aggregate_in_parallel(dataframe, plan, workers=None, partition_by="Hospital"):
+    """
+    Run an aggregation plan over hash partitions of the ledger on a process pool.
+
+    Partitions are handed to the workers as Arrow IPC streams in shared memory instead of being
+    pickled, and the partial aggregates the workers send back are merged into the final results.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the (enriched) ledger
+    - plan: list of AggregationSpec, the aggregations to compute
+    - workers: int, number of worker processes (default is the number of CPUs)
+    - partition_by: str, column to partition on, one of "CODIGO", "Hospital" or "Year" (default is "Hospital")
+
+    Returns:
+    - dict: maps each aggregation name to its result DataFrame
+    """
+    if partition_by not in PARTITION_KEYS:
+        raise ValueError(f"partition_by must be one of {PARTITION_KEYS}.")
+
+    workers = workers or os.cpu_count() or 1
+    groupings, _ = plan_groupings(plan)
+    columns = {key for keys in groupings for key in keys} | {measure for stats in groupings.values() for measure, _ in stats}
+    columns = [col for col in dataframe.columns if col in columns or col == partition_by]
+
+    if workers == 1:
+        return finalize_partials(compute_partials(dataframe[columns], plan), plan, dtypes=dataframe.dtypes.to_dict())
+
+    blocks = []
+    try:
+        for partition in partition_ledger(dataframe[columns], partition_by, workers):
+            blocks.append(_to_shared_memory(partition))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_aggregate_shared_partition, block.name, size, plan) for block, size in blocks]
+            partials = merge_partials(*[future.result() for future in futures])
+    finally:
+        for block, _ in blocks:
+            block.close()
+            block.unlink()
+
+    return finalize_partials(partials, plan, dtypes=dataframe.dtypes.to_dict())
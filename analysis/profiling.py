@@ -0,0 +1,301 @@
+import contextlib
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from analysis.writers import write_atomically
+
+# Only one profiler records at a time; stage() and @profiled do nothing while none is active
+_active = None
+
+
+def _rows(value):
+    """
+    Return the number of rows of a stage input or output, when it has any.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, dict) and value and all(isinstance(item, pd.DataFrame) for item in value.values()):
+        return sum(len(item) for item in value.values())
+    return None
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Kilobytes on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class Stage:
+    """
+    Measurements of one run of a pipeline stage.
+
+    Set ``rows_out`` (and ``rows_in`` when it was not known on entry) inside the stage to record
+    how many rows it produced.
+    """
+
+    def __init__(self, name, path, rows_in=None):
+        self.name = name
+        self.path = path
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.started = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.traced_start = None
+        self.traced_peak = None
+        self.max_rss_bytes = None
+
+    def as_dict(self):
+        """
+        Return the measurements as a JSON serializable dict.
+        """
+        traced = None if self.traced_peak is None else max(0, self.traced_peak - self.traced_start)
+        return {
+            "stage": self.path,
+            "started": self.started,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_traced_bytes": traced,
+            "max_rss_bytes": self.max_rss_bytes,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+        }
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, memory and rows of nested pipeline stages.
+
+    Memory is measured twice: the peak of the memory traced by tracemalloc while the stage ran,
+    above what was traced when it started (when tracemalloc is tracing), and the high-water mark
+    of the process RSS when the stage ended. Stages nest per thread; the peak of a stage includes
+    the peaks of the stages nested in it.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.records = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @staticmethod
+    def _update_peaks(stages):
+        # Fold the traced peak since the last reset into every open stage, then start a new period
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        for stage in stages:
+            stage.traced_peak = peak if stage.traced_peak is None else max(stage.traced_peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measure a block of code as a stage, nested in the stage open on the current thread.
+
+        Parameters:
+        - name: str, the name of the stage
+        - rows_in: int, number of rows the stage receives (default is None, unknown)
+
+        Returns:
+        - context manager yielding the Stage being measured
+        """
+        stack = self._stack()
+        record = Stage(name, "/".join([parent.name for parent in stack] + [name]), rows_in)
+        record.traced_start = self._update_peaks(stack)
+        record.started = time.perf_counter() - self._origin
+        cpu_start = time.process_time()
+        stack.append(record)
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - self._origin - record.started
+            record.cpu_seconds = time.process_time() - cpu_start
+            self._update_peaks(stack)
+            stack.pop()
+            record.max_rss_bytes = _max_rss_bytes()
+            with self._lock:
+                self.records.append(record)
+
+    def add(self, name, wall_seconds, rows_in=None, rows_out=None):
+        """
+        Record a stage measured elsewhere (e.g. on a worker thread), nested in the open stage.
+
+        Parameters:
+        - name: str, the name of the stage
+        - wall_seconds: float, the wall time of the stage
+        - rows_in: int, number of rows the stage received (default is None)
+        - rows_out: int, number of rows the stage produced (default is None)
+        """
+        stack = self._stack()
+        record = Stage(name, "/".join([parent.name for parent in stack] + [name]), rows_in)
+        record.started = time.perf_counter() - self._origin
+        record.wall_seconds = wall_seconds
+        record.rows_out = rows_out
+        with self._lock:
+            self.records.append(record)
+
+    def trace(self):
+        """
+        Return the recorded stages, in the order they started, as a JSON serializable dict.
+        """
+        records = sorted(self.records, key=lambda record: record.started)
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "tracemalloc": tracemalloc.is_tracing(),
+            "stages": [record.as_dict() for record in records],
+        }
+
+    def summary(self):
+        """
+        Return one row per stage path, in the order they first started, with total times, the
+        largest memory peaks and the rows of the last run.
+        """
+        stages = pd.DataFrame(self.trace()["stages"], columns=["stage", "started", "wall_seconds", "cpu_seconds", "peak_traced_bytes", "max_rss_bytes", "rows_in", "rows_out"])
+        summary = stages.groupby("stage", sort=False).agg(
+            Runs=("started", "size"),
+            WallSeconds=("wall_seconds", "sum"),
+            # Stages measured on other threads have no CPU time
+            CPUSeconds=("cpu_seconds", lambda seconds: seconds.sum(min_count=1)),
+            PeakTracedMiB=("peak_traced_bytes", "max"),
+            MaxRSSMiB=("max_rss_bytes", "max"),
+            RowsIn=("rows_in", "last"),
+            RowsOut=("rows_out", "last"),
+        )
+        summary[["PeakTracedMiB", "MaxRSSMiB"]] = summary[["PeakTracedMiB", "MaxRSSMiB"]].astype(float) / 2**20
+        summary[["RowsIn", "RowsOut"]] = summary[["RowsIn", "RowsOut"]].astype("Int64")
+        return summary.reset_index().rename(columns={"stage": "Stage"})
+
+    def write_trace(self, path):
+        """
+        Write the recorded stages to a JSON file, atomically.
+
+        Parameters:
+        - path: str, path of the JSON trace
+        """
+        trace = self.trace()
+
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(trace, f, indent=2)
+
+        write_atomically(path, write)
+
+
+def active_profiler():
+    """
+    Return the profiler recording stages, or None.
+    """
+    return _active
+
+
+def stage(name, rows_in=None):
+    """
+    Measure a block of code as a stage of the active profiler; does nothing when none is active.
+
+        with stage("load") as record:
+            df = read_excel_dataset(file_path)
+            record.rows_out = len(df)
+
+    Parameters:
+    - name: str, the name of the stage
+    - rows_in: int, number of rows the stage receives (default is None, unknown)
+
+    Returns:
+    - context manager yielding the Stage being measured
+    """
+    if _active is None:
+        return contextlib.nullcontext(Stage(name, name, rows_in))
+    return _active.stage(name, rows_in)
+
+
+def profiled(name=None):
+    """
+    Decorator measuring every call of a function as a stage of the active profiler.
+
+    The rows of the first argument and of the result are recorded when they are DataFrames,
+    Series, arrays or dicts of DataFrames.
+
+    Parameters:
+    - name: str, the name of the stage (default is the name of the function)
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(stage_name, _rows(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                record.rows_out = _rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def profiling(trace_path=None, profile_path=None, trace_memory=True, summary=True):
+    """
+    Record the stages run inside the block, then write a JSON trace and print a summary table.
+
+    Parameters:
+    - trace_path: str, path of the JSON trace (default is None, not written)
+    - profile_path: str, path of a cProfile dump of the block, readable with pstats, snakeviz or
+      flameprof (default is None, not profiled)
+    - trace_memory: bool, whether to trace allocations with tracemalloc, which slows the block
+      down (default is True)
+    - summary: bool, whether to print the summary table (default is True)
+
+    Returns:
+    - context manager yielding the Profiler
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError("A profiler is already recording.")
+
+    profiler = Profiler()
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    code_profile = cProfile.Profile() if profile_path else None
+
+    _active = profiler
+    if code_profile is not None:
+        code_profile.enable()
+    try:
+        yield profiler
+    finally:
+        if code_profile is not None:
+            code_profile.disable()
+        _active = None
+        if trace_path:
+            profiler.write_trace(trace_path)
+        if started_tracing:
+            tracemalloc.stop()
+        if code_profile is not None:
+            code_profile.dump_stats(profile_path)
+        if summary and profiler.records:
+            with pd.option_context("display.max_rows", None, "display.width", 200, "display.float_format", "{:.3f}".format):
+                print(profiler.summary().to_string(index=False))
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+ORDER_DATE_FORMAT = "%d/%m/%y"
+
+# Compact dtype of each ledger column: repeated codes become categories, "FECHAPEDIDO" a native
+# datetime64 and the numeric columns the smallest dtype that holds their values exactly
+LEDGER_SCHEMA = {
+    "CODIGO": "category",
+    "FECHAPEDIDO": "date",
+    "CANTIDADCOMPRA": "integer",
+    "UNIDADESCONSUMOCONTENIDAS": "integer",
+    "PRECIO": "float",
+    "IMPORTELINEA": "float",
+    "TIPOCOMPRA": "category",
+    "ORIGEN": "category",
+    "TGL": "category",
+    "PRODUCTO": "category",
+    "TOTALUNIDADES": "integer",
+}
+
+
+def parse_order_dates(values):
+    """
+    Parse "dd/mm/yy" order dates, once per distinct value, into datetime64 (NaT when unparsable).
+
+    Parameters:
+    - values: pd.Series, the "FECHAPEDIDO" strings
+
+    Returns:
+    - pd.Series: the parsed dates, with the index of values
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques), format=ORDER_DATE_FORMAT, errors="coerce").to_numpy()
+    return pd.Series(np.append(parsed, np.datetime64("NaT"))[codes], index=values.index)
+
+
+def _downcast_integer(series):
+    if not pd.api.types.is_integer_dtype(series) or isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series
+    # to_numeric only downcasts to a dtype that holds every value
+    return pd.to_numeric(series, downcast="integer")
+
+
+def widen_integers(series):
+    """
+    Return an integer column as 64-bit integers (Int64 when nullable), other columns unchanged, so
+    arithmetic on downcast columns cannot overflow.
+
+    Parameters:
+    - series: pd.Series, the column to widen
+
+    Returns:
+    - pd.Series: the widened column
+    """
+    if not pd.api.types.is_integer_dtype(series):
+        return series
+    return series.astype("Int64" if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else np.int64)
+
+
+def _downcast_float(series):
+    if not pd.api.types.is_float_dtype(series) or series.dtype == np.float32:
+        return series
+    values = series.to_numpy()
+    compact = values.astype(np.float32)
+    # Most decimal amounts are not exact in float32, keep float64 unless nothing would change
+    if np.array_equal(compact.astype(values.dtype), values, equal_nan=True):
+        return series.astype(np.float32)
+    return series
+
+
+def _to_category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    return series.astype("category")
+
+
+def _to_dates(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return parse_order_dates(series).rename(series.name)
+
+
+_CONVERTERS = {
+    "category": _to_category,
+    "date": _to_dates,
+    "integer": _downcast_integer,
+    "float": _downcast_float,
+}
+
+
+def compact_ledger(dataframe, schema=None):
+    """
+    Convert the columns of a ledger to the compact dtypes of a schema. Columns missing from the
+    ledger or from the schema are left untouched, and the input DataFrame is not modified.
+
+    Downcast integer columns wrap around on overflow, so arithmetic that can exceed their range
+    (e.g. "CANTIDADCOMPRA" * "UNIDADESCONSUMOCONTENIDAS") has to go through widen_integers.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger
+    - schema: dict, maps column names to "category", "date", "integer" or "float" (default is LEDGER_SCHEMA)
+
+    Returns:
+    - pd.DataFrame: a new DataFrame with the compact columns
+    """
+    schema = LEDGER_SCHEMA if schema is None else schema
+    unknown = {kind for kind in schema.values() if kind not in _CONVERTERS}
+    if unknown:
+        raise ValueError(f"Unknown column kinds {sorted(unknown)}, expected some of {sorted(_CONVERTERS)}.")
+
+    converted = {col: _CONVERTERS[kind](dataframe[col]) for col, kind in schema.items() if col in dataframe.columns}
+    return dataframe.assign(**converted)
+
+
+def memory_usage(dataframe):
+    """
+    Return the memory used by each column of a DataFrame, including the Python strings it references.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the DataFrame to measure
+
+    Returns:
+    - pd.Series: bytes per column
+    """
+    return dataframe.memory_usage(index=False, deep=True)
+
+
+def memory_report(before, after):
+    """
+    Compare the dtypes and memory of a ledger before and after compact_ledger.
+
+    Parameters:
+    - before: pd.DataFrame, the ledger as read
+    - after: pd.DataFrame, the compact ledger
+
+    Returns:
+    - pd.DataFrame: "DtypeBefore", "DtypeAfter", "MBBefore" and "MBAfter" per column, with a "Total" row
+    """
+    report = pd.DataFrame({
+        "DtypeBefore": before.dtypes.astype(str),
+        "DtypeAfter": after.dtypes.reindex(before.columns).astype(str),
+        "MBBefore": memory_usage(before) / 2 ** 20,
+        "MBAfter": memory_usage(after).reindex(before.columns) / 2 ** 20,
+    })
+    report.loc["Total"] = ["", "", report["MBBefore"].sum(), report["MBAfter"].sum()]
+    return report
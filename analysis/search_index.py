@@ -0,0 +1,191 @@
+import re
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+NGRAM_SIZE = 3
+DEFAULT_CACHE_SIZE = 256
+
+# A pattern without these characters matches as a plain substring under str.contains
+_REGEX_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+class ColumnIndex:
+    """
+    Search index over one string column.
+
+    Every distinct value is lowercased once. Each value maps to its row positions through a CSR
+    layout (positions sorted by value, with one offset per value). An n-gram table maps every
+    n-gram to the values containing it, so a substring search only checks the values that have
+    all of its n-grams.
+    """
+
+    def __init__(self, values, ngram_size=NGRAM_SIZE):
+        codes, uniques = pd.factorize(values)
+        self.ngram_size = ngram_size
+        self.values = np.asarray(uniques, dtype=object)
+        # Non-string values never match, as with str.contains(na=False)
+        self.lowered = [value.lower() if isinstance(value, str) else None for value in self.values]
+
+        valid = np.flatnonzero(codes >= 0)
+        self.positions = valid[np.argsort(codes[valid], kind="stable")]
+        self.offsets = np.zeros(len(self.values) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(codes[valid], minlength=len(self.values)), out=self.offsets[1:])
+
+        self.exact = defaultdict(list)
+        ngrams = defaultdict(list)
+        for value_id, text in enumerate(self.lowered):
+            if text is None:
+                continue
+            self.exact[text].append(value_id)
+            for gram in {text[start:start + ngram_size] for start in range(len(text) - ngram_size + 1)}:
+                ngrams[gram].append(value_id)
+        self.ngrams = {gram: np.array(value_ids, dtype=np.intp) for gram, value_ids in ngrams.items()}
+
+    def _substring_values(self, needle):
+        if len(needle) < self.ngram_size:
+            candidates = range(len(self.lowered))
+        else:
+            grams = sorted({needle[start:start + self.ngram_size] for start in range(len(needle) - self.ngram_size + 1)},
+                           key=lambda gram: len(self.ngrams.get(gram, ())))
+            candidates = self.ngrams.get(grams[0], np.empty(0, dtype=np.intp))
+            for gram in grams[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, self.ngrams.get(gram, np.empty(0, dtype=np.intp)), assume_unique=True)
+        # The n-grams only narrow the candidates down, the substring has to be checked
+        return [value_id for value_id in candidates if self.lowered[value_id] is not None and needle in self.lowered[value_id]]
+
+    def matching_values(self, pattern, regex=True, exact=False):
+        """
+        Return the ids of the distinct values matching a pattern, case-insensitively.
+
+        Parameters:
+        - pattern: str, the substring, regular expression or exact value to look for
+        - regex: bool, whether the pattern is a regular expression, as in str.contains (default is True)
+        - exact: bool, whether to match whole values instead of substrings (default is False)
+
+        Returns:
+        - list of int: ids of the matching distinct values
+        """
+        if exact:
+            return sorted(self.exact.get(pattern.lower(), []))
+        if regex and _REGEX_CHARACTERS.intersection(pattern):
+            compiled = re.compile(pattern, re.IGNORECASE)
+            return [value_id for value_id, value in enumerate(self.values) if isinstance(value, str) and compiled.search(value)]
+        return self._substring_values(pattern.lower())
+
+    def rows(self, value_ids):
+        """
+        Return the row positions holding some distinct values, in row order.
+
+        Parameters:
+        - value_ids: list of int, ids returned by matching_values
+
+        Returns:
+        - np.ndarray: the row positions
+        """
+        if len(value_ids) == 0:
+            return np.empty(0, dtype=np.intp)
+        positions = np.concatenate([self.positions[self.offsets[value_id]:self.offsets[value_id + 1]] for value_id in value_ids])
+        positions.sort()
+        return positions
+
+
+class SearchIndex:
+    """
+    Search indexes over the string columns of a DataFrame, built on first use of each column, with
+    an LRU cache of the row positions of recent queries.
+
+    The index describes the DataFrame as it was when each column was indexed; build a new index
+    after modifying the DataFrame.
+    """
+
+    def __init__(self, dataframe, columns=None, cache_size=DEFAULT_CACHE_SIZE, ngram_size=NGRAM_SIZE):
+        self.dataframe = dataframe
+        self.columns = None if columns is None else set(columns)
+        self.cache_size = cache_size
+        self.ngram_size = ngram_size
+        self._indexes = {}
+        self._cache = OrderedDict()
+
+    def column_index(self, column_name):
+        """
+        Return the index of a column, building it on first use.
+
+        Parameters:
+        - column_name: str, the column to index
+
+        Returns:
+        - ColumnIndex: the index of the column
+        """
+        if column_name not in self.dataframe.columns:
+            raise ValueError(f"Column '{column_name}' does not exist in the DataFrame.")
+        if self.columns is not None and column_name not in self.columns:
+            raise ValueError(f"Column '{column_name}' is not indexed.")
+        if column_name not in self._indexes:
+            self._indexes[column_name] = ColumnIndex(self.dataframe[column_name], self.ngram_size)
+        return self._indexes[column_name]
+
+    def clear_cache(self):
+        """
+        Forget the results of recent queries.
+        """
+        self._cache.clear()
+
+    def row_positions(self, column_name, target_value, regex=True, exact=False):
+        """
+        Return the row positions where a column contains (or equals) a target string, case-insensitively.
+
+        Parameters:
+        - column_name: str, the column to search
+        - target_value: str, the substring, regular expression or exact value to look for
+        - regex: bool, whether target_value is a regular expression, as in str.contains (default is True)
+        - exact: bool, whether to match whole values instead of substrings (default is False)
+
+        Returns:
+        - np.ndarray: the matching row positions, in row order
+        """
+        key = (column_name, target_value, regex, exact)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        index = self.column_index(column_name)
+        positions = index.rows(index.matching_values(target_value, regex=regex, exact=exact))
+
+        self._cache[key] = positions
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return positions
+
+    def filter(self, column_name, target_value, regex=True, exact=False):
+        """
+        Return the rows where a column contains (or equals) a target string, case-insensitively.
+
+        Parameters:
+        - column_name: str, the column to search
+        - target_value: str, the substring, regular expression or exact value to look for
+        - regex: bool, whether target_value is a regular expression, as in str.contains (default is True)
+        - exact: bool, whether to match whole values instead of substrings (default is False)
+
+        Returns:
+        - pd.DataFrame: the matching rows
+        """
+        return self.dataframe.iloc[self.row_positions(column_name, target_value, regex=regex, exact=exact)]
+
+
+def build_search_index(dataframe, columns=None, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Index the string columns of a DataFrame for repeated substring and exact-match filters.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the DataFrame to search
+    - columns: list of str, columns that may be searched (default is None, any column)
+    - cache_size: int, number of recent query results kept (default is 256)
+
+    Returns:
+    - SearchIndex: the index, whose columns are built on first search
+    """
+    return SearchIndex(dataframe, columns=columns, cache_size=cache_size)
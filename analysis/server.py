@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import analysis.cache as cache
+import analysis.data_treatment as dt
+from analysis.aggregation import AggregationSpec, run_aggregation_plan
+from analysis.search_index import build_search_index
+from analysis.writers import to_columnar_json
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_RESULT_CACHE_SIZE = 512
+DEFAULT_QUERY_WORKERS = 4
+
+# Ledger functions exposed as named queries, with the label shown by the dashboard
+QUERIES = {
+    "count_purchases_by_year": (dt.count_purchases_by_year, "Code year - Products"),
+    "calculate_total_by_codigo": (dt.calculate_total_by_codigo, "Code year - Total"),
+    "calculate_product_totals": (dt.calculate_product_totals, "Code year hospital - Totals"),
+    "top_products": (lambda dataframe: dt.top_products(dt.calculate_product_totals(dataframe)), "Year hospital - Top products"),
+    "group_by_origen_and_date": (dt.group_by_origen_and_date, "Hospital year - Purchases"),
+    "group_by_codigo_and_tgl": (dt.group_by_codigo_and_tgl, "Code - TGL"),
+    "sum_importe_by_fecha": (dt.sum_importe_by_fecha, "Year - Money"),
+    "sum_importe_by_month": (dt.sum_importe_by_month, "Month - Money"),
+    "sum_cantidad_by_fecha": (dt.sum_cantidad_by_fecha, "Year - Quantity"),
+    "count_occurrences_by_year": (dt.count_occurrences_by_year, "Year - Purchase"),
+    "group_by_codigo_and_origen": (dt.group_by_codigo_and_origen, "Code - Origin"),
+    "count_occurrences_by_tipo_and_year": (dt.count_occurrences_by_tipo_and_year, "Year - Type"),
+    "calculate_average_quantity_by_tipo_and_year": (dt.calculate_average_quantity_by_tipo_and_year, "Year - Average type"),
+}
+
+# Query parameters of /api/aggregate, every other parameter filters the ledger
+AGGREGATE_PARAMETERS = ("keys", "measure", "reducer", "output")
+# Filters on these columns match whole numbers, filters on other columns match substrings
+INTEGER_COLUMNS = ("Year", "Month", "Day")
+
+# The enriched ledger, its search index and its version, replaced together on reload so a query
+# running during a reload never applies row positions of one ledger to another
+LedgerState = namedtuple("LedgerState", ["ledger", "index", "version"])
+
+
+class LedgerService:
+    """
+    Ledger kept in memory between requests, with an LRU cache of serialized query results keyed on
+    the query and the dataset version (the key of the workbook's columnar cache, which changes with
+    its modification time). The ledger is reloaded when the workbook changes.
+    """
+
+    def __init__(self, file_path, sheet_name='Sheet1', cache_size=DEFAULT_RESULT_CACHE_SIZE, workers=DEFAULT_QUERY_WORKERS):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.state = None
+        self._results = OrderedDict()
+        self._pending = {}
+        self._index_lock = threading.Lock()
+        self._reload_lock = None
+
+    def load(self):
+        """
+        Read and enrich the ledger, and reset the search index and the result cache.
+        """
+        version = cache.cache_key(self.file_path, self.sheet_name)
+        ledger = dt.read_excel_dataset(self.file_path, self.sheet_name, compact=True)
+        if ledger is None:
+            raise RuntimeError(f"Could not read the ledger '{self.file_path}'.")
+
+        ledger = dt.enrich_dataset(ledger)
+        self.state = LedgerState(ledger, build_search_index(ledger), version)
+        self._results.clear()
+
+    @property
+    def ledger(self):
+        return None if self.state is None else self.state.ledger
+
+    @property
+    def version(self):
+        return None if self.state is None else self.state.version
+
+    async def ensure_current(self):
+        """
+        Reload the ledger on the worker threads when the workbook changed since it was loaded.
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            if self.state is None or cache.cache_key(self.file_path, self.sheet_name) != self.state.version:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.load)
+
+    def filter_ledger(self, filters, state=None):
+        """
+        Return the ledger rows matching every filter.
+
+        Parameters:
+        - filters: list of (column, value) pairs; "Year", "Month" and "Day" match whole numbers and
+          other columns match case-insensitive substrings, as filter_rows_by_column_value does
+        - state: LedgerState, the ledger to filter (default is the current one)
+
+        Returns:
+        - pd.DataFrame: the matching rows
+        """
+        # Read once: a reload replaces the ledger and its index together
+        ledger, index, _ = state or self.state
+        positions = None
+        for column, value in filters:
+            if column not in ledger.columns:
+                raise ValueError(f"Unknown filter column '{column}'.")
+            if column in INTEGER_COLUMNS:
+                try:
+                    matches = np.flatnonzero((ledger[column] == int(value)).fillna(False).to_numpy(dtype=bool))
+                except ValueError:
+                    raise ValueError(f"Filter '{column}' expects a whole number, got '{value}'.") from None
+            else:
+                # The index builds its column tables lazily and keeps an LRU cache, both shared by the workers
+                with self._index_lock:
+                    matches = index.row_positions(column, value)
+            positions = matches if positions is None else np.intersect1d(positions, matches, assume_unique=True)
+
+        return ledger if positions is None else ledger.iloc[positions]
+
+    def run_query(self, name, filters, state=None):
+        """
+        Run one of the QUERIES on the (filtered) ledger.
+
+        Parameters:
+        - name: str, the name of the query
+        - filters: list of (column, value) pairs, see filter_ledger
+        - state: LedgerState, the ledger to query (default is the current one)
+
+        Returns:
+        - pd.DataFrame: the query result
+        """
+        if name not in QUERIES:
+            raise ValueError(f"Unknown query '{name}'.")
+        function, _ = QUERIES[name]
+        return function(self.filter_ledger(filters, state))
+
+    def run_aggregation(self, parameters, filters, state=None):
+        """
+        Run an ad hoc aggregation on the (filtered) ledger.
+
+        Parameters:
+        - parameters: dict, "keys" (comma separated), "reducer" (default "count"), "measure" and "output"
+        - filters: list of (column, value) pairs, see filter_ledger
+        - state: LedgerState, the ledger to aggregate (default is the current one)
+
+        Returns:
+        - pd.DataFrame: the aggregation result
+        """
+        keys = [key for key in parameters.get("keys", "").split(",") if key]
+        reducer = parameters.get("reducer", "count")
+        measure = parameters.get("measure")
+        output = parameters.get("output") or (reducer.capitalize() if measure is None else f"{reducer.capitalize()}{measure}")
+        spec = AggregationSpec("query", keys, measure, reducer, output)
+        return run_aggregation_plan(self.filter_ledger(filters, state), [spec])["query"]
+
+    async def respond(self, query_key, if_none_match, compute):
+        """
+        Serve a query result from the cache, computing it on the worker threads on a miss.
+
+        Identical queries arriving while one is being computed share its result. The ledger state
+        is read once, so the result, its ETag and its version all belong to the same ledger even
+        when it is reloaded meanwhile.
+
+        Parameters:
+        - query_key: list, the canonical (JSON serializable) form of the query
+        - if_none_match: str, the If-None-Match header of the request, or None
+        - compute: callable, receives the LedgerState and returns the result DataFrame of the query
+
+        Returns:
+        - tuple: the ETag, the dataset version and the JSON body, or None as body when the client's copy is current
+        """
+        await self.ensure_current()
+        state = self.state
+        key = (state.version, json.dumps(query_key))
+        etag = '"' + hashlib.sha1("|".join(key).encode("utf-8")).hexdigest()[:20] + '"'
+        if if_none_match:
+            # If-None-Match compares ETags weakly, W/"..." matches the same tag
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if etag in tags or "*" in tags:
+                return etag, state.version, None
+
+        if key in self._results:
+            self._results.move_to_end(key)
+            return etag, state.version, self._results[key]
+
+        if key not in self._pending:
+            loop = asyncio.get_running_loop()
+            self._pending[key] = loop.run_in_executor(self.executor, lambda: to_columnar_json(compute(state)).encode("utf-8"))
+        try:
+            body = await asyncio.shield(self._pending[key])
+        finally:
+            self._pending.pop(key, None)
+
+        self._results[key] = body
+        if len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+        return etag, state.version, body
+
+
+def _split_query(request, reserved=()):
+    parameters = {name: request.query[name] for name in reserved if name in request.query}
+    filters = sorted((name, value) for name, value in request.query.items() if name not in reserved)
+    return parameters, filters
+
+
+def create_app(service):
+    """
+    Build the aiohttp application serving the queries of a LedgerService.
+
+    Endpoints (results are columnar JSON, see writers.to_columnar_json):
+    - GET /api/queries: the available named queries
+    - GET /api/query/{name}?COLUMN=value...: a named query on the ledger rows matching the filters
+    - GET /api/aggregate?keys=Year,TIPOCOMPRA&reducer=mean&measure=CANTIDADCOMPRA&COLUMN=value...: an ad hoc aggregation
+
+    Parameters:
+    - service: LedgerService, the ledger to serve
+
+    Returns:
+    - aiohttp.web.Application: the application
+    """
+    from aiohttp import web
+
+    headers = {"Access-Control-Allow-Origin": "*", "Access-Control-Expose-Headers": "ETag"}
+
+    async def serve(request, query_key, compute):
+        try:
+            etag, version, body = await service.respond(query_key, request.headers.get("If-None-Match"), compute)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400, headers=headers)
+
+        response_headers = {**headers, "ETag": etag, "Cache-Control": "no-cache", "X-Dataset-Version": version}
+        if body is None:
+            return web.Response(status=304, headers=response_headers)
+        return web.Response(body=body, content_type="application/json", headers=response_headers)
+
+    async def list_queries(request):
+        await service.ensure_current()
+        queries = [{"name": name, "label": label} for name, (_, label) in QUERIES.items()]
+        return web.json_response({"version": service.version, "queries": queries}, headers=headers)
+
+    async def named_query(request):
+        name = request.match_info["name"]
+        if name not in QUERIES:
+            return web.json_response({"error": f"Unknown query '{name}'."}, status=404, headers=headers)
+        _, filters = _split_query(request)
+        return await serve(request, ["query", name, filters], lambda state: service.run_query(name, filters, state))
+
+    async def aggregate(request):
+        parameters, filters = _split_query(request, AGGREGATE_PARAMETERS)
+        return await serve(request, ["aggregate", sorted(parameters.items()), filters], lambda state: service.run_aggregation(parameters, filters, state))
+
+    app = web.Application()
+    app.router.add_get("/api/queries", list_queries)
+    app.router.add_get("/api/query/{name}", named_query)
+    app.router.add_get("/api/aggregate", aggregate)
+    async def shutdown_executor(app):
+        service.executor.shutdown(wait=False, cancel_futures=True)
+
+    app.on_cleanup.append(shutdown_executor)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ledger aggregations over HTTP.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help=f"Interface to listen on (default is {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default is {DEFAULT_PORT})")
+    parser.add_argument("--cache_size", type=int, default=DEFAULT_RESULT_CACHE_SIZE, help="Number of query results kept in memory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_QUERY_WORKERS, help="Number of threads running the queries")
+
+    args = parser.parse_args()
+
+    from aiohttp import web
+
+    service = LedgerService(args.file_path, args.sheet_name, cache_size=args.cache_size, workers=args.workers)
+    service.load()
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
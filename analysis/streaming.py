@@ -0,0 +1,157 @@
+import os
+
+import pandas as pd
+
+import analysis.cache as cache
+from analysis.aggregation import compute_partials, finalize_partials, merge_partials
+from analysis.data_treatment import enrich_dataset
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def iter_excel_chunks(file_path, sheet_name='Sheet1', chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Read an Excel sheet in bounded chunks with openpyxl's read-only mode.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - chunk_size: int, maximum number of rows per chunk
+    - columns: list of str, columns to keep (default is None, all columns)
+
+    Yields:
+    - pd.DataFrame: consecutive blocks of at most chunk_size rows
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = list(header)
+        positions = list(range(len(header))) if columns is None else [header.index(col) for col in columns]
+        names = [header[position] for position in positions]
+
+        block = []
+        for row in rows:
+            block.append([row[position] for position in positions])
+            if len(block) == chunk_size:
+                yield pd.DataFrame(block, columns=names)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=names)
+    finally:
+        workbook.close()
+
+
+def iter_cached_chunks(file_path, sheet_name='Sheet1', chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Read the columnar cache of an Excel sheet in bounded chunks.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - chunk_size: int, maximum number of rows per chunk
+    - columns: list of str, columns to keep (default is None, all columns)
+
+    Yields:
+    - pd.DataFrame: consecutive blocks of at most chunk_size rows
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(cache.cache_path(file_path, sheet_name))
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def iter_ledger_chunks(file_path, sheet_name='Sheet1', chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """
+    Read a ledger in bounded chunks, from its columnar cache when one exists and from the workbook otherwise.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - chunk_size: int, maximum number of rows per chunk
+    - columns: list of str, columns to keep (default is None, all columns)
+
+    Yields:
+    - pd.DataFrame: consecutive blocks of at most chunk_size rows
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive number of rows.")
+
+    if os.path.exists(cache.cache_path(file_path, sheet_name)):
+        try:
+            yield from iter_cached_chunks(file_path, sheet_name, chunk_size, columns)
+            return
+        except ImportError:
+            pass
+    yield from iter_excel_chunks(file_path, sheet_name, chunk_size, columns)
+
+
+def aggregate_chunks(chunks, plan):
+    """
+    Run an aggregation plan over a stream of ledger chunks.
+
+    Each chunk is enriched and reduced to partial aggregates (counts, sums, and means kept as
+    sum plus count), which are merged into running totals, so peak memory depends on the chunk
+    size and the number of groups rather than on the number of rows.
+
+    Parameters:
+    - chunks: iterable of pd.DataFrame, consecutive blocks of the ledger
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - dict: maps each aggregation name to its result DataFrame
+    """
+    partials = {}
+    dtypes = {}
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        dtypes = dtypes or chunk.dtypes.to_dict()
+        partials = merge_partials(partials, compute_partials(enrich_dataset(chunk), plan))
+
+    if not partials:
+        raise ValueError("The ledger has no rows to aggregate.")
+
+    return finalize_partials(partials, plan, dtypes=dtypes)
+
+
+def aggregate_excel_in_chunks(file_path, plan, sheet_name='Sheet1', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run an aggregation plan over an Excel ledger without loading it in memory at once.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - plan: list of AggregationSpec, the aggregations to compute
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - chunk_size: int, maximum number of rows held in memory at once
+
+    Returns:
+    - dict: maps each aggregation name to its result DataFrame
+    """
+    columns = plan_columns(plan)
+    return aggregate_chunks(iter_ledger_chunks(file_path, sheet_name, chunk_size, columns), plan)
+
+
+def plan_columns(plan):
+    """
+    Return the ledger columns needed to compute a plan, mapping the derived date and hospital keys to their sources.
+
+    Parameters:
+    - plan: list of AggregationSpec, the aggregations to compute
+
+    Returns:
+    - list of str: the ledger columns to read
+    """
+    derived_sources = {"Date": "FECHAPEDIDO", "Year": "FECHAPEDIDO", "Month": "FECHAPEDIDO", "Day": "FECHAPEDIDO", "Hospital": "ORIGEN"}
+    columns = {"FECHAPEDIDO"}
+    for spec in plan:
+        for key in spec.keys:
+            columns.add(derived_sources.get(key, key))
+        if spec.measure is not None:
+            columns.add(derived_sources.get(spec.measure, spec.measure))
+    return sorted(columns)
@@ -0,0 +1,118 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analysis.schema import compact_ledger
+
+BENCHMARK_SIZES = (10_000, 1_000_000, 10_000_000)
+
+# Shares and pack sizes observed in consumo_material_clean.xlsx
+TIPOCOMPRA_SHARES = {"Compra menor": 0.62, "Concurso": 0.38}
+TGL_SHARES = {"ALMACENABLE": 0.736, "TRANSITO": 0.257, None: 0.007}
+PACK_SIZES = np.array([10, 5, 1, 50, 3, 300, 100, 12, 20, 25])
+PACK_SHARES = np.array([0.45, 0.22, 0.06, 0.05, 0.05, 0.05, 0.04, 0.04, 0.02, 0.02])
+PRODUCT_WORDS = np.array(["APOSITO", "SONDA", "GUANTE", "CATETER", "JERINGA", "VENDA", "AGUJA", "MASCARILLA", "EQUIPO", "FILTRO"])
+
+
+def _choice(rng, labels, shares, size):
+    shares = np.asarray(shares, dtype=float)
+    return rng.choice(len(labels), size=size, p=shares / shares.sum())
+
+
+def _categorical(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def generate_ledger(rows, seed=0, n_codigos=None, n_hospitals=20, first_year=2015, last_year=2023, compact=False):
+    """
+    Generate a synthetic ledger shaped like consumo_material_clean.xlsx, reproducibly from a seed.
+
+    Products follow a power-law popularity, each with its own pack size, price and reference;
+    "IMPORTELINEA" is the number of packs times the price, as in the real ledger. Columns are built
+    as integer codes into small tables of labels, so generating 10M rows takes seconds.
+
+    Parameters:
+    - rows: int, number of rows
+    - seed: int, seed of the generator (default is 0)
+    - n_codigos: int, number of distinct products (default grows with the number of rows, at least 48)
+    - n_hospitals: int, number of distinct hospitals (default is 20)
+    - first_year: int, year of the first order (default is 2015)
+    - last_year: int, year of the last order (default is 2023)
+    - compact: bool, whether to return the compact dtypes of schema.LEDGER_SCHEMA instead of the
+      string and int64 columns read_excel_dataset returns (default is False)
+
+    Returns:
+    - pd.DataFrame: the ledger
+    """
+    rng = np.random.default_rng(seed)
+    n_codigos = n_codigos or max(48, int(np.sqrt(rows)))
+
+    # Products: code, description, reference, pack size and price
+    codigos = np.array([f"{letter}{number:05d}" for letter, number in zip(rng.choice(list("ABCDE"), n_codigos), rng.choice(100_000, n_codigos, replace=False))])
+    productos = np.array([f"{word} {index}-{index % 50}" for index, word in enumerate(rng.choice(PRODUCT_WORDS, n_codigos))])
+    referencias = np.array([str(number) for number in rng.choice(1_000_000, n_codigos, replace=False)])
+    pack_sizes = PACK_SIZES[_choice(rng, PACK_SIZES, PACK_SHARES, n_codigos)]
+    prices = np.round(rng.lognormal(mean=3.8, sigma=1.3, size=n_codigos), 2) + 0.99
+
+    popularity = 1.0 / np.arange(1, n_codigos + 1) ** 1.1
+    product = rng.permutation(n_codigos)[_choice(rng, codigos, popularity, rows)]
+
+    # Origins: "<region>-<hospital>-<unit>", a few units per hospital
+    hospitals = [f"{region}-{number}" for region, number in zip(rng.integers(0, 2, n_hospitals), range(n_hospitals))]
+    origins = np.array([f"{hospital}-{unit}" for hospital in hospitals for unit in range(1, 11)])
+    origin = _choice(rng, origins, np.tile(1.0 / np.arange(1, 11), n_hospitals), rows)
+
+    # Order dates, formatted once per distinct day
+    days = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31", freq="D")
+    day = rng.integers(0, len(days), rows)
+    day_labels = np.asarray(days.strftime("%d/%m/%y"))
+
+    packs = np.maximum(1, np.round(rng.lognormal(mean=2.0, sigma=1.1, size=rows))).astype(np.int64)
+    quantities = packs * pack_sizes[product]
+    amounts = np.round(packs * prices[product], 2)
+    order_numbers = rng.integers(1_000, 1_600_000, rows)
+    year_suffix = np.asarray(days.strftime("%y"))[day]
+
+    tgl_labels = [label for label in TGL_SHARES if label is not None]
+    tgl = _choice(rng, list(TGL_SHARES), list(TGL_SHARES.values()), rows)
+    tgl = np.where(tgl < len(tgl_labels), tgl, -1)
+
+    ledger = pd.DataFrame({
+        "CODIGO": _categorical(product, codigos),
+        "FECHAPEDIDO": _categorical(day, day_labels),
+        "NUMERO": np.char.add(np.char.add(order_numbers.astype(str), "/"), year_suffix),
+        "REFERENCIA": _categorical(product, referencias),
+        "CANTIDADCOMPRA": quantities,
+        "UNIDADESCONSUMOCONTENIDAS": pack_sizes[product].astype(np.int64),
+        "PRECIO": prices[product],
+        "IMPORTELINEA": amounts,
+        "TIPOCOMPRA": _categorical(_choice(rng, list(TIPOCOMPRA_SHARES), list(TIPOCOMPRA_SHARES.values()), rows), list(TIPOCOMPRA_SHARES)),
+        "ORIGEN": _categorical(origin, origins),
+        "TGL": _categorical(tgl, tgl_labels),
+        "PRODUCTO": _categorical(product, productos),
+    })
+
+    if compact:
+        return compact_ledger(ledger.assign(NUMERO=ledger["NUMERO"].astype(str), REFERENCIA=ledger["REFERENCIA"].astype(str)))
+
+    # String columns, with missing values kept missing, as read from the workbook
+    return ledger.astype({col: str for col in ledger.columns if not pd.api.types.is_numeric_dtype(ledger[col])})
+
+
+def main():
+    from analysis.writers import write_dataframe
+
+    parser = argparse.ArgumentParser(description="Write a synthetic ledger shaped like consumo_material_clean.xlsx.")
+    parser.add_argument("rows", type=int, help="Number of rows")
+    parser.add_argument("output", type=str, help="Output file (.xlsx, .csv or .parquet; xlsx sheets hold at most 1048575 rows)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generator (default is 0)")
+
+    args = parser.parse_args()
+
+    seconds = write_dataframe(generate_ledger(args.rows, seed=args.seed), args.output)
+    print(f"Wrote {args.rows} synthetic rows to {args.output} in {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,11 +22,12 @@ def count_last_digits(dataframe):
     return result_df
 
 # Example usage:
-data = {'CODIGO': ['A', 'B', 'A', 'B', 'A'],
-        'FECHAPEDIDO': ['01/01/22', '01/02/23', '01/03/23', '01/01/23', '01/02/23']}
-df = pd.DataFrame(data)
+if __name__ == "__main__":
+    data = {'CODIGO': ['A', 'B', 'A', 'B', 'A'],
+            'FECHAPEDIDO': ['01/01/22', '01/02/23', '01/03/23', '01/01/23', '01/02/23']}
+    df = pd.DataFrame(data)
 
-result_df = count_last_digits(df)
+    result_df = count_last_digits(df)
 
-print("Count of last two digits of 'FECHAPEDIDO' for each 'CODIGO' value:")
-print(result_df)
+    print("Count of last two digits of 'FECHAPEDIDO' for each 'CODIGO' value:")
+    print(result_df)
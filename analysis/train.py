@@ -1,41 +1,51 @@
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
-from keras.models import Sequential
-from keras.layers import LSTM, Dense
-
-# Load the Excel dataset
-df = pd.read_excel('excels/train.xlsx')  # Update with your actual file path
-
-# Convert "CODIGO" to categorical using LabelEncoder
-label_encoder = LabelEncoder()
-df['CODIGO'] = label_encoder.fit_transform(df['CODIGO'])
-
-# Prepare sequences for LSTM
-sequence_length = 10  # Adjust as needed
-X, y = [], []
-for i in range(len(df) - sequence_length):
-    X.append(df.iloc[i:i+sequence_length]['CODIGO'].values)
-    y.append(df.iloc[i+sequence_length]['CANTIDADCOMPRA'])
-
-X = pd.DataFrame(X)  # Convert to DataFrame
-y = pd.Series(y)
-
-# Reshape X to (samples, time steps, features)
-X = X.values.reshape(X.shape[0], sequence_length, 1)
-
-# Define the model
-model = Sequential()
-model.add(LSTM(50, input_shape=(sequence_length, 1)))
-model.add(Dense(1))  # Assuming regression, change activation for classification
-model.compile(loss='mean_squared_error', optimizer='adam')  # Adjust loss for your task
-
-# Train the model
-history = model.fit(X, y, epochs=150, batch_size=32, validation_split=0.2)
-
-# Print the loss on the training set
-train_loss = history.history['loss'][-1]
-print(f'Training Loss: {train_loss}')
-
-# Print the loss on the validation set (test set in this case)
-val_loss = history.history['val_loss'][-1]
-print(f'Validation Loss: {val_loss}')
+from analysis.training_data import prepare_training_data, training_batches
+
+
+def train(file_path='excels/train.xlsx', sequence_length=10, batch_size=32, validation_split=0.2, epochs=150):
+    """
+    Train the LSTM predicting "CANTIDADCOMPRA" from windows of label encoded "CODIGO" values.
+
+    Parameters:
+    - file_path: str, path to the Excel training ledger (default is 'excels/train.xlsx')
+    - sequence_length: int, number of time steps per window (default is 10)
+    - batch_size: int, number of windows per batch (default is 32)
+    - validation_split: float, share of the last windows kept for validation (default is 0.2)
+    - epochs: int, number of training epochs (default is 150)
+
+    Returns:
+    - tuple: the trained model and its training history
+    """
+    # Keras (and its backend) takes seconds to import, so it is only loaded to train
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense
+
+    # Convert the Excel dataset once to memory-mapped arrays, "CODIGO" label encoded
+    data_dir = prepare_training_data(file_path, ['CODIGO'], 'CANTIDADCOMPRA')  # Update with your actual file path
+
+    # Stream shuffled windows of (samples, time steps, features) and the quantity right after each
+    # window, loaded on background threads; the last 20% of the windows are kept for validation
+    train_batches, train_steps, val_batches, val_steps = training_batches(data_dir, sequence_length, batch_size=batch_size, validation_split=validation_split)
+
+    # Define the model
+    model = Sequential()
+    model.add(LSTM(50, input_shape=(sequence_length, 1)))
+    model.add(Dense(1))  # Assuming regression, change activation for classification
+    model.compile(loss='mean_squared_error', optimizer='adam')  # Adjust loss for your task
+
+    # Train the model
+    history = model.fit(train_batches, steps_per_epoch=train_steps, validation_data=val_batches, validation_steps=val_steps, epochs=epochs)
+
+    # Print the loss on the training set
+    train_loss = history.history['loss'][-1]
+    print(f'Training Loss: {train_loss}')
+
+    # Print the loss on the validation set (test set in this case)
+    if val_batches is not None:
+        val_loss = history.history['val_loss'][-1]
+        print(f'Validation Loss: {val_loss}')
+
+    return model, history
+
+
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import analysis.cache as cache
+from analysis.streaming import DEFAULT_CHUNK_SIZE, iter_ledger_chunks
+from analysis.windowing import iter_batch_starts, sliding_windows, window_starts
+from analysis.writers import write_atomically
+
+META_FILE_NAME = "meta.json"
+FEATURES_FILE_NAME = "features.f32"
+TARGETS_FILE_NAME = "targets.f32"
+
+DEFAULT_PREFETCH_WORKERS = 2
+DEFAULT_PREFETCH_BATCHES = 8
+
+
+def default_training_dir(file_path, sheet_name='Sheet1'):
+    """
+    Return the default directory of the memory-mapped training arrays of a workbook sheet.
+
+    The directory sits next to the columnar cache and shares its key, so a changed workbook gets
+    new arrays.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - sheet_name: str, name of the sheet (default is 'Sheet1')
+
+    Returns:
+    - str: path to the training data directory
+    """
+    return os.path.splitext(cache.cache_path(file_path, sheet_name))[0] + ".training"
+
+
+def _encode_labels(values, vocabulary):
+    # Codes in order of first appearance, remapped to sorted order once every chunk has been seen
+    codes, uniques = pd.factorize(values)
+    mapping = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in uniques] + [np.nan], dtype=np.float32)
+    return mapping[codes]
+
+
+def _sort_labels(features, position, vocabulary, chunk_size):
+    classes = sorted(vocabulary)
+    rank = np.empty(len(classes), dtype=np.float32)
+    rank[[vocabulary[value] for value in classes]] = np.arange(len(classes), dtype=np.float32)
+
+    for start in range(0, len(features), chunk_size):
+        column = features[start:start + chunk_size, position]
+        known = ~np.isnan(column)
+        column[known] = rank[column[known].astype(np.intp)]
+        features[start:start + chunk_size, position] = column
+    return classes
+
+
+def convert_training_ledger(file_path, feature_columns=("CODIGO",), target_column="CANTIDADCOMPRA", sheet_name='Sheet1', data_dir=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Convert a training ledger to memory-mapped float32 arrays, reading it in bounded chunks.
+
+    Non-numeric feature columns are label encoded like sklearn's LabelEncoder (codes follow the
+    sorted classes, which are kept in the metadata); missing values become NaN. The metadata file
+    is written last, so an interrupted conversion is never mistaken for a complete one.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - feature_columns: list of str, the columns fed to the model at every step (default is ("CODIGO",))
+    - target_column: str, the column to predict (default is "CANTIDADCOMPRA")
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - data_dir: str, directory of the arrays (default is default_training_dir)
+    - chunk_size: int, maximum number of rows held in memory at once
+
+    Returns:
+    - dict: the metadata of the arrays
+    """
+    feature_columns = list(feature_columns)
+    data_dir = data_dir or default_training_dir(file_path, sheet_name)
+    os.makedirs(data_dir, exist_ok=True)
+
+    meta_path = os.path.join(data_dir, META_FILE_NAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    features_path = os.path.join(data_dir, FEATURES_FILE_NAME)
+    targets_path = os.path.join(data_dir, TARGETS_FILE_NAME)
+    tmp_features_path = f"{features_path}.{os.getpid()}.tmp"
+    tmp_targets_path = f"{targets_path}.{os.getpid()}.tmp"
+
+    columns = list(dict.fromkeys([*feature_columns, target_column]))
+    vocabularies = {}
+    rows = 0
+    try:
+        with open(tmp_features_path, "wb") as features_file, open(tmp_targets_path, "wb") as targets_file:
+            for chunk in iter_ledger_chunks(file_path, sheet_name, chunk_size, columns):
+                if not rows:
+                    vocabularies = {col: {} for col in feature_columns if not pd.api.types.is_numeric_dtype(chunk[col])}
+
+                block = np.empty((len(chunk), len(feature_columns)), dtype=np.float32)
+                for position, col in enumerate(feature_columns):
+                    if col in vocabularies:
+                        block[:, position] = _encode_labels(chunk[col], vocabularies[col])
+                    else:
+                        block[:, position] = chunk[col].to_numpy(dtype=np.float32, na_value=np.nan)
+
+                block.tofile(features_file)
+                chunk[target_column].to_numpy(dtype=np.float32, na_value=np.nan).tofile(targets_file)
+                rows += len(chunk)
+
+        if not rows:
+            raise ValueError("The training ledger has no rows.")
+
+        classes = {}
+        if vocabularies:
+            features = np.memmap(tmp_features_path, dtype=np.float32, mode="r+", shape=(rows, len(feature_columns)))
+            for position, col in enumerate(feature_columns):
+                if col in vocabularies:
+                    classes[col] = [str(value) for value in _sort_labels(features, position, vocabularies[col], chunk_size)]
+            features.flush()
+            del features
+
+        os.replace(tmp_features_path, features_path)
+        os.replace(tmp_targets_path, targets_path)
+    finally:
+        for path in (tmp_features_path, tmp_targets_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    meta = {
+        "rows": rows,
+        "feature_columns": feature_columns,
+        "target_column": target_column,
+        "classes": classes,
+    }
+
+    def write_meta(path):
+        with open(path, "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+    write_atomically(meta_path, write_meta)
+    return meta
+
+
+def prepare_training_data(file_path, feature_columns=("CODIGO",), target_column="CANTIDADCOMPRA", sheet_name='Sheet1', data_dir=None, chunk_size=DEFAULT_CHUNK_SIZE, rebuild=False):
+    """
+    Return the directory of the memory-mapped training arrays of a ledger, converting it first when needed.
+
+    Parameters:
+    - file_path: str, path to the Excel file
+    - feature_columns: list of str, the columns fed to the model at every step (default is ("CODIGO",))
+    - target_column: str, the column to predict (default is "CANTIDADCOMPRA")
+    - sheet_name: str, name of the sheet to read (default is 'Sheet1')
+    - data_dir: str, directory of the arrays (default is default_training_dir)
+    - chunk_size: int, maximum number of rows held in memory during the conversion
+    - rebuild: bool, whether to convert the ledger even if up-to-date arrays exist (default is False)
+
+    Returns:
+    - str: the training data directory
+    """
+    data_dir = data_dir or default_training_dir(file_path, sheet_name)
+    meta_path = os.path.join(data_dir, META_FILE_NAME)
+
+    if not rebuild and os.path.exists(meta_path):
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        if meta["feature_columns"] == list(feature_columns) and meta["target_column"] == target_column:
+            return data_dir
+
+    convert_training_ledger(file_path, feature_columns, target_column, sheet_name, data_dir, chunk_size)
+    return data_dir
+
+
+def load_training_arrays(data_dir):
+    """
+    Open the training arrays of a directory as read-only memory maps.
+
+    Parameters:
+    - data_dir: str, the training data directory
+
+    Returns:
+    - np.memmap: the features, shape (rows, features)
+    - np.memmap: the targets, shape (rows,)
+    - dict: the metadata of the arrays
+    """
+    meta_path = os.path.join(data_dir, META_FILE_NAME)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"No training data in '{data_dir}', run prepare_training_data first.")
+
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+
+    shape = (meta["rows"], len(meta["feature_columns"]))
+    features = np.memmap(os.path.join(data_dir, FEATURES_FILE_NAME), dtype=np.float32, mode="r", shape=shape)
+    targets = np.memmap(os.path.join(data_dir, TARGETS_FILE_NAME), dtype=np.float32, mode="r", shape=shape[:1])
+    return features, targets, meta
+
+
+def iter_prefetched(batches, load_batch, workers=DEFAULT_PREFETCH_WORKERS, buffer_size=DEFAULT_PREFETCH_BATCHES):
+    """
+    Load batches on background threads, keeping up to buffer_size of them in flight, and yield them in order.
+
+    Parameters:
+    - batches: iterable, the batch descriptions (e.g. window start positions)
+    - load_batch: callable, turns one batch description into the batch to yield
+    - workers: int, number of loader threads (default is 2)
+    - buffer_size: int, number of batches loaded ahead of the consumer (default is 8)
+
+    Yields:
+    - the loaded batches, in the order of batches
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(load_batch, batch))
+            if len(pending) >= max(1, buffer_size):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def training_batches(data_dir, sequence_length, batch_size=32, validation_split=0.2, shuffle=True, rng=None, workers=DEFAULT_PREFETCH_WORKERS, buffer_size=DEFAULT_PREFETCH_BATCHES):
+    """
+    Build endless mini-batch generators over the memory-mapped training arrays, for Keras' fit.
+
+    As with fit's validation_split, the last windows are held out for validation; only the training
+    windows are shuffled, at every epoch. Only the batches being loaded are read into memory.
+
+    Parameters:
+    - data_dir: str, the training data directory
+    - sequence_length: int, number of rows per window
+    - batch_size: int, number of windows per batch (default is 32)
+    - validation_split: float, fraction of the windows held out for validation (default is 0.2)
+    - shuffle: bool, whether to shuffle the training windows at every epoch (default is True)
+    - rng: int, np.random.Generator or None, seed or generator of the shuffling
+    - workers: int, number of loader threads per generator (default is 2)
+    - buffer_size: int, number of batches loaded ahead of the model (default is 8)
+
+    Returns:
+    - tuple: training generator, training steps per epoch, validation generator (or None) and validation steps
+    """
+    features, targets, _ = load_training_arrays(data_dir)
+    windows = sliding_windows(features, sequence_length)
+    starts = window_starts(len(features), sequence_length)
+
+    def load_batch(batch):
+        return np.asarray(windows[batch]), np.asarray(targets[batch + sequence_length])
+
+    n_validation = int(len(starts) * validation_split)
+    train_starts, validation_starts = starts[:len(starts) - n_validation], starts[len(starts) - n_validation:]
+
+    train = iter_prefetched(iter_batch_starts(train_starts, batch_size, shuffle, rng, repeat=True), load_batch, workers, buffer_size)
+    train_steps = -(-len(train_starts) // batch_size)
+    if not n_validation:
+        return train, train_steps, None, 0
+
+    validation = iter_prefetched(iter_batch_starts(validation_starts, batch_size, repeat=True), load_batch, workers, buffer_size)
+    return train, train_steps, validation, -(-n_validation // batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a training ledger to memory-mapped arrays.")
+    parser.add_argument("file_path", type=str, help="Path to the Excel file")
+    parser.add_argument("--sheet_name", type=str, default="Sheet1", help="Name of the sheet to read (default is 'Sheet1')")
+    parser.add_argument("--features", nargs="+", default=["CODIGO"], help="Feature columns (default is CODIGO)")
+    parser.add_argument("--target", type=str, default="CANTIDADCOMPRA", help="Target column (default is CANTIDADCOMPRA)")
+    parser.add_argument("--data_dir", type=str, default=None, help="Directory of the arrays (default is next to the columnar cache)")
+    parser.add_argument("--rebuild", action="store_true", help="Convert the ledger even if up-to-date arrays exist")
+
+    args = parser.parse_args()
+
+    data_dir = prepare_training_data(args.file_path, args.features, args.target, args.sheet_name, args.data_dir, rebuild=args.rebuild)
+    features, targets, meta = load_training_arrays(data_dir)
+    print(f"Training data in {data_dir}: features {features.shape}, targets {targets.shape}, classes {({col: len(values) for col, values in meta['classes'].items()})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(values, sequence_length):
+    """
+    Return every window of consecutive rows as a zero-copy view.
+
+    Parameters:
+    - values: np.ndarray, shape (rows,) or (rows, features)
+    - sequence_length: int, number of rows per window
+
+    Returns:
+    - np.ndarray: read-only view of shape (rows - sequence_length + 1, sequence_length[, features])
+    """
+    if sequence_length < 1:
+        raise ValueError("sequence_length must be at least 1.")
+    if len(values) < sequence_length:
+        raise ValueError(f"At least {sequence_length} rows are needed to build a window.")
+
+    windows = sliding_window_view(values, sequence_length, axis=0)
+    if windows.ndim == 3:
+        # (windows, features, steps) -> (windows, steps, features), still a view
+        windows = np.moveaxis(windows, 2, 1)
+    return windows
+
+
+def window_starts(n_rows, sequence_length, groups=None):
+    """
+    Return the first row of every window that has a target row, the row right after the window.
+
+    Parameters:
+    - n_rows: int, number of rows
+    - sequence_length: int, number of rows per window
+    - groups: np.ndarray, optional group label of each row with the rows of a group contiguous;
+      windows whose rows or target cross a group boundary are left out
+
+    Returns:
+    - np.ndarray: start positions of the windows
+    """
+    if n_rows <= sequence_length:
+        return np.empty(0, dtype=np.intp)
+    if groups is None:
+        return np.arange(n_rows - sequence_length)
+
+    # Rows of a group are contiguous, so a window stays within its group when its first row
+    # and its target row have the same label
+    groups = np.asarray(groups)
+    return np.flatnonzero(groups[:-sequence_length] == groups[sequence_length:])
+
+
+def prepare_arrays(dataframe, feature_columns, target_column, group_column=None):
+    """
+    Extract the feature, target and group arrays of a ledger, with the rows of each group contiguous.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger in time order
+    - feature_columns: list of str, the columns fed to the model at every step
+    - target_column: str, the column to predict
+    - group_column: str, optional column (e.g. "CODIGO" or "Hospital") whose groups get separate windows
+
+    Returns:
+    - tuple: features (rows, features), targets (rows,) and groups (rows,) or None
+    """
+    missing = [col for col in [*feature_columns, target_column, group_column] if col is not None and col not in dataframe.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in the DataFrame.")
+
+    groups = None
+    if group_column is not None:
+        # A stable sort keeps the time order of the rows inside each group
+        dataframe = dataframe.sort_values(group_column, kind="stable")
+        groups = dataframe[group_column].to_numpy()
+    return dataframe[feature_columns].to_numpy(), dataframe[target_column].to_numpy(), groups
+
+
+def build_sequences(dataframe, feature_columns, target_column, sequence_length, group_column=None):
+    """
+    Build the (window, next target) training pairs of a sequence model.
+
+    Without groups the windows are a zero-copy view of the feature array; with groups, the windows
+    that stay inside one group are gathered into a new array (use iter_window_batches to avoid that).
+
+    Parameters:
+    - dataframe: pd.DataFrame, the ledger in time order
+    - feature_columns: list of str, the columns fed to the model at every step
+    - target_column: str, the column to predict
+    - sequence_length: int, number of rows per window
+    - group_column: str, optional column whose groups get separate windows
+
+    Returns:
+    - tuple: X of shape (samples, sequence_length, features) and y of shape (samples,)
+    """
+    features, targets, groups = prepare_arrays(dataframe, feature_columns, target_column, group_column)
+    windows = sliding_windows(features, sequence_length)
+
+    if groups is None:
+        return windows[:-1], targets[sequence_length:]
+
+    starts = window_starts(len(features), sequence_length, groups)
+    return windows[starts], targets[starts + sequence_length]
+
+
+def iter_batch_starts(starts, batch_size=32, shuffle=False, rng=None, repeat=False):
+    """
+    Split window start positions into mini-batches.
+
+    Parameters:
+    - starts: np.ndarray, start positions of the windows (see window_starts)
+    - batch_size: int, number of windows per batch (default is 32)
+    - shuffle: bool, whether to shuffle the windows at every pass (default is False)
+    - rng: int, np.random.Generator or None, seed or generator of the shuffling
+    - repeat: bool, whether to loop over the windows forever, as Keras expects from generators (default is False)
+
+    Yields:
+    - np.ndarray: the start positions of one batch
+    """
+    if len(starts) == 0:
+        raise ValueError("No window fits in the data.")
+    rng = np.random.default_rng(rng)
+
+    while True:
+        order = rng.permutation(starts) if shuffle else starts
+        for first in range(0, len(order), batch_size):
+            yield order[first:first + batch_size]
+        if not repeat:
+            return
+
+
+def iter_window_batches(features, targets, sequence_length, batch_size=32, groups=None, shuffle=False, rng=None, repeat=False):
+    """
+    Yield mini-batches of windows, gathering only one batch of windows at a time.
+
+    Parameters:
+    - features: np.ndarray, shape (rows, features)
+    - targets: np.ndarray, shape (rows,)
+    - sequence_length: int, number of rows per window
+    - batch_size: int, number of windows per batch (default is 32)
+    - groups: np.ndarray, optional group label of each row with the rows of a group contiguous
+    - shuffle: bool, whether to shuffle the windows at every pass (default is False)
+    - rng: int, np.random.Generator or None, seed or generator of the shuffling
+    - repeat: bool, whether to loop over the data forever, as Keras expects from generators (default is False)
+
+    Yields:
+    - tuple: X batch of shape (batch, sequence_length, features) and y batch of shape (batch,)
+    """
+    windows = sliding_windows(features, sequence_length)
+    starts = window_starts(len(features), sequence_length, groups)
+    for batch in iter_batch_starts(starts, batch_size, shuffle, rng, repeat):
+        yield windows[batch], targets[batch + sequence_length]
+
+
+def steps_per_epoch(n_rows, sequence_length, batch_size=32, groups=None):
+    """
+    Number of batches iter_window_batches yields per pass over the data.
+
+    Parameters:
+    - n_rows: int, number of rows
+    - sequence_length: int, number of rows per window
+    - batch_size: int, number of windows per batch (default is 32)
+    - groups: np.ndarray, optional group label of each row
+
+    Returns:
+    - int: number of batches per epoch
+    """
+    n_windows = len(window_starts(n_rows, sequence_length, groups))
+    return -(-n_windows // batch_size)
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+FORMATS = ("xlsx", "csv", "parquet", "json")
+DEFAULT_WRITE_WORKERS = 4
+
+# Rows converted to Python objects at once by the streaming xlsx writer
+XLSX_BLOCK_ROWS = 10_000
+
+
+def write_atomically(path, write):
+    """
+    Write a file under a temporary name in the same directory and move it into place once complete,
+    so readers never see a partially written file.
+
+    Parameters:
+    - path: str, final path of the file
+    - write: callable, receives the temporary path and writes the file there
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    stem, extension = os.path.splitext(name)
+    # Keep the extension, some writers pick their engine from it
+    tmp_path = os.path.join(directory, f".{stem}.{os.getpid()}.{threading.get_ident()}.tmp{extension}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_xlsx(dataframe, path):
+    try:
+        import xlsxwriter
+    except ImportError:
+        dataframe.to_excel(path, index=False, engine="openpyxl")
+        return
+
+    # Constant-memory mode flushes every row as soon as the next one starts, so rows must be
+    # written strictly in order (pandas' to_excel does not, and its cells would be dropped)
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    try:
+        worksheet = workbook.add_worksheet("Sheet1")
+        header = workbook.add_format({"bold": True})
+        worksheet.write_row(0, 0, [str(col) for col in dataframe.columns], header)
+
+        for start in range(0, len(dataframe), XLSX_BLOCK_ROWS):
+            block = dataframe.iloc[start:start + XLSX_BLOCK_ROWS].astype(object)
+            block = block.where(block.notna(), None)
+            for offset, row in enumerate(block.itertuples(index=False, name=None)):
+                worksheet.write_row(start + offset + 1, 0, row)
+    finally:
+        workbook.close()
+
+
+def _write_csv(dataframe, path):
+    dataframe.to_csv(path, index=False)
+
+
+def _write_parquet(dataframe, path):
+    dataframe.to_parquet(path, index=False)
+
+
+def _column_values(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.strftime("%Y-%m-%d")
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def to_columnar_json(dataframe):
+    """
+    Serialize a DataFrame as compact columnar JSON: the headers once and one array per column.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the DataFrame to serialize
+
+    Returns:
+    - str: the JSON document
+    """
+    document = {
+        "headers": [str(col) for col in dataframe.columns],
+        "rows": len(dataframe),
+        "columns": [_column_values(dataframe[col]) for col in dataframe.columns],
+    }
+    return json.dumps(document, separators=(",", ":"), allow_nan=False)
+
+
+def _write_json(dataframe, path):
+    with open(path, "w", encoding="utf-8") as json_file:
+        json_file.write(to_columnar_json(dataframe))
+
+
+WRITERS = {
+    "xlsx": _write_xlsx,
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+    "json": _write_json,
+}
+
+
+def write_dataframe(dataframe, path, file_format=None):
+    """
+    Write a DataFrame atomically in one of the supported formats.
+
+    Parameters:
+    - dataframe: pd.DataFrame, the DataFrame to write
+    - path: str, path of the output file
+    - file_format: str, one of "xlsx", "csv", "parquet" or "json" (default is taken from the extension)
+
+    Returns:
+    - float: seconds spent writing the file
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in WRITERS:
+        raise ValueError(f"Unsupported output format '{file_format}', expected one of {FORMATS}.")
+
+    start = time.perf_counter()
+    write_atomically(path, lambda tmp_path: WRITERS[file_format](dataframe, tmp_path))
+    return time.perf_counter() - start
+
+
+def write_outputs(dataframes, output_dir, formats=("xlsx",), workers=DEFAULT_WRITE_WORKERS):
+    """
+    Write several DataFrames in one or more formats, concurrently on a thread pool.
+
+    Parameters:
+    - dataframes: dict, maps each output name (file name without extension) to its DataFrame
+    - output_dir: str, directory where the files are written
+    - formats: iterable of str, formats to write every DataFrame in (default is ("xlsx",))
+    - workers: int, number of writer threads (default is 4)
+
+    Returns:
+    - dict: maps each written path to the seconds spent writing it
+    """
+    unknown = [file_format for file_format in formats if file_format not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unsupported output formats {unknown}, expected some of {FORMATS}.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = {
+        os.path.join(output_dir, f"{name}.{file_format}"): (dataframe, file_format)
+        for name, dataframe in dataframes.items()
+        for file_format in formats
+    }
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+        futures = {path: executor.submit(write_dataframe, dataframe, path, file_format) for path, (dataframe, file_format) in jobs.items()}
+        timings = {path: future.result() for path, future in futures.items()}
+
+    for path, elapsed in timings.items():
+        print(f"Wrote {len(jobs[path][0])} rows to {path} in {elapsed:.3f}s")
+    return timings
@@ -1,12 +1,15 @@
 // src/DataLoader.js
-import React, { useRef, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import Select from 'react-select';
 import * as XLSX from 'xlsx';
 
+// Base URL of the query service (python -m analysis.server), e.g. http://127.0.0.1:8080
+const queryApi = process.env.REACT_APP_QUERY_API;
+
 const DataLoader = ({ onDataLoad }) => {
   const fileInputRef = useRef(null);
 
-  const fileOptions = [
+  const defaultFileOptions = [
     { value: 'codigo_origen_df.xlsx', label: 'Code - Origin' },
     { value: 'hospital_year_purchases.xlsx', label: 'Hospital year - Purchases' },
     { value: 'year_money.xlsx', label: 'Year - Money' },
@@ -17,14 +20,67 @@ const DataLoader = ({ onDataLoad }) => {
     // Add more files as needed
   ];
 
+  const [fileOptions, setFileOptions] = useState(defaultFileOptions);
   const [selectedFile, setSelectedFile] = useState(null);
 
+  useEffect(() => {
+    if (queryApi) {
+      // Live queries on the ledger kept in memory by the query service
+      fetch(`${queryApi}/api/queries`)
+        .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+        .then((catalog) => {
+          setFileOptions(catalog.queries.map((query) => ({
+            value: query.name,
+            url: `${queryApi}/api/query/${query.name}`,
+            label: query.label,
+          })));
+        })
+        .catch(() => setFileOptions(defaultFileOptions));
+      return;
+    }
+
+    // Prefer the datasets listed in the manifest published by the analysis pipeline
+    fetch('/datasets/manifest.json')
+      .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+      .then((manifest) => {
+        setFileOptions(manifest.datasets.map((dataset) => ({
+          value: dataset.files.xlsx ? dataset.files.xlsx.path : dataset.files.json.path,
+          json: dataset.files.json ? dataset.files.json.path : null,
+          label: dataset.label,
+        })));
+      })
+      .catch(() => setFileOptions(defaultFileOptions));
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
+  const loadJson = (url) => {
+    // Columnar JSON: headers once and one array per column, turned into rows for the plot
+    fetch(url)
+      .then((response) => response.json())
+      .then((dataset) => {
+        const rows = Array.from({ length: dataset.rows }, (_, rowIndex) =>
+          dataset.columns.map((column) => column[rowIndex])
+        );
+        onDataLoad(rows, dataset.headers);
+      });
+  };
+
   const loadFile = () => {
     if (!selectedFile) {
       alert('Please select a file');
       return;
     }
 
+    if (selectedFile.url) {
+      loadJson(selectedFile.url);
+      return;
+    }
+
+    if (selectedFile.json) {
+      loadJson(`/datasets/${selectedFile.json}`);
+      return;
+    }
+
     const reader = new FileReader();
 
     reader.onload = (event) => {
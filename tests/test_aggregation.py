@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from analysis.aggregation import AggregationSpec, compute_partials, finalize_partials, merge_partials, plan_inputs, run_aggregation_plan
+
+
+def _ledger_with_null_keys():
+    return pd.DataFrame({"Year": [22, 22, 23, 23, None], "T": ["a", None, "b", "a", "a"], "v": [1, 2, 3, 4, 5]})
+
+
+PLAN = [
+    AggregationSpec("by_year_t", ["Year", "T"], None, "count", "Count"),
+    AggregationSpec("by_year", ["Year"], "v", "sum", "Total"),
+    AggregationSpec("by_t", ["T"], "v", "mean", "Mean"),
+]
+
+
+def test_rolled_up_groupings_keep_rows_missing_other_keys():
+    df = _ledger_with_null_keys()
+    results = run_aggregation_plan(df, PLAN)
+
+    expected_year = df.groupby("Year")["v"].sum()
+    assert results["by_year"]["Year"].tolist() == expected_year.index.tolist()
+    assert results["by_year"]["Total"].tolist() == expected_year.tolist()
+
+    expected_t = df.groupby("T")["v"].mean()
+    assert results["by_t"]["T"].tolist() == expected_t.index.tolist()
+    np.testing.assert_allclose(results["by_t"]["Mean"], expected_t)
+
+
+def test_results_leave_out_rows_missing_their_own_keys():
+    results = run_aggregation_plan(_ledger_with_null_keys(), PLAN)
+
+    assert results["by_year_t"][["Year", "T"]].notna().all().all()
+    assert results["by_year_t"]["Count"].tolist() == [1, 1, 1]
+
+
+def test_merged_partials_keep_rows_missing_keys():
+    df = _ledger_with_null_keys()
+    partials = merge_partials(compute_partials(df.iloc[:2], PLAN), compute_partials(df.iloc[2:], PLAN))
+    results = finalize_partials(partials, PLAN)
+
+    assert results["by_year"]["Total"].tolist() == [3, 7]
+
+
+def test_integer_min_and_max_of_groups_without_values():
+    df = pd.DataFrame({"k": ["a", "a", "b"], "v": pd.array([1, 2, None], dtype="Int64")})
+    plan = [AggregationSpec("low", ["k"], "v", "min", "Low"), AggregationSpec("high", ["k"], "v", "max", "High")]
+    results = run_aggregation_plan(df, plan)
+
+    expected = df.groupby("k")["v"].agg(["min", "max"])
+    pd.testing.assert_series_equal(results["low"]["Low"], expected["min"].reset_index(drop=True), check_names=False)
+    pd.testing.assert_series_equal(results["high"]["High"], expected["max"].reset_index(drop=True), check_names=False)
+
+
+def test_integer_min_without_missing_values_stays_int64():
+    df = pd.DataFrame({"k": ["a", "a", "b"], "v": [1, 2, 3]})
+    result = run_aggregation_plan(df, [AggregationSpec("low", ["k"], "v", "min", "Low")])["low"]
+
+    assert result["Low"].dtype == np.int64
+    assert result["Low"].tolist() == [1, 3]
+
+
+def test_plan_inputs_lists_keys_and_measures_once():
+    assert plan_inputs(PLAN) == ["Year", "T", "v"]
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from analysis.anomalies import detect_anomalies
+from analysis.forecasting import monthly_series
+
+
+def _ledger():
+    # Two products bought every month of 2021-2022 by one hospital, with a spike of B in 06/22
+    months = pd.period_range("2021-01", "2022-12", freq="M")
+    rows = []
+    for month in months:
+        for codigo, amount in (("A", 100.0), ("B", 50.0 + month.month)):
+            if codigo == "B" and month == pd.Period("2022-06", freq="M"):
+                amount = 5000.0
+            rows.append({"CODIGO": codigo, "ORIGEN": "1-2-60", "FECHAPEDIDO": month.to_timestamp().strftime("%d/%m/%y"), "IMPORTELINEA": amount})
+    return pd.DataFrame(rows)
+
+
+def test_monthly_series_accepts_a_single_column_list():
+    ledger = _ledger()
+    matrix, labels, months = monthly_series(ledger, ["CODIGO"], "IMPORTELINEA")
+    expected_matrix, expected_labels, expected_months = monthly_series(ledger, "CODIGO", "IMPORTELINEA")
+
+    assert labels.name == "CODIGO"
+    assert labels.tolist() == expected_labels.tolist() == ["A", "B"]
+    assert months.equals(expected_months)
+    np.testing.assert_array_equal(matrix, expected_matrix)
+
+
+def test_detect_anomalies_by_a_single_column():
+    anomalies = detect_anomalies(_ledger(), ["CODIGO"])
+
+    assert anomalies.columns.tolist() == ["CODIGO", "Year", "Month", "Value", "Expected", "Score", "SeasonalScore"]
+    assert anomalies[["CODIGO", "Year", "Month"]].values.tolist() == [["B", 22, 6]]
+
+
+def test_detect_anomalies_by_hospital_and_product():
+    anomalies = detect_anomalies(_ledger())
+
+    assert anomalies[["Hospital", "CODIGO", "Year", "Month"]].values.tolist() == [["1-2", "B", 22, 6]]
@@ -0,0 +1,89 @@
+import glob
+import os
+
+import pandas as pd
+
+import analysis.cache as cache
+import analysis.data_treatment as dt
+
+
+def _write_ledger(path, rows=5, codigo="A"):
+    ledger = pd.DataFrame({
+        "CODIGO": [f"{codigo}{i}" for i in range(rows)],
+        "FECHAPEDIDO": ["01/02/22"] * rows,
+        "CANTIDADCOMPRA": list(range(1, rows + 1)),
+        "IMPORTELINEA": [1.5 * i for i in range(rows)],
+    })
+    ledger.to_excel(path, index=False)
+    return ledger
+
+
+def _cache_files(directory):
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, cache.DEFAULT_CACHE_DIR_NAME, "*.parquet")))
+
+
+def test_cached_read_equals_the_direct_read(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    _write_ledger(path)
+
+    first = dt.read_excel_dataset(path)
+    assert os.path.exists(cache.cache_path(path))
+    second = dt.read_excel_dataset(path)
+
+    direct = pd.read_excel(path)
+    pd.testing.assert_frame_equal(first, direct)
+    pd.testing.assert_frame_equal(second, direct)
+    assert second.attrs["source_key"] == cache.cache_key(path)
+
+
+def test_newer_workbook_invalidates_the_cache(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    _write_ledger(path, codigo="A")
+    key = cache.cache_key(path)
+    dt.read_excel_dataset(path)
+
+    _write_ledger(path, codigo="B")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert cache.cache_key(path) != key
+    assert dt.read_excel_dataset(path)["CODIGO"].tolist()[0] == "B0"
+    # The stale version of the sheet was replaced
+    assert len(_cache_files(tmp_path)) == 1
+
+
+def test_invalidate_cache_only_removes_its_own_workbook(tmp_path):
+    path = str(tmp_path / "data.xlsx")
+    other = str(tmp_path / "data-2023.xlsx")
+    _write_ledger(path)
+    _write_ledger(other)
+    dt.read_excel_dataset(path)
+    dt.read_excel_dataset(other)
+
+    assert cache.invalidate_cache(path) == 1
+    assert not os.path.exists(cache.cache_path(path))
+    assert os.path.exists(cache.cache_path(other))
+
+
+def test_unstorable_sheet_is_read_from_the_workbook(tmp_path):
+    path = str(tmp_path / "mixed.xlsx")
+    pd.DataFrame({"CODIGO": ["A1", 2, "B3"], "CANTIDADCOMPRA": [1, 2, 3]}).to_excel(path, index=False)
+
+    df = dt.read_excel_dataset(path)
+
+    pd.testing.assert_frame_equal(df, pd.read_excel(path))
+    assert _cache_files(tmp_path) == []
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    _write_ledger(path)
+    dt.read_excel_dataset(path)
+    with open(cache.cache_path(path), "wb") as cache_file:
+        cache_file.write(b"not parquet")
+
+    pd.testing.assert_frame_equal(dt.read_excel_dataset(path), pd.read_excel(path))
+
+
+def test_missing_workbook_returns_none(tmp_path):
+    assert dt.read_excel_dataset(str(tmp_path / "missing.xlsx")) is None
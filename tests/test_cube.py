@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis.cube as cube
+import analysis.data_treatment as dt
+
+
+def _ledger():
+    # Rows missing a date, a hospital, a purchase type, a TGL or an amount
+    return pd.DataFrame({
+        "CODIGO": ["A", "B", "A", "C", "B", "A", "C", "D", "B", "A"],
+        "ORIGEN": ["1-2-60", "1-2-60", "3-4-10", None, "1-2-60", "5-6-70", "3-4-10", "5-6-70", "3-4-10", "1-2-60"],
+        "FECHAPEDIDO": ["01/02/22", "15/02/22", "03/03/22", "20/11/23", None, "09/09/23", "28/02/22", "01/01/24", "05/03/22", "06/11/23"],
+        "TIPOCOMPRA": ["Compra", "Contrato", "Compra", "Compra", "Contrato", None, "Compra", "Contrato", "Compra", "Compra"],
+        "TGL": ["T1", "T2", None, "T1", "T1", "T2", "T2", "T1", "T1", "T2"],
+        "CANTIDADCOMPRA": [1, 4, 2, 8, 3, 5, 7, 6, 2, 9],
+        "UNIDADESCONSUMOCONTENIDAS": [10, 1, 5, 2, 2, 1, 3, 4, 1, 1],
+        "IMPORTELINEA": [10.0, 2.5, 7.25, 1.0, 4.5, np.nan, 6.0, 0.5, 3.0, 8.0],
+    })
+
+
+def _enriched():
+    return dt.enrich_dataset(_ledger())
+
+
+def _assert_rows_equal(result, expected):
+    assert result.columns.tolist() == expected.columns.tolist()
+    for col in expected.columns:
+        if pd.api.types.is_float_dtype(expected[col]):
+            np.testing.assert_allclose(result[col].to_numpy(dtype=np.float64), expected[col].to_numpy(dtype=np.float64))
+        else:
+            assert result[col].tolist() == expected[col].tolist()
+
+
+def test_rollup_equals_groupby():
+    ledger = _enriched()
+    result = cube.build_cube(ledger).rollup(["TIPOCOMPRA", "Year"])
+
+    grouped = ledger.groupby(["TIPOCOMPRA", "Year"])
+    expected = grouped.size().rename("Count").to_frame()
+    expected["IMPORTELINEA"] = grouped["IMPORTELINEA"].sum()
+    expected["CANTIDADCOMPRA"] = grouped["CANTIDADCOMPRA"].sum()
+    expected["TOTALUNIDADES"] = ledger.assign(TOTALUNIDADES=dt.total_units(ledger)).groupby(["TIPOCOMPRA", "Year"])["TOTALUNIDADES"].sum()
+    _assert_rows_equal(result, expected.reset_index())
+
+
+def test_aggregate_mean_skips_missing_values_as_groupby():
+    ledger = _enriched()
+    result = cube.build_cube(ledger).aggregate(["Hospital"], "IMPORTELINEA", "mean", "Mean")
+
+    expected = ledger.groupby("Hospital")["IMPORTELINEA"].mean().rename("Mean").reset_index()
+    _assert_rows_equal(result, expected)
+
+
+def test_dice_and_slice_equal_filtered_groupby():
+    ledger = _enriched()
+    ledger_cube = cube.build_cube(ledger)
+
+    diced = ledger_cube.dice(TGL=["T1"], Year=[22, 23]).rollup(["Hospital"], ["IMPORTELINEA"])
+    rows = ledger[(ledger["TGL"] == "T1") & ledger["Year"].isin([22, 23])]
+    expected = rows.groupby("Hospital").agg(Count=("IMPORTELINEA", "size"), IMPORTELINEA=("IMPORTELINEA", "sum")).reset_index()
+    _assert_rows_equal(diced, expected)
+
+    sliced = ledger_cube.slice("TIPOCOMPRA", "Compra").rollup(["Year"], [])
+    rows = ledger[ledger["TIPOCOMPRA"] == "Compra"]
+    _assert_rows_equal(sliced, rows.groupby("Year").size().rename("Count").reset_index())
+
+
+def test_saved_cube_loads_with_the_same_results(tmp_path):
+    ledger_cube = cube.build_cube(_enriched())
+    path = str(tmp_path / "cube.npz")
+    ledger_cube.save(path)
+    loaded = cube.load_cube(path)
+
+    assert loaded.dimensions == ledger_cube.dimensions
+    assert loaded.integer_measures == ledger_cube.integer_measures
+    for keys in (["Year"], ["Hospital", "TGL"], ["Month", "Year", "TIPOCOMPRA"]):
+        # A loaded cube returns NumPy key dtypes
+        pd.testing.assert_frame_equal(loaded.rollup(keys), ledger_cube.rollup(keys), check_dtype=False)
+
+
+def _expected_queries(ledger):
+    def count(keys, output):
+        return ledger.groupby(keys).size().rename(output).reset_index()
+
+    def reduce(keys, measure, reducer, output):
+        return ledger.groupby(keys)[measure].agg(reducer).rename(output).reset_index()
+
+    month_money = reduce(["Month", "Year"], "IMPORTELINEA", "sum", "TotalImporte")
+    month_money["Month"] = [f"{month:02d}/{year:02d}" for month, year in zip(month_money["Month"], month_money["Year"])]
+    return {
+        "group_by_origen_and_date": count(["Hospital", "Year"], "Purchases"),
+        "sum_importe_by_fecha": reduce(["Year"], "IMPORTELINEA", "sum", "TotalImporte"),
+        "sum_importe_by_month": month_money.drop(columns=["Year"]),
+        "sum_cantidad_by_fecha": reduce(["Year"], "CANTIDADCOMPRA", "sum", "TotalCantidad"),
+        "count_occurrences_by_year": count(["Year"], "Occurrences").sort_values("Occurrences", ascending=False, kind="stable").reset_index(drop=True),
+        "count_occurrences_by_tipo_and_year": count(["Year", "TIPOCOMPRA"], "Occurrences"),
+        "calculate_average_quantity_by_tipo_and_year": reduce(["Year", "TIPOCOMPRA"], "CANTIDADCOMPRA", "mean", "AverageQuantity"),
+    }
+
+
+@pytest.mark.parametrize("query", list(_expected_queries(_enriched())))
+def test_data_treatment_queries_equal_groupby(query):
+    ledger = _ledger()
+    expected = _expected_queries(dt.enrich_dataset(ledger))[query]
+
+    _assert_rows_equal(getattr(dt, query)(ledger), expected)
+    _assert_rows_equal(getattr(dt, query)(dt.enrich_dataset(ledger)), expected)
+
+
+def test_ledger_cube_is_built_once_per_ledger():
+    ledger = _enriched()
+    assert cube.ledger_cube(ledger) is not cube.ledger_cube(ledger)
+
+    ledger.attrs["source_key"] = "ledger-key"
+    ledger_cube = cube.ledger_cube(ledger)
+    assert cube.ledger_cube(ledger) is ledger_cube
+    assert ledger_cube.dimensions == cube.DIMENSIONS
+    # Another ledger read from the same file, with other rows, gets its own cube
+    assert cube.ledger_cube(ledger.iloc[:5]) is not ledger_cube
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pandas as pd
+
+import analysis.dashboard as dashboard
+from analysis.writers import write_outputs
+
+
+def _datasets():
+    return {
+        "year_money": pd.DataFrame({"Year": ["22", "23"], "TotalImporte": [10.5, 2.25]}),
+        "year_tipo": pd.DataFrame({"Year": ["22"], "TIPOCOMPRA": ["Compra"], "Occurrences": [3]}),
+    }
+
+
+def _count_json_writes(monkeypatch):
+    written = []
+    write_dataframe = dashboard.write_dataframe
+
+    def counting_write(dataframe, path, file_format=None):
+        written.append(os.path.basename(path))
+        return write_dataframe(dataframe, path, file_format)
+
+    monkeypatch.setattr(dashboard, "write_dataframe", counting_write)
+    return written
+
+
+def test_manifest_lists_every_dataset(tmp_path):
+    datasets = _datasets()
+    write_outputs(datasets, str(tmp_path), formats=("xlsx",))
+    manifest = dashboard.publish_dashboard_artifacts(datasets, str(tmp_path))
+
+    with open(tmp_path / dashboard.MANIFEST_FILE_NAME) as manifest_file:
+        assert json.load(manifest_file) == manifest
+    assert [dataset["name"] for dataset in manifest["datasets"]] == list(datasets)
+    assert manifest["datasets"][0]["rows"] == 2
+    assert set(manifest["datasets"][0]["files"]) == {"json", "xlsx"}
+
+
+def test_json_written_by_write_outputs_is_not_written_again(tmp_path, monkeypatch):
+    datasets = _datasets()
+    write_outputs(datasets, str(tmp_path), formats=("json",))
+    written = _count_json_writes(monkeypatch)
+
+    manifest = dashboard.publish_dashboard_artifacts(datasets, str(tmp_path), up_to_date=datasets)
+
+    assert written == []
+    assert all("json" in dataset["files"] for dataset in manifest["datasets"])
+
+
+def test_missing_json_is_written_even_when_up_to_date(tmp_path, monkeypatch):
+    datasets = _datasets()
+    written = _count_json_writes(monkeypatch)
+
+    dashboard.publish_dashboard_artifacts(datasets, str(tmp_path), up_to_date=["year_money"])
+
+    assert written == ["year_money.json", "year_tipo.json"]
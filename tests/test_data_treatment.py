@@ -0,0 +1,90 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+
+
+def test_normal_cdf_matches_erfc():
+    x = np.linspace(-12, 12, 2001)
+    expected = np.array([0.5 * math.erfc(-value / math.sqrt(2)) for value in x])
+
+    np.testing.assert_allclose(dt._normal_cdf(x), expected, rtol=1e-8, atol=1e-15)
+
+
+def test_normal_ppf_matches_normal_dist():
+    p = np.concatenate([np.linspace(1e-6, 1 - 1e-6, 2001), [1e-300, 1e-20, 0.02425, 0.97575]])
+    expected = np.array([NormalDist().inv_cdf(value) for value in p])
+
+    np.testing.assert_allclose(dt._normal_ppf(p), expected, rtol=1e-9, atol=1e-9)
+    assert dt._normal_ppf([0, 1]).tolist() == [-np.inf, np.inf]
+    assert np.isnan(dt._normal_ppf([-0.5, 1.5, np.nan])).all()
+
+
+def test_bca_ranges_of_every_group_equal_the_single_series_range():
+    dataframe = pd.DataFrame({"CODIGO": ["A"] * 30, "Spend": np.random.default_rng(1).lognormal(size=30)})
+
+    ranges = dt.calculate_spending_ranges(dataframe, "Spend", ["CODIGO"], rng=7, method="bca")
+    lower, upper = dt.calculate_spending_range(dataframe["Spend"].to_numpy(), rng=7, method="bca")
+
+    assert ranges[["LowerBound", "UpperBound"]].values.tolist() == [[lower, upper]]
+    assert lower < dataframe["Spend"].mean() < upper
+
+
+def test_main_publishes_the_groupby_results(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    ledger = pd.DataFrame({
+        "CODIGO": ["A", "B", "A", "C", "B", "A"],
+        "ORIGEN": ["1-2-60", "1-2-60", "3-4-10", "3-4-10", "1-2-60", "5-6-70"],
+        "FECHAPEDIDO": ["01/02/22", "15/02/22", "03/03/22", "20/11/23", "02/01/23", "09/09/23"],
+        "TIPOCOMPRA": ["Compra", "Contrato", "Compra", "Compra", "Contrato", "Compra"],
+        "CANTIDADCOMPRA": [1, 4, 2, 8, 3, 5],
+        "IMPORTELINEA": [10.0, 2.5, 7.25, 1.0, 4.5, 3.0],
+    })
+    ledger.to_excel(path, index=False)
+    output_dir = str(tmp_path / "published")
+
+    dt.main(formats=("parquet",), file_path=path, output_dir=output_dir)
+
+    years = ledger["FECHAPEDIDO"].str[-2:].rename("Year")
+    year_money = pd.read_parquet(f"{output_dir}/year_money.parquet")
+    expected = ledger.groupby(years)["IMPORTELINEA"].sum()
+    assert year_money["Year"].tolist() == expected.index.tolist()
+    np.testing.assert_allclose(year_money["TotalImporte"], expected)
+
+    average = pd.read_parquet(f"{output_dir}/year_tipo_average.parquet")
+    expected = ledger.groupby([years, "TIPOCOMPRA"])["CANTIDADCOMPRA"].mean()
+    np.testing.assert_allclose(average["AverageQuantity"], expected)
+
+
+def _product_totals():
+    rng = np.random.default_rng(3)
+    rows = 60
+    return pd.DataFrame({
+        "CODIGO": [f"P{i}" for i in range(rows)],
+        "Year": rng.choice([22, 23], rows),
+        "Hospital": rng.choice(["1-2", "3-4", None], rows),
+        # Ties and missing values, which rank last
+        "Spend": np.where(rng.random(rows) < 0.1, np.nan, rng.integers(0, 8, rows).astype(float)),
+    })
+
+
+def test_top_products_equal_sorted_groupby_head():
+    totals = _product_totals()
+
+    for k in (1, 3, 100):
+        result = dt.top_products(totals, k=k)
+
+        ordered = totals.sort_values(["Year", "Hospital", "Spend"], ascending=[True, True, False], kind="stable", na_position="last")
+        expected = ordered.groupby(["Year", "Hospital"], dropna=False, sort=False).head(k).reset_index(drop=True)
+        expected.insert(2, "Rank", expected.groupby(["Year", "Hospital"], dropna=False).cumcount() + 1)
+        pd.testing.assert_frame_equal(result, expected[["Year", "Hospital", "Rank", "CODIGO", "Spend"]], check_dtype=False)
+
+
+def test_top_products_of_no_totals_is_empty():
+    result = dt.top_products(_product_totals().iloc[:0], k=3)
+
+    assert result.empty
+    assert result.columns.tolist() == ["Year", "Hospital", "Rank", "CODIGO", "Spend"]
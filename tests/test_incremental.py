@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+from analysis.incremental import refresh_published_datasets
+
+
+def _ledger(rows):
+    codigos = ["A", "B", "C"]
+    origenes = ["1-2-60", "3-4-10", "5-6-70"]
+    tipos = ["Compra", "Contrato"]
+    return pd.DataFrame({
+        "CODIGO": [codigos[i % 3] for i in range(rows)],
+        "ORIGEN": [origenes[i * 7 % 3] for i in range(rows)],
+        "FECHAPEDIDO": [f"{1 + i % 28:02d}/{1 + i % 12:02d}/{21 + i % 3}" for i in range(rows)],
+        "TIPOCOMPRA": [tipos[i % 2] for i in range(rows)],
+        "CANTIDADCOMPRA": [1 + i % 5 for i in range(rows)],
+        "IMPORTELINEA": [0.5 * (i + 1) for i in range(rows)],
+    })
+
+
+def _write_workbook(path, ledger):
+    ledger.to_excel(path, index=False)
+    # Successive writes can share a modification time, which would keep the stale cache
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + len(ledger) * 10**9))
+
+
+def _published(output_dir):
+    names = ["hospital_year_purchases", "year_money", "year_purchases", "codigo_origen_df", "year_tipo", "year_tipo_average"]
+    return {name: pd.read_parquet(os.path.join(output_dir, f"{name}.parquet")) for name in names}
+
+
+def test_refresh_after_appended_rows_equals_a_full_run(tmp_path, capsys):
+    path = str(tmp_path / "ledger.xlsx")
+    incremental_dir = str(tmp_path / "incremental")
+    full_dir = str(tmp_path / "full")
+
+    _write_workbook(path, _ledger(20))
+    assert len(refresh_published_datasets(path, incremental_dir, formats=("parquet",))) == 6
+
+    ledger = _ledger(30)
+    _write_workbook(path, ledger)
+    rewritten = refresh_published_datasets(path, incremental_dir, formats=("parquet",))
+    assert "Aggregated 10 new rows (rows 20 to 30)" in capsys.readouterr().out
+    assert "year_money" in rewritten
+    assert refresh_published_datasets(path, incremental_dir, formats=("parquet",)) == []
+
+    refresh_published_datasets(path, full_dir, full=True, formats=("parquet",))
+    incremental, full = _published(incremental_dir), _published(full_dir)
+    for name, dataframe in full.items():
+        pd.testing.assert_frame_equal(incremental[name], dataframe)
+
+    enriched = dt.enrich_dataset(ledger)
+    expected = enriched.groupby("Year")["IMPORTELINEA"].sum()
+    assert incremental["year_money"]["Year"].tolist() == [f"{year:02d}" for year in expected.index]
+    np.testing.assert_allclose(incremental["year_money"]["TotalImporte"], expected)
+
+    expected = enriched.groupby(["Year", "TIPOCOMPRA"])["CANTIDADCOMPRA"].mean()
+    np.testing.assert_allclose(incremental["year_tipo_average"]["AverageQuantity"], expected)
+
+
+def test_refresh_writes_each_json_file_once(tmp_path, monkeypatch):
+    import analysis.dashboard as dashboard
+    import analysis.writers as writers
+
+    path = str(tmp_path / "ledger.xlsx")
+    output_dir = str(tmp_path / "published")
+    _write_workbook(path, _ledger(20))
+    refresh_published_datasets(path, output_dir, formats=("parquet", "json"))
+
+    written = []
+
+    def counting_write(dataframe, path, file_format=None):
+        written.append(os.path.basename(path))
+        return write_dataframe(dataframe, path, file_format)
+
+    write_dataframe = writers.write_dataframe
+    monkeypatch.setattr(writers, "write_dataframe", counting_write)
+    monkeypatch.setattr(dashboard, "write_dataframe", counting_write)
+
+    _write_workbook(path, _ledger(30))
+    rewritten = refresh_published_datasets(path, output_dir, formats=("parquet", "json"))
+
+    json_files = sorted(name for name in written if name.endswith(".json"))
+    assert json_files == sorted(f"{name}.json" for name in rewritten)
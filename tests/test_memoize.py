@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+import analysis.memoize as memoize
+from analysis.memoize import ResultStore, disable_memoization, enable_memoization, memoized
+
+MEMO_VERSION = 1
+
+calls = []
+
+
+@memoized
+def totals_by_codigo(dataframe):
+    calls.append(len(dataframe))
+    return dataframe.groupby("CODIGO", as_index=False)["IMPORTELINEA"].sum()
+
+
+@memoized
+def mixed_labels(dataframe):
+    calls.append(len(dataframe))
+    # pyarrow cannot store an object column mixing numbers and strings
+    return pd.DataFrame({"label": pd.array([1, "x"], dtype=object)})
+
+
+def _ledger(source_key="ledger-key"):
+    ledger = pd.DataFrame({"CODIGO": ["A", "B", "A", "C"], "IMPORTELINEA": [1.5, 2.0, 3.0, 4.25]})
+    ledger.attrs["source_key"] = source_key
+    return ledger
+
+
+@pytest.fixture
+def store(tmp_path):
+    calls.clear()
+    yield enable_memoization(str(tmp_path / "results"))
+    disable_memoization()
+
+
+def test_repeated_call_is_a_hit(store):
+    first = totals_by_codigo(_ledger())
+    second = totals_by_codigo(_ledger())
+
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(first, _ledger().groupby("CODIGO", as_index=False)["IMPORTELINEA"].sum())
+    assert calls == [4]
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_bumped_module_version_is_a_miss(store, monkeypatch):
+    totals_by_codigo(_ledger())
+    monkeypatch.setattr(sys.modules[__name__], "MEMO_VERSION", 2)
+    totals_by_codigo(_ledger())
+
+    assert calls == [4, 4]
+    assert store.hits == 0
+
+
+def test_other_source_key_is_a_miss(store):
+    totals_by_codigo(_ledger("ledger-key"))
+    totals_by_codigo(_ledger("other-key"))
+
+    assert calls == [4, 4]
+    assert store.hits == 0
+
+
+def test_least_recently_used_results_are_evicted(store):
+    result = _ledger().groupby("CODIGO", as_index=False)["IMPORTELINEA"].sum()
+    for name, mtime in (("a", 1), ("b", 2)):
+        store.save(name, "key", result)
+        os.utime(store.path(name, "key"), ns=(mtime * 10**9, mtime * 10**9))
+
+    # Reading "a" makes "b" the least recently used
+    assert store.load("a", "key") is not None
+    store.max_bytes = store.size()
+    store.save("c", "key", result)
+
+    assert [os.path.exists(store.path(name, "key")) for name in ("a", "b", "c")] == [True, False, True]
+
+
+def test_unstorable_result_is_returned_without_being_stored(store, capsys):
+    first = mixed_labels(_ledger())
+    second = mixed_labels(_ledger())
+
+    assert first["label"].tolist() == second["label"].tolist() == [1, "x"]
+    assert calls == [4, 4]
+    assert store.size() == 0
+    assert "Not storing the result" in capsys.readouterr().out
+
+
+def test_unreadable_result_is_discarded_and_computed_again(store):
+    expected = totals_by_codigo(_ledger())
+    (path,) = [entry for _, entry, _ in store._entries()]
+    with open(path, "wb") as result_file:
+        result_file.write(b"not parquet")
+
+    pd.testing.assert_frame_equal(totals_by_codigo(_ledger()), expected)
+    assert calls == [4, 4]
+    assert (store.hits, store.misses) == (0, 2)
+    # Stored again, readable this time
+    pd.testing.assert_frame_equal(totals_by_codigo(_ledger()), expected)
+    assert store.hits == 1
+
+
+def test_default_directory_does_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv(memoize.MEMO_DIR_ENV, raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert memoize.default_memo_dir() == memoize.DEFAULT_MEMO_DIR
+    assert os.path.isabs(memoize.DEFAULT_MEMO_DIR)
+
+    monkeypatch.setenv(memoize.MEMO_DIR_ENV, str(tmp_path / "memo"))
+    assert ResultStore().directory == str(tmp_path / "memo")
+    assert os.path.isdir(tmp_path / "memo")
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from analysis.aggregation import AggregationSpec
+from analysis.data_treatment import enrich_dataset
+from analysis.parallel import aggregate_in_parallel, partition_ledger
+
+
+def _ledger():
+    return enrich_dataset(pd.DataFrame({
+        "CODIGO": ["A", "B", "A", "C", "B", "A", "C", "D"],
+        "ORIGEN": ["1-2-60", "1-2-60", "3-4-10", "3-4-10", "1-2-60", "5-6-70", "3-4-10", "5-6-70"],
+        "FECHAPEDIDO": ["01/02/22", "15/02/22", "03/03/22", "20/11/23", "02/01/23", "09/09/23", "28/02/22", "01/01/24"],
+        "CANTIDADCOMPRA": [1, 4, 2, 8, 3, 5, 7, 6],
+        "IMPORTELINEA": [10.0, 2.5, 7.25, 1.0, 4.5, 3.0, 6.0, 0.5],
+    }))
+
+
+PLAN = [
+    AggregationSpec("hospital_year", ["Hospital", "Year"], None, "count", "Purchases"),
+    AggregationSpec("year_money", ["Year"], "IMPORTELINEA", "sum", "Total"),
+    AggregationSpec("codigo_mean", ["CODIGO"], "CANTIDADCOMPRA", "mean", "Mean"),
+    AggregationSpec("codigo_high", ["CODIGO"], "CANTIDADCOMPRA", "max", "High"),
+]
+
+
+def test_partitions_split_every_value_into_one_partition():
+    ledger = _ledger()
+    partitions = partition_ledger(ledger, "CODIGO", 3)
+
+    assert sum(len(partition) for partition in partitions) == len(ledger)
+    owners = [set(partition["CODIGO"]) for partition in partitions]
+    assert all(not (a & b) for i, a in enumerate(owners) for b in owners[i + 1:])
+
+
+def test_two_workers_equal_one_worker_and_groupby():
+    ledger = _ledger()
+    serial = aggregate_in_parallel(ledger, PLAN, workers=1)
+
+    for partition_by in ("CODIGO", "Hospital", "Year"):
+        parallel = aggregate_in_parallel(ledger, PLAN, workers=2, partition_by=partition_by)
+        for spec in PLAN:
+            pd.testing.assert_frame_equal(parallel[spec.name], serial[spec.name])
+
+    for spec in PLAN:
+        grouped = ledger.groupby(spec.keys)
+        expected = grouped.size() if spec.reducer == "count" else grouped[spec.measure].agg(spec.reducer)
+        assert serial[spec.name][spec.keys].values.tolist() == expected.reset_index()[spec.keys].values.tolist()
+        np.testing.assert_allclose(serial[spec.name][spec.output], expected)
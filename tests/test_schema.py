@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import analysis.data_treatment as dt
+from analysis.schema import compact_ledger
+
+
+def _ledger():
+    return pd.DataFrame({
+        "CODIGO": ["A", "B", "A", "C", "B"],
+        "FECHAPEDIDO": ["01/02/22", "15/02/22", "not a date", "20/11/23", "02/01/23"],
+        "CANTIDADCOMPRA": [1, 400, 2, 300, 3],
+        "UNIDADESCONSUMOCONTENIDAS": [100, 200, 1, 250, 2],
+        "PRECIO": [1.5, 2.25, 0.5, 4.0, 8.0],
+        "IMPORTELINEA": [1.1, 2.2, 3.3, 4.4, 5.5],
+        "TIPOCOMPRA": ["Compra", "Contrato", "Compra", "Compra", "Contrato"],
+        "ORIGEN": ["1-2-60", "1-2-60", "3-4-10", "3-4-10", "5-6-70"],
+        "OTHER": ["x", "y", "z", "x", "y"],
+    })
+
+
+def test_compact_ledger_dtypes():
+    ledger = _ledger()
+    compact = compact_ledger(ledger)
+
+    assert isinstance(compact["CODIGO"].dtype, pd.CategoricalDtype)
+    assert isinstance(compact["TIPOCOMPRA"].dtype, pd.CategoricalDtype)
+    assert isinstance(compact["ORIGEN"].dtype, pd.CategoricalDtype)
+    assert compact["FECHAPEDIDO"].dtype.kind == "M"
+    assert compact["CANTIDADCOMPRA"].dtype == np.int16
+    assert compact["UNIDADESCONSUMOCONTENIDAS"].dtype == np.int16
+    # Exact binary fractions fit in float32, decimal amounts stay float64
+    assert compact["PRECIO"].dtype == np.float32
+    assert compact["IMPORTELINEA"].dtype == np.float64
+    assert compact["OTHER"].dtype == ledger["OTHER"].dtype
+    # The input is left as read
+    pd.testing.assert_frame_equal(ledger, _ledger())
+
+
+def test_compact_ledger_keeps_the_values():
+    ledger = _ledger()
+    compact = compact_ledger(ledger)
+
+    expected_dates = pd.to_datetime(ledger["FECHAPEDIDO"], format="%d/%m/%y", errors="coerce")
+    pd.testing.assert_series_equal(compact["FECHAPEDIDO"], expected_dates, check_dtype=False)
+    for col in ("CODIGO", "CANTIDADCOMPRA", "PRECIO", "IMPORTELINEA"):
+        assert compact[col].tolist() == ledger[col].tolist()
+
+
+def test_compact_ledger_gives_the_same_aggregations():
+    ledger = _ledger()
+    compact = compact_ledger(ledger)
+
+    # 400 * 200 overflows int16, total_units widens the downcast columns first
+    np.testing.assert_array_equal(dt.total_units(compact), ledger["CANTIDADCOMPRA"] * ledger["UNIDADESCONSUMOCONTENIDAS"])
+
+    enriched, compact_enriched = dt.enrich_dataset(ledger), dt.enrich_dataset(compact)
+    expected = enriched.groupby(["Year", "TIPOCOMPRA"])["CANTIDADCOMPRA"].mean()
+    result = compact_enriched.groupby(["Year", "TIPOCOMPRA"], observed=True)["CANTIDADCOMPRA"].mean()
+    assert result.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(result, expected)
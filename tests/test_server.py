@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis.server import LedgerService, LedgerState
+
+
+def _write_ledger(path, rows=12, amount=1.0):
+    ledger = pd.DataFrame({
+        "CODIGO": [["A", "B", "C"][i % 3] for i in range(rows)],
+        "ORIGEN": [["1-2-60", "3-4-10"][i % 2] for i in range(rows)],
+        "FECHAPEDIDO": [f"{1 + i:02d}/{1 + i % 12:02d}/{22 + i % 2}" for i in range(rows)],
+        "TIPOCOMPRA": [["Compra", "Contrato"][i % 2] for i in range(rows)],
+        "TGL": ["T1"] * rows,
+        "CANTIDADCOMPRA": [1 + i % 4 for i in range(rows)],
+        "UNIDADESCONSUMOCONTENIDAS": [2] * rows,
+        "IMPORTELINEA": [amount * (i + 1) for i in range(rows)],
+    })
+    ledger.to_excel(path, index=False)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + int(amount * 10**9)))
+    return ledger
+
+
+def _service(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    ledger = _write_ledger(path)
+    service = LedgerService(path, workers=1)
+    service.load()
+    return service, path, ledger
+
+
+def test_queries_equal_groupby(tmp_path):
+    service, _, ledger = _service(tmp_path)
+    hospitals = ledger["ORIGEN"].str.rsplit("-", n=1).str[0]
+
+    result = service.run_query("group_by_origen_and_date", [("TIPOCOMPRA", "compra")])
+    rows = ledger[ledger["TIPOCOMPRA"] == "Compra"]
+    expected = rows.groupby([hospitals[rows.index], rows["FECHAPEDIDO"].str[-2:].astype(int)]).size()
+    assert result["Purchases"].tolist() == expected.tolist()
+
+    result = service.run_aggregation({"keys": "CODIGO", "reducer": "mean", "measure": "IMPORTELINEA"}, [("Year", "22")])
+    rows = ledger[ledger["FECHAPEDIDO"].str.endswith("/22")]
+    expected = rows.groupby("CODIGO")["IMPORTELINEA"].mean()
+    assert result["CODIGO"].tolist() == expected.index.tolist()
+    np.testing.assert_allclose(result["MeanIMPORTELINEA"], expected)
+
+
+def test_respond_caches_results_and_matches_etags(tmp_path):
+    service, _, _ = _service(tmp_path)
+    calls = []
+
+    def compute(state):
+        calls.append(state)
+        return service.run_query("sum_importe_by_fecha", [], state)
+
+    async def scenario():
+        etag, version, body = await service.respond(["query", "sum_importe_by_fecha"], None, compute)
+        assert (await service.respond(["query", "sum_importe_by_fecha"], None, compute)) == (etag, version, body)
+        assert len(calls) == 1 and calls[0] is service.state
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            assert await service.respond(["query", "sum_importe_by_fecha"], header, compute) == (etag, version, None)
+        assert (await service.respond(["query", "sum_importe_by_fecha"], '"other"', compute))[2] == body
+        return etag, version, body
+
+    etag, version, body = asyncio.run(scenario())
+    assert version == service.version
+    assert b"TotalImporte" in body
+
+
+def test_changed_workbook_gets_new_etags(tmp_path):
+    service, path, _ = _service(tmp_path)
+
+    def compute(state):
+        return service.run_query("sum_importe_by_fecha", [], state)
+
+    etag, version, body = asyncio.run(service.respond(["query", "sum_importe_by_fecha"], None, compute))
+    _write_ledger(path, amount=2.0)
+    new_etag, new_version, new_body = asyncio.run(service.respond(["query", "sum_importe_by_fecha"], etag, compute))
+
+    assert new_version != version and new_etag != etag
+    assert new_body is not None and new_body != body
+
+
+def test_result_belongs_to_the_state_read_when_the_query_arrived(tmp_path):
+    service, _, _ = _service(tmp_path)
+    state = service.state
+
+    def compute(captured):
+        # A reload replacing the ledger while the query runs
+        service.state = LedgerState(captured.ledger.iloc[:0], captured.index, captured.version)
+        return service.run_aggregation({"keys": "CODIGO"}, [], captured)
+
+    etag, version, body = asyncio.run(service.respond(["aggregate", "CODIGO"], None, compute))
+
+    assert version == state.version
+    assert b'"rows":3' in body
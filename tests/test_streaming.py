@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import analysis.cache as cache
+from analysis.aggregation import AggregationSpec, run_aggregation_plan
+from analysis.data_treatment import enrich_dataset, read_excel_dataset
+from analysis.streaming import aggregate_chunks, aggregate_excel_in_chunks, iter_ledger_chunks
+
+
+def _ledger():
+    return pd.DataFrame({
+        "CODIGO": ["A", "B", "A", "C", "B", "A", "C"],
+        "ORIGEN": ["1-2-60", "1-2-60", "3-4-10", "3-4-10", "1-2-60", "5-6-70", "3-4-10"],
+        "FECHAPEDIDO": ["01/02/22", "15/02/22", "03/03/22", "20/11/23", "02/01/23", "09/09/23", "28/02/22"],
+        "CANTIDADCOMPRA": [1, 4, 2, 8, 3, 5, 7],
+        "IMPORTELINEA": [10.0, 2.5, 7.25, 1.0, 4.5, 3.0, 6.0],
+    })
+
+
+PLAN = [
+    AggregationSpec("hospital_year", ["Hospital", "Year"], None, "count", "Purchases"),
+    AggregationSpec("year_money", ["Year"], "IMPORTELINEA", "sum", "Total"),
+    AggregationSpec("codigo_mean", ["CODIGO"], "CANTIDADCOMPRA", "mean", "Mean"),
+    AggregationSpec("codigo_low", ["CODIGO"], "CANTIDADCOMPRA", "min", "Low"),
+    AggregationSpec("codigo_high", ["CODIGO"], "IMPORTELINEA", "max", "High"),
+]
+
+
+def _expected(ledger, spec):
+    grouped = ledger.groupby(spec.keys)
+    if spec.reducer == "count":
+        return grouped.size()
+    return grouped[spec.measure].agg(spec.reducer)
+
+
+def _assert_matches_groupby(results, ledger):
+    for spec in PLAN:
+        expected = _expected(ledger, spec)
+        result = results[spec.name]
+        assert result[spec.keys].values.tolist() == expected.reset_index()[spec.keys].values.tolist()
+        np.testing.assert_allclose(result[spec.output], expected)
+
+
+def _chunks(dataframe, chunk_size):
+    return [dataframe.iloc[start:start + chunk_size] for start in range(0, len(dataframe), chunk_size)]
+
+
+def test_chunked_aggregation_equals_groupby():
+    ledger = _ledger()
+    expected = enrich_dataset(ledger)
+
+    for chunk_size in (1, 2, 3, len(ledger)):
+        _assert_matches_groupby(aggregate_chunks(_chunks(ledger, chunk_size), PLAN), expected)
+
+
+def test_chunked_aggregation_equals_the_whole_frame():
+    ledger = _ledger()
+    whole = run_aggregation_plan(enrich_dataset(ledger), PLAN)
+    chunked = aggregate_chunks(_chunks(ledger, 3), PLAN)
+
+    for spec in PLAN:
+        pd.testing.assert_frame_equal(chunked[spec.name], whole[spec.name])
+
+
+def test_excel_ledger_aggregated_in_chunks(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    ledger = _ledger()
+    ledger.to_excel(path, index=False)
+
+    assert [len(chunk) for chunk in iter_ledger_chunks(path, chunk_size=3)] == [3, 3, 1]
+    _assert_matches_groupby(aggregate_excel_in_chunks(path, PLAN, chunk_size=3), enrich_dataset(ledger))
+
+    # Once the sheet is cached, the chunks are read from the Parquet file instead
+    read_excel_dataset(path)
+    assert os.path.exists(cache.cache_path(path))
+    _assert_matches_groupby(aggregate_excel_in_chunks(path, PLAN, chunk_size=3), enrich_dataset(ledger))
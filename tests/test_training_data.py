@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from analysis.training_data import convert_training_ledger, load_training_arrays, training_batches
+from analysis.windowing import build_sequences
+
+
+def _ledger():
+    return pd.DataFrame({
+        "CODIGO": ["C", "A", "B", "A", "D", "C", "B", "A", "C", "D", "B"],
+        "PRECIO": [1.5, 2.0, 0.5, 2.0, 3.25, 1.5, 0.5, 2.0, 1.5, 3.25, 0.5],
+        "CANTIDADCOMPRA": [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5],
+    })
+
+
+def _in_memory(ledger):
+    # Label encoding as sklearn's LabelEncoder: codes in sorted class order
+    return ledger.assign(CODIGO=pd.factorize(ledger["CODIGO"], sort=True)[0])
+
+
+def test_converted_arrays_equal_the_encoded_ledger(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    ledger = _ledger()
+    ledger.to_excel(path, index=False)
+
+    # Chunks smaller than the ledger, so classes first seen in later chunks are remapped
+    meta = convert_training_ledger(path, ["CODIGO", "PRECIO"], data_dir=str(tmp_path / "training"), chunk_size=3)
+    features, targets, _ = load_training_arrays(str(tmp_path / "training"))
+
+    expected = _in_memory(ledger)
+    assert meta["classes"] == {"CODIGO": ["A", "B", "C", "D"]}
+    np.testing.assert_array_equal(features, expected[["CODIGO", "PRECIO"]].to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(targets, expected["CANTIDADCOMPRA"].to_numpy(dtype=np.float32))
+
+
+def test_memmap_batches_equal_in_memory_windows(tmp_path):
+    path = str(tmp_path / "ledger.xlsx")
+    ledger = _ledger()
+    ledger.to_excel(path, index=False)
+    data_dir = str(tmp_path / "training")
+    convert_training_ledger(path, ["CODIGO", "PRECIO"], data_dir=data_dir, chunk_size=4)
+
+    sequence_length = 3
+    train, train_steps, validation, validation_steps = training_batches(data_dir, sequence_length, batch_size=3, validation_split=0.25, shuffle=False)
+    train_batches = [next(train) for _ in range(train_steps)]
+    validation_batches = [next(validation) for _ in range(validation_steps)]
+
+    X, y = build_sequences(_in_memory(ledger), ["CODIGO", "PRECIO"], "CANTIDADCOMPRA", sequence_length)
+    X, y = X.astype(np.float32), y.astype(np.float32)
+    n_train = len(X) - int(len(X) * 0.25)
+
+    np.testing.assert_array_equal(np.concatenate([batch_X for batch_X, _ in train_batches]), X[:n_train])
+    np.testing.assert_array_equal(np.concatenate([batch_y for _, batch_y in train_batches]), y[:n_train])
+    np.testing.assert_array_equal(np.concatenate([batch_X for batch_X, _ in validation_batches]), X[n_train:])
+    np.testing.assert_array_equal(np.concatenate([batch_y for _, batch_y in validation_batches]), y[n_train:])
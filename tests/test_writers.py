@@ -0,0 +1,69 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from analysis.writers import FORMATS, write_atomically, write_dataframe, write_outputs
+
+
+def _dataset():
+    return pd.DataFrame({
+        "Year": ["21", "22", "22", "23"],
+        "Hospital": ["1-2", "3-4", None, "1-2"],
+        "Purchases": [3, 1, 4, 1],
+        "TotalImporte": [10.5, 2.25, None, 7.0],
+    })
+
+
+def _read_back(path, file_format):
+    if file_format == "xlsx":
+        return pd.read_excel(path, dtype={"Year": str})
+    if file_format == "csv":
+        return pd.read_csv(path, dtype={"Year": str})
+    if file_format == "parquet":
+        return pd.read_parquet(path)
+    with open(path, encoding="utf-8") as json_file:
+        document = json.load(json_file)
+    assert document["rows"] == len(document["columns"][0])
+    return pd.DataFrame(dict(zip(document["headers"], document["columns"]))).astype({"Hospital": "str", "TotalImporte": float})
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_written_file_reads_back_as_the_dataframe(tmp_path, file_format):
+    dataset = _dataset()
+    path = str(tmp_path / f"dataset.{file_format}")
+    write_dataframe(dataset, path)
+
+    pd.testing.assert_frame_equal(_read_back(path, file_format), dataset, check_dtype=False)
+    # Only the final file is left behind
+    assert os.listdir(tmp_path) == [f"dataset.{file_format}"]
+
+
+def test_write_outputs_writes_every_format(tmp_path):
+    dataset = _dataset()
+    timings = write_outputs({"first": dataset, "second": dataset.head(2)}, str(tmp_path), formats=FORMATS)
+
+    assert len(timings) == 2 * len(FORMATS)
+    for file_format in FORMATS:
+        pd.testing.assert_frame_equal(_read_back(str(tmp_path / f"second.{file_format}"), file_format), dataset.head(2), check_dtype=False)
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / "dataset.csv")
+    write_dataframe(_dataset(), path)
+
+    def fail(tmp_path):
+        with open(tmp_path, "w") as partial_file:
+            partial_file.write("Year,")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomically(path, fail)
+    pd.testing.assert_frame_equal(_read_back(path, "csv"), _dataset(), check_dtype=False)
+    assert os.listdir(tmp_path) == ["dataset.csv"]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_outputs({"first": _dataset()}, str(tmp_path), formats=["xml"])